@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import matplotlib
+matplotlib.use('Agg')  # графики только в файлы
+import numpy as np
+import pandas as pd
+from connection import get_manager, close_all
+from database import create_catalog
+from ingest import ENGINES
+import stats_cache
+import pipeline
+import charts
+
+# замеры скорости на синтетических датасетах от 10^4 до 10^8 строк:
+# загрузка, открытие, статистика, корреляции и все типы графиков, результат - json
+# примеры:
+#   python benchmark.py run --sizes 1e4 1e5 1e6 --out bench.json
+#   python benchmark.py compare bench_old.json bench.json --threshold 0.2
+
+GENERATE_CHUNK = 1000000  # строк генерируется и пишется в цсв за раз
+
+
+# синтетический цсв: целые, дробные, категориальные столбцы и столбец дат
+def generate_csv(path, rows, ints=2, floats=4, categories=2, cardinality=20, dates=True, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2020-01-01T00:00')
+    labels = np.array([f"cat{i}" for i in range(cardinality)])
+    written = 0
+    while written < rows:
+        size = min(GENERATE_CHUNK, rows - written)
+        data = {}
+        if dates:
+            minutes = np.arange(written, written + size).astype('timedelta64[m]')
+            data['date'] = np.datetime_as_string(start + minutes, unit='s')
+        for i in range(ints):
+            data[f"int_{i}"] = rng.integers(0, 10 ** (i + 2), size)
+        # дробные столбцы связаны между собой, чтобы корреляции были не нулевые
+        base = rng.normal(size=size)
+        for i in range(floats):
+            data[f"float_{i}"] = base * (i + 1) + rng.normal(scale=i + 1, size=size)
+        for i in range(categories):
+            data[f"cat_{i}"] = labels[rng.integers(0, cardinality, size)]
+        pd.DataFrame(data).to_csv(path, mode='w' if not written else 'a', header=not written, index=False)
+        written += size
+    return path
+
+
+def timed(results, rows, step, fn, *args, **kwargs):
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    results.append({'rows': rows, 'step': step, 'seconds': round(seconds, 4),
+                    'rows_per_s': round(rows / seconds) if seconds > 0 else None})
+    print(f"{rows:>12,}  {step:<20} {seconds:9.3f} с", flush=True)
+    return value
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# один размер датасета: своя БД во временной папке, все шаги по очереди
+def bench_size(work_dir, rows, options, results):
+    csv_path = os.path.join(work_dir, f"bench_{rows}.csv")
+    db_path = os.path.join(work_dir, f"bench_{rows}.db")
+    charts_dir = os.path.join(work_dir, f"charts_{rows}")
+    os.makedirs(charts_dir, exist_ok=True)
+    with get_manager(db_path).writer() as conn:
+        create_catalog(conn)
+
+    timed(results, rows, 'generate', generate_csv, csv_path, rows, options['ints'], options['floats'],
+          options['categories'], options['cardinality'], options['dates'])
+    timed(results, rows, 'ingest', pipeline.ingest_csv, db_path, csv_path, 'bench', storage=options['storage'],
+          engine=options['engine'])
+    handle = timed(results, rows, 'load', pipeline.open_dataset, db_path, 'bench')
+    timed(results, rows, 'preview', handle.head, 200)
+
+    # статистика и корреляции считаются заново, без кэша от загрузки
+    with handle.db.writer() as conn:
+        stats_cache.invalidate(conn, 'bench')
+    timed(results, rows, 'stats', pipeline.dataset_stats, handle)
+    timed(results, rows, 'stats_cached', pipeline.dataset_stats, handle)
+    timed(results, rows, 'corr_pearson', pipeline.correlation_matrix, handle, 'pearson')
+    if rows <= options['spearman_max']:
+        timed(results, rows, 'corr_spearman', pipeline.correlation_matrix, handle, 'spearman')
+
+    for kind in charts.CHART_KINDS:
+        out_path = os.path.join(charts_dir, f"{kind}.png")
+        timed(results, rows, f"plot_{kind}", charts.render_chart, db_path, 'bench', kind, out_path)
+
+    close_all()
+    if not options['keep']:
+        for path in (csv_path, db_path, db_path + '-wal', db_path + '-shm'):
+            if os.path.exists(path):
+                os.remove(path)
+        shutil.rmtree(charts_dir, ignore_errors=True)
+        shutil.rmtree(os.path.join(work_dir, 'columnar'), ignore_errors=True)
+
+
+def cmd_run(args):
+    options = {'ints': args.ints, 'floats': args.floats, 'categories': args.categories,
+               'cardinality': args.cardinality, 'dates': not args.no_dates, 'storage': args.storage,
+               'spearman_max': args.spearman_max, 'engine': args.engine, 'keep': args.keep}
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        for rows in args.sizes:
+            bench_size(work_dir, rows, options, results)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': {key: value for key, value in options.items() if key != 'keep'},
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Отчет: {args.out}")
+    return 0
+
+
+# сравнение двух отчетов: шаги, ставшие медленнее порога, считаются регрессией
+def compare_reports(old, new, threshold):
+    before = {(r['rows'], r['step']): r['seconds'] for r in old['results']}
+    rows = []
+    for result in new['results']:
+        key = (result['rows'], result['step'])
+        if key not in before:
+            continue
+        old_seconds, new_seconds = before[key], result['seconds']
+        change = (new_seconds - old_seconds) / old_seconds if old_seconds > 0 else 0.0
+        rows.append((key[0], key[1], old_seconds, new_seconds, change, change > threshold))
+    return rows
+
+
+def cmd_compare(args):
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    rows = compare_reports(old, new, args.threshold)
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    for size, step, old_seconds, new_seconds, change, regression in rows:
+        mark = "  РЕГРЕССИЯ" if regression else ""
+        print(f"{size:>12,}  {step:<20} {old_seconds:9.3f} -> {new_seconds:9.3f} с  {change:+7.1%}{mark}")
+    regressions = sum(1 for row in rows if row[-1])
+    print(f"Регрессий: {regressions}")
+    return 1 if regressions else 0
+
+
+def size(value): # 1e6 -> 1000000
+    return int(float(value))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Замеры скорости на синтетических датасетах")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="замеры и отчет в json")
+    run.add_argument('--sizes', nargs='+', type=size, default=[10 ** 4, 10 ** 5, 10 ** 6],
+                     help="число строк (от 1e4 до 1e8)")
+    run.add_argument('--ints', type=int, default=2, help="целых столбцов")
+    run.add_argument('--floats', type=int, default=4, help="дробных столбцов")
+    run.add_argument('--categories', type=int, default=2, help="категориальных столбцов")
+    run.add_argument('--cardinality', type=int, default=20, help="различных значений в категориях")
+    run.add_argument('--no-dates', action='store_true', help="без столбца дат")
+    run.add_argument('--storage', choices=['sqlite', 'columnar'], default='sqlite')
+    run.add_argument('--engine', choices=ENGINES, default='c', help="парсер цсв при загрузке")
+    run.add_argument('--spearman-max', type=size, default=10 ** 6,
+                     help="спирмен (ранги в памяти) только до этого числа строк")
+    run.add_argument('--work-dir', help="папка для цсв и БД (по умолчанию временная)")
+    run.add_argument('--keep', action='store_true', help="не удалять сгенерированные файлы")
+    run.add_argument('--out', default='benchmark.json', help="файл отчета")
+    run.set_defaults(func=cmd_run)
+
+    compare = commands.add_parser('compare', help="сравнение двух отчетов")
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--threshold', type=float, default=0.2, help="допустимое замедление (0.2 = 20%%)")
+    compare.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+import os
+import glob
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from ingest import csv_stem, check_new_dataset, CsvEngineError
+from connection import get_manager
+import pipeline
+
+# пакетная загрузка цсв из папки или по маске (например, суточные выгрузки):
+# файлы разбираются в нескольких процессах, в БД пишет только основной процесс через общего писателя,
+# файлы вставляются в порядке имен; ошибка в одном файле не останавливает остальные
+
+CSV_PATTERN = '*.csv*'  # вместе со сжатыми .csv.gz, .csv.zst и т.д.
+CHUNKS_AHEAD = 4  # разобранных кусков файла в очереди, пока основной процесс пишет предыдущие
+RESTART = 'restart'  # метка в очереди: файл читается заново другим парсером
+
+
+def expand_sources(source, pattern=CSV_PATTERN): # папка, маска или список путей -> отсортированные файлы
+    if isinstance(source, (list, tuple)):
+        files = []
+        for item in source:
+            files += expand_sources(item, pattern)
+        return files
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, pattern)))
+    if glob.has_magic(source):
+        return sorted(path for path in glob.glob(source) if os.path.isfile(path))
+    return [source]
+
+
+def dataset_for_file(file_path, prefix=None): # название датасета по имени файла
+    name = csv_stem(file_path)
+    return f"{prefix}_{name}" if prefix else name
+
+
+# разбор одного файла в процессе-исполнителе: куски по одному уходят в очередь chunks (ограниченного размера,
+# поэтому исполнитель ждет, пока основной процесс запишет предыдущие); в конце - None
+# возвращаются время разбора и парсер
+def parse_file(file_path, engine, chunks):
+    attempts = []
+
+    def send(reader):
+        if attempts:
+            chunks.put(RESTART)  # pyarrow не справился посреди файла, куски пойдут заново
+        attempts.append(reader)
+        for chunk in reader:
+            chunks.put(chunk)
+
+    info = {}
+    try:
+        pipeline.load_csv(file_path, engine, send, info)
+    finally:
+        chunks.put(None)
+    return info['seconds'], info['engine']
+
+
+class ParsedFile: # куски файла из очереди по мере разбора
+    def __init__(self, file_path, chunks, future):
+        self.file_path = file_path
+        self.chunks = chunks
+        self.future = future
+        self.finished = False
+        self.seconds = 0.0
+        self.engine = None
+
+    def __iter__(self):
+        while not self.finished:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.finished = True
+                # ошибка разбора прерывает запись файла (транзакция откатывается)
+                self.seconds, self.engine = self.future.result()
+                return
+            if isinstance(chunk, str):
+                # повтор обычным парсером: запись файла начинается заново (как в pipeline.load_csv)
+                raise CsvEngineError(f"Файл {self.file_path} читается заново обычным парсером")
+            yield chunk
+
+    def drain(self): # непрочитанные куски (запись прервалась), чтобы исполнитель не ждал очередь
+        while not self.finished:
+            self.finished = self.chunks.get() is None
+
+
+# разобранные файлы по порядку; в очередь ставится не больше ahead файлов, разбираются сразу только workers,
+# и по каждому в памяти не больше CHUNKS_AHEAD кусков
+def parsed_files(files, workers, ahead, engine='c'):
+    context = multiprocessing.get_context('spawn')  # без fork: вызывается и из потока интерфейса
+    manager = context.Manager()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    def submit(file_path):
+        chunks = manager.Queue(CHUNKS_AHEAD)
+        return ParsedFile(file_path, chunks, pool.submit(parse_file, file_path, engine, chunks))
+
+    try:
+        queued = iter(files)
+        parsed = [submit(file_path) for _, file_path in zip(range(ahead), queued)]
+        while parsed:
+            current = parsed.pop(0)
+            next_path = next(queued, None)
+            if next_path is not None:
+                parsed.append(submit(next_path))
+            yield current
+            current.drain()
+    finally:
+        # очереди закрываются первыми: исполнители, ждущие места в очереди, завершаются с ошибкой;
+        # еще не начатые файлы не разбираются
+        manager.shutdown()
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# загрузка файлов в один датасет dataset_name (первый файл создает его, если датасета нет,
+# остальные дописываются с заменой по key) или, при per_file=True, каждый файл в свой датасет
+# append=False - только новый датасет: существующее название - ошибка, как при загрузке одного файла
+# возвращает список словарей по файлам: датасет, строки, байты, время, МБ/с, ошибка
+def bulk_import(db_path, source, dataset_name=None, per_file=False, description="", storage='sqlite', key=None,
+                pattern=CSV_PATTERN, workers=None, engine='c', on_file=None, task=None, append=True):
+    files = expand_sources(source, pattern)
+    if not files:
+        raise ValueError("Не найдено ни одного файла для загрузки")
+    if not per_file and not dataset_name:
+        raise ValueError("Не задано название датасета")
+    workers = max(1, min(workers or os.cpu_count() or 1, len(files)))
+
+    results = []
+    reader = get_manager(db_path).reader()
+    if not per_file and not append:
+        check_new_dataset(reader, dataset_name)
+    exists = not per_file and reader.execute(
+        "SELECT 1 FROM datasets WHERE name = ?", (dataset_name,)).fetchone() is not None
+    for parsed in parsed_files(files, workers, 2 * workers, engine):
+        file_path = parsed.file_path
+        name = dataset_for_file(file_path, dataset_name) if per_file else dataset_name
+        size = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
+        result = {'file': file_path, 'dataset': name, 'bytes': size, 'rows': 0, 'replaced': 0,
+                  'engine': None, 'parse_s': 0.0, 'insert_s': 0.0, 'mb_s': None, 'error': None}
+        start = time.perf_counter()
+        while True:
+            try:
+                if per_file or not exists:
+                    result['rows'], _ = pipeline.ingest_frames(db_path, parsed, name, description, storage,
+                                                               source_bytes=size)
+                    exists = True
+                else:
+                    result['rows'], result['replaced'] = pipeline.append_frames(db_path, parsed, name, key,
+                                                                                source_bytes=size)
+            except CsvEngineError:
+                continue
+            except Exception as e:
+                result['error'] = str(e) or type(e).__name__
+            break
+        result['engine'], result['parse_s'] = parsed.engine, round(parsed.seconds, 4)
+        result['insert_s'] = round(time.perf_counter() - start, 4)
+        if result['error'] is None:
+            seconds = result['insert_s']  # разбор идет параллельно с записью
+            result['mb_s'] = round(size / 1024 / 1024 / seconds, 2) if seconds > 0 else None
+        results.append(result)
+        if on_file is not None:
+            on_file(result)
+        pipeline.report(task, len(results), len(files))
+    return results
+
+
+# строки отчета для лога и консоли
+def format_file(r):
+    if r['error'] is not None:
+        return f"{os.path.basename(r['file'])}: ошибка - {r['error']}"
+    return (f"{os.path.basename(r['file'])} -> {r['dataset']}: {r['rows']:,} строк, "
+            f"{r['bytes'] / 1024 / 1024:.1f} MB, разбор {r['parse_s']:.2f} с, "
+            f"запись {r['insert_s']:.2f} с, {r['mb_s'] or 0:.1f} MB/с (парсер {r['engine']})")
+
+
+def format_total(results, elapsed=None):
+    ok = [r for r in results if r['error'] is None]
+    total = f"Загружено файлов: {len(ok)} из {len(results)}, строк: {sum(r['rows'] for r in ok):,}"
+    if elapsed:
+        total += f", {sum(r['bytes'] for r in ok) / 1024 / 1024 / elapsed:.1f} MB/с за {elapsed:.1f} с"
+    return total
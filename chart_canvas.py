@@ -0,0 +1,82 @@
+import os
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from frame_cache import FrameCache
+
+# холст графика с кэшем готовых картинок: повторный график с теми же датасетом (той же версии),
+# типом и параметрами показывается сразу из кэша, без вычислений и отрисовки
+# вместе с картинкой хранится функция построения фигуры: оси заново строятся только тогда,
+# когда без них не обойтись (изменение размера окна, масштабирование мышью)
+
+CACHE_MB = 64  # картинок на один холст
+
+
+def chart_key(handle, kind, *params): # None - график не кэшируется
+    version = getattr(handle, 'version', None)
+    if version is None:  # результат группировки есть только в памяти
+        return None
+    return (os.path.abspath(handle.db_path), handle.name, version, handle.where, tuple(handle.where_params),
+            kind) + tuple(params)
+
+
+class CachedCanvas(FigureCanvasQTAgg):
+    def __init__(self, figure, cache_mb=CACHE_MB):
+        super().__init__(figure)
+        # ключ -> (картинка, размер в пикселях, построение, байт)
+        self.cache = FrameCache(cache_mb, size=lambda entry: entry[3], copy=None)
+        self.pending = None  # построение фигуры, отложенное после показа картинки из кэша
+
+    def pixel_size(self):
+        return tuple(int(v) for v in self.figure.bbox.size)
+
+    # график на холсте: build(figure) строит фигуру заново, update(figure) пробует обновить
+    # уже нарисованные оси (True - получилось); результат попадает в кэш под ключом key
+    def render(self, key, build, update=None, extra_bytes=0):
+        if update is None or self.pending is not None or not update(self.figure):
+            build(self.figure)
+        self.pending = None
+        self.draw()
+        if key is None:
+            return
+        width, height = self.pixel_size()
+        size = width * height * 4 + extra_bytes
+        if size <= self.cache.budget:  # иначе копия области холста не нужна
+            self.cache.put(key, (self.copy_from_bbox(self.figure.bbox), (width, height), build, size))
+
+    # показ графика из кэша, False - в кэше нет
+    def show_cached(self, key):
+        entry = self.cache.get(key) if key is not None else None
+        if entry is None:
+            return False
+        region, size, build, _ = entry
+        if size == self.pixel_size() and hasattr(self, 'renderer'):
+            self.pending = build
+            self.restore_region(region)
+            self.blit(self.figure.bbox)
+        else:  # размер холста изменился: картинка не подходит, но данные считать не нужно
+            self.pending = None
+            self.render(key, build)
+        return True
+
+    def clear_chart(self):
+        self.pending = None
+        self.figure.clear()
+        self.draw()
+
+    def invalidate(self, db_path, dataset_name): # записи датасета (при загрузке и удалении)
+        self.cache.invalidate(db_path, dataset_name)
+
+    def draw(self): # полная отрисовка: сначала построить фигуру, если показана картинка из кэша
+        if self.pending is not None:
+            build, self.pending = self.pending, None
+            build(self.figure)
+        super().draw()
+
+    def mousePressEvent(self, event): # панель масштабирования работает с осями фигуры
+        if self.pending is not None:
+            self.draw()
+        super().mousePressEvent(event)
+
+    def wheelEvent(self, event):
+        if self.pending is not None:
+            self.draw()
+        super().wheelEvent(event)
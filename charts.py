@@ -0,0 +1,190 @@
+import numpy as np
+import seaborn as sns
+from matplotlib import rcParams
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from downsample import DecimatedLine
+from rollups import LEVEL_NAMES
+import pipeline
+from perf import span
+
+CHART_KINDS = ("scatterplot", "regplot", "pairplot", "heatmap", "line")
+
+# отрисовка графиков на готовой фигуре matplotlib, без зависимости от виджетов
+
+
+def _density(ax, grid, a, b): # двумерная гистограмма: a по оси x, b по оси y
+    counts = grid.hist2d[(a, b)] if (a, b) in grid.hist2d else grid.hist2d[(b, a)].T
+    if counts.max() > 0:
+        ax.pcolormesh(grid.edges[a], grid.edges[b], np.where(counts > 0, counts, np.nan).T,
+                      norm=LogNorm(vmin=1, vmax=counts.max()), cmap='viridis', shading='flat')
+
+
+def _regression_line(ax, fit):
+    if fit is None:
+        return
+    ax.plot(fit['x'], fit['y'], color='C1', linewidth=2)
+    ax.fill_between(fit['x'], fit['low'], fit['high'], color='C1', alpha=0.2)
+
+
+def _subtitle(data):
+    if data['mode'] == 'density':
+        return f" (плотность, {data['rows']:,} строк)"
+    if data['mode'] == 'sample':
+        return f" (выборка {len(data['sample']):,} из {data['rows']:,})"
+    return ""
+
+
+# scatterplot/regplot/pairplot по данным из pipeline.correlation_data
+def draw_correlation(figure, plot_type, data):
+    figure.clear()
+    columns = data['columns']
+
+    if plot_type == "pairplot":
+        draw_pairplot(figure, data)
+        return
+
+    ax = figure.add_subplot(111)
+    col1, col2 = columns[:2]
+    if data['mode'] == 'density':
+        _density(ax, data['grid'], col1, col2)
+        ax.set_xlabel(col1)
+        ax.set_ylabel(col2)
+    else:
+        sns.scatterplot(data=data['sample'], x=col1, y=col2, hue=data.get('stratify'), ax=ax,
+                        s=12 if len(data['sample']) > 1000 else None)
+
+    if plot_type == "regplot":
+        _regression_line(ax, data.get('fit'))
+        ax.set_title(f'Regression Plot: {col1} vs {col2}' + _subtitle(data))
+    else:
+        ax.set_title(f'Scatter Plot: {col1} vs {col2}' + _subtitle(data))
+
+
+# обновление уже нарисованного scatterplot тех же столбцов: точки меняются на месте,
+# оси не перестраиваются; False - график другой и его нужно строить заново
+def update_scatter(figure, data):
+    if data['mode'] == 'density' or data.get('stratify') or len(figure.axes) != 1:
+        return False
+    ax = figure.axes[0]
+    col1, col2 = data['columns'][:2]
+    if (ax.get_xlabel(), ax.get_ylabel()) != (col1, col2) or not ax.get_title().startswith('Scatter Plot') \
+            or len(ax.collections) != 1 or ax.get_legend() is not None:
+        return False
+    points = data['sample'][[col1, col2]].to_numpy(dtype=float, na_value=np.nan)
+    collection = ax.collections[0]
+    collection.set_offsets(points)
+    collection.set_sizes([12 if len(points) > 1000 else rcParams['lines.markersize'] ** 2])
+    ax.ignore_existing_data_limits = True
+    ax.update_datalim(points[~np.isnan(points).any(axis=1)])
+    ax.autoscale_view()
+    ax.set_title(f'Scatter Plot: {col1} vs {col2}' + _subtitle(data))
+    return True
+
+
+# сетка пар на той же фигуре: гистограммы на диагонали, точки или плотность вне ее
+def draw_pairplot(figure, data):
+    columns = data['columns']
+    size = len(columns)
+    axes = figure.subplots(size, size, squeeze=False)
+    for i, row_col in enumerate(columns):
+        for j, col in enumerate(columns):
+            ax = axes[i][j]
+            if i == j:
+                if data['mode'] == 'density':
+                    grid = data['grid']
+                    ax.stairs(grid.hist[col], grid.edges[col], fill=True, alpha=0.7)
+                else:
+                    ax.hist(data['sample'][col].dropna(), bins=30, alpha=0.7)
+            elif data['mode'] == 'density':
+                _density(ax, data['grid'], col, row_col)
+            else:
+                ax.scatter(data['sample'][col], data['sample'][row_col], s=4, alpha=0.5)
+            if i == size - 1:
+                ax.set_xlabel(col)
+            if j == 0:
+                ax.set_ylabel(row_col)
+    figure.subplots_adjust(top=0.95)
+    figure.suptitle('Pairplot' + _subtitle(data))
+
+
+def draw_heatmap(figure, corr_matrix, method='pearson'):
+    figure.clear()
+    ax = figure.add_subplot(111)
+    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0, ax=ax)
+    ax.set_title(f'Тепловая карта корреляций ({method})')
+
+
+# линия прореживается под ширину осей; объект DecimatedLine нужно хранить, пока график на экране
+def draw_line(figure, column, values, method='minmax'):
+    figure.clear()
+    ax = figure.add_subplot(111)
+    series = DecimatedLine(ax, np.arange(len(values)), values, method=method, linewidth=2)
+    ax.set_title(f'Линейный график: {column}')
+    ax.set_ylabel(column)
+    ax.set_xlabel('Номер')
+    ax.grid(True, alpha=0.3)
+    return series
+
+
+# тот же линейный график с новыми значениями: линия и оси остаются, меняются данные
+def update_line(series, column, values, method='minmax'):
+    series.set_data(np.arange(len(values)), values, method)
+    series.ax.set_title(f'Линейный график: {column}')
+    series.ax.set_ylabel(column)
+    return series
+
+
+# линейный график по времени (данные - pipeline.time_line_data): среднее по корзинам,
+# если ряд взят из агрегатов, закрашен диапазон от минимума до максимума корзины
+def draw_time_line(figure, column, data, time_column, method='minmax'):
+    figure.clear()
+    ax = figure.add_subplot(111)
+    x = data['x'] / 86400  # дни от 1970 - числовые даты matplotlib
+    if data['level'] is not None:
+        ax.fill_between(x, data['low'], data['high'], color='C0', alpha=0.2, linewidth=0)
+    series = DecimatedLine(ax, x, data['y'], method=method, linewidth=2)
+    ax.xaxis_date()
+    figure.autofmt_xdate()
+    ax.set_title(f'Линейный график: {column}' + (f' (по {LEVEL_NAMES[data["level"]]})' if data['level'] else ''))
+    ax.set_ylabel(column)
+    ax.set_xlabel(time_column)
+    ax.grid(True, alpha=0.3)
+    return series
+
+
+# построение графика датасета в файл (png/svg по расширению) без интерфейса
+# данные готовит pipeline (там свои замеры), отдельно замеряется отрисовка с сохранением
+# time_column - линейный график по датам этого столбца
+def render_chart(db_path, dataset_name, kind, out_path, column=None, method='pearson', mode='auto',
+                 cap=None, decimation='minmax', time_column=None, figsize=(10, 8), dpi=100):
+    handle = pipeline.open_dataset(db_path, dataset_name)
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+
+    if kind == "heatmap":
+        data = pipeline.correlation_matrix(handle, method)
+    elif kind == "line":
+        column = column or handle.numeric_columns[0]
+        if time_column:
+            data = pipeline.time_line_data(handle, column, time_column, int(figsize[0] * dpi))
+        else:
+            data = pipeline.line_data(handle, column)
+    elif kind in ("scatterplot", "regplot", "pairplot"):
+        options = {'cap': cap} if cap else {}
+        data = pipeline.correlation_data(handle, kind, mode, **options)
+    else:
+        raise ValueError(f"Неизвестный тип графика: {kind}")
+
+    with span(f'draw_{kind}', 'render', dataset=dataset_name):
+        if kind == "heatmap":
+            draw_heatmap(figure, data, method)
+        elif kind == "line" and time_column:
+            draw_time_line(figure, column, data, time_column, decimation)
+        elif kind == "line":
+            draw_line(figure, column, data, decimation)
+        else:
+            draw_correlation(figure, kind, data)
+        figure.savefig(out_path)
+    return out_path
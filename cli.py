@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use('Agg')  # без дисплея: графики только в файлы
+import connection
+from ingest import ENGINES, csv_stem
+import pipeline
+import charts
+import bulk_import
+
+# консольный запуск без PyQt: загрузка цсв, статистика, корреляции и графики в файлы
+# примеры:
+#   python cli.py ingest data/*.csv
+#   python cli.py bulk feeds/ --name sales
+#   python cli.py stats sales_data weather_data
+#   python cli.py plot sales_data weather_data --kind heatmap line --out charts --format svg
+#   python cli.py plot sales_data --kind line --column revenue --time date
+#   python cli.py serve --port 8765
+
+DB_PATH = 'data_visualization.db'
+
+
+def list_datasets(db_path):
+    return connection.get_manager(db_path).reader().execute('''
+        SELECT name, row_count, column_count, storage FROM datasets ORDER BY created_at DESC
+    ''').fetchall()
+
+
+# задания для процессов: только имена и пути, чтобы их можно было передать в другой процесс
+def stats_job(db_path, dataset_name):
+    return pipeline.dataset_stats(pipeline.open_dataset(db_path, dataset_name))
+
+
+def corr_job(db_path, dataset_name, method, out_dir):
+    corr_matrix = pipeline.correlation_matrix(pipeline.open_dataset(db_path, dataset_name), method)
+    if out_dir:
+        path = os.path.join(out_dir, f"{dataset_name}_corr_{method}.csv")
+        corr_matrix.to_csv(path)
+        return path
+    return corr_matrix.to_string()
+
+
+def plot_job(db_path, dataset_name, kind, out_path, options):
+    return charts.render_chart(db_path, dataset_name, kind, out_path, **options)
+
+
+# выполнение заданий в пуле процессов; ошибка одного задания не останавливает остальные
+def run_jobs(jobs, workers, db_options=None):
+    failed = 0
+    # подключения этого процесса не должны достаться исполнителям: sqlite нельзя использовать после fork,
+    # поэтому они закрываются, а процессы запускаются без fork (как в bulk_import.py);
+    # настройки подключений передаются в каждый процесс до первого обращения к БД
+    connection.close_all()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=connection.configure, initargs=(db_options or {},)) as pool:
+        futures = {pool.submit(fn, *args): title for title, fn, args in jobs}
+        for future in as_completed(futures):
+            title = futures[future]
+            try:
+                print(f"== {title}\n{future.result()}")
+            except Exception as e:
+                failed += 1
+                print(f"!! {title}: {e}", file=sys.stderr)
+    return failed
+
+
+def db_options(args): # pragma подключений из параметров командной строки
+    return {'cache_size': -args.cache_mb * 1024 if args.cache_mb else None,
+            'mmap_size': args.mmap_mb * 1024 * 1024 if args.mmap_mb is not None else None,
+            'synchronous': args.synchronous}
+
+
+def cmd_list(args):
+    for name, rows, columns, storage in list_datasets(args.db):
+        print(f"{name}\t{rows}\t{columns}\t{storage}")
+    return 0
+
+
+def cmd_ingest(args):
+    # запись в sqlite идет через одного писателя, поэтому файлы загружаются по очереди
+    failed = 0
+    names = args.name or []
+    for i, file_path in enumerate(args.files):
+        name = names[i] if i < len(names) else csv_stem(file_path)
+        info = {}
+        try:
+            if args.append or args.key:
+                inserted, replaced = pipeline.append_csv(args.db, file_path, name, args.key, args.engine, info)
+                print(f"{name}: добавлено {inserted} строк, заменено {replaced} ({pipeline.throughput(info)})")
+            else:
+                rows, columns = pipeline.ingest_csv(args.db, file_path, name, args.description,
+                                                    'columnar' if args.columnar else 'sqlite', args.engine, info)
+                print(f"{name}: {rows} строк, {columns} столбцов ({pipeline.throughput(info)})")
+        except Exception as e:
+            failed += 1
+            print(f"!! {file_path}: {e}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+# папка или маска: файлы разбираются в --workers процессах, запись идет в этом процессе
+def cmd_bulk(args):
+    start = time.perf_counter()
+    results = bulk_import.bulk_import(args.db, args.sources, args.name, args.per_file, args.description,
+                                      'columnar' if args.columnar else 'sqlite', args.key, args.pattern,
+                                      args.workers, args.engine, on_file=lambda result: print(bulk_import.format_file(result),
+                                                                                 flush=True))
+    print(bulk_import.format_total(results, time.perf_counter() - start))
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 1 if any(result['error'] for result in results) else 0
+
+
+def cmd_stats(args):
+    jobs = [(name, stats_job, (args.db, name)) for name in args.datasets]
+    return 1 if run_jobs(jobs, args.workers, db_options(args)) else 0
+
+
+def cmd_corr(args):
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    jobs = [(name, corr_job, (args.db, name, args.method, args.out)) for name in args.datasets]
+    return 1 if run_jobs(jobs, args.workers, db_options(args)) else 0
+
+
+# имя файла графика: у линейного графика еще столбец и столбец дат, чтобы графики
+# по номеру строки и по времени (или по разным столбцам) не перезаписывали друг друга
+def chart_file_name(name, kind, column=None, time_column=None):
+    parts = [name, kind]
+    if kind == 'line':
+        parts += [col for col in (column, time_column) if col]
+    return "_".join(parts)
+
+
+def cmd_plot(args):
+    os.makedirs(args.out, exist_ok=True)
+    options = {'method': args.method, 'mode': args.mode, 'cap': args.cap, 'column': args.column,
+               'time_column': args.time}
+    jobs = []
+    for name in args.datasets:
+        for kind in args.kind:
+            out_path = os.path.join(args.out, f"{chart_file_name(name, kind, args.column, args.time)}.{args.format}")
+            jobs.append((f"{name} {kind}", plot_job, (args.db, name, kind, out_path, options)))
+    return 1 if run_jobs(jobs, args.workers, db_options(args)) else 0
+
+
+def cmd_serve(args):
+    import server
+    server.serve(args.db, args.host, args.port, args.unix, args.workers, args.verbose)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Анализ датасетов без графического интерфейса")
+    parser.add_argument('--db', default=DB_PATH, help="путь к базе данных")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="число процессов")
+    parser.add_argument('--cache-mb', type=int, help="кэш страниц sqlite на подключение, МБ")
+    parser.add_argument('--mmap-mb', type=int, help="размер mmap файла БД, МБ (0 - выключить)")
+    parser.add_argument('--synchronous', choices=['OFF', 'NORMAL', 'FULL'], help="режим записи на диск")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help="список датасетов").set_defaults(func=cmd_list)
+
+    ingest = commands.add_parser('ingest', help="загрузка цсв файлов")
+    ingest.add_argument('files', nargs='+')
+    ingest.add_argument('--name', action='append', help="название датасета (по порядку файлов)")
+    ingest.add_argument('--description', default="")
+    ingest.add_argument('--columnar', action='store_true', help="колоночное хранение числовых столбцов")
+    ingest.add_argument('--append', action='store_true', help="дописать строки в существующий датасет")
+    ingest.add_argument('--key', help="дописать с заменой строк с тем же значением столбца-ключа")
+    ingest.add_argument('--engine', choices=ENGINES, default='c', help="парсер цсв (pyarrow - многопоточный)")
+    ingest.set_defaults(func=cmd_ingest)
+
+    bulk = commands.add_parser('bulk', help="пакетная загрузка цсв из папки или по маске")
+    bulk.add_argument('sources', nargs='+', help="папки, маски (в кавычках) или файлы")
+    bulk.add_argument('--name', help="датасет, в который объединяются файлы (при --per-file - префикс)")
+    bulk.add_argument('--per-file', action='store_true', help="каждый файл в отдельный датасет")
+    bulk.add_argument('--pattern', default=bulk_import.CSV_PATTERN, help="маска файлов в папке")
+    bulk.add_argument('--description', default="")
+    bulk.add_argument('--columnar', action='store_true', help="колоночное хранение числовых столбцов")
+    bulk.add_argument('--key', help="замена строк с тем же значением столбца-ключа")
+    bulk.add_argument('--report', help="отчет по файлам в json")
+    bulk.add_argument('--engine', choices=ENGINES, default='c', help="парсер цсв (pyarrow - многопоточный)")
+    bulk.set_defaults(func=cmd_bulk)
+
+    stats = commands.add_parser('stats', help="статистика датасетов")
+    stats.add_argument('datasets', nargs='+')
+    stats.set_defaults(func=cmd_stats)
+
+    corr = commands.add_parser('corr', help="корреляционные матрицы")
+    corr.add_argument('datasets', nargs='+')
+    corr.add_argument('--method', choices=['pearson', 'spearman'], default='pearson')
+    corr.add_argument('--out', help="папка для csv (иначе вывод в консоль)")
+    corr.set_defaults(func=cmd_corr)
+
+    plot = commands.add_parser('plot', help="графики в файлы")
+    plot.add_argument('datasets', nargs='+')
+    plot.add_argument('--kind', nargs='+', choices=charts.CHART_KINDS, default=['heatmap'])
+    plot.add_argument('--column', help="столбец для линейного графика")
+    plot.add_argument('--time', help="столбец дат: линейный график по времени (по агрегатам, см. rollups.py)")
+    plot.add_argument('--method', choices=['pearson', 'spearman'], default='pearson')
+    plot.add_argument('--mode', choices=['auto', 'sample', 'density'], default='auto')
+    plot.add_argument('--cap', type=int, help="точек в выборке")
+    plot.add_argument('--format', choices=['png', 'svg'], default='png')
+    plot.add_argument('--out', default='charts', help="папка для файлов")
+    plot.set_defaults(func=cmd_plot)
+
+    serve = commands.add_parser('serve', help="локальный сервер датасетов для других процессов (см. server.py)")
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8765)
+    serve.add_argument('--unix', help="путь к unix-сокету вместо порта")
+    serve.add_argument('--verbose', action='store_true', help="писать каждый запрос в консоль")
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    connection.configure(db_options(args))
+    pipeline.prepare_database(args.db)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
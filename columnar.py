@@ -0,0 +1,104 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+# необязательное колоночное хранение числовых столбцов рядом с БД:
+# каждый столбец - отдельный файл float64, читается через np.memmap без разбора sql
+# описание файлов (манифест) хранится в каталоге datasets, основная таблица в sqlite остается
+
+STORAGE_DIR = 'columnar'
+DTYPE = 'float64'
+
+
+def storage_root(db_path):
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), STORAGE_DIR)
+
+
+# папка датасета: читаемая часть имени и хэш полного имени, чтобы разные имена ("a b" и "a_b")
+# не попадали в одну папку, а имена вроде "." и ".." не указывали за пределы columnar/
+def dataset_dir(db_path, dataset_name):
+    readable = re.sub(r'[^\w-]', '_', dataset_name)[:40]
+    digest = hashlib.sha1(dataset_name.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(storage_root(db_path), f"{readable}-{digest}")
+
+
+def remove_tree(db_path, path): # удаление только папок строго внутри columnar/
+    root = os.path.realpath(storage_root(db_path))
+    path = os.path.realpath(path)
+    if path == root or os.path.commonpath([root, path]) != root:
+        raise ValueError(f"Папка вне хранилища столбцов: {path}")
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class ColumnarWriter: # дописывает куски в файлы столбцов
+    # manifest - дописывание в уже существующие файлы датасета
+    def __init__(self, db_path, dataset_name, columns, manifest=None):
+        self.path = dataset_dir(db_path, dataset_name)
+        self.columns = list(columns)
+        self.db_path = db_path
+        if manifest is None:
+            self.rows = 0
+            remove_tree(db_path, self.path)
+            os.makedirs(self.path)
+            self.files = {col: f"{i}.bin" for i, col in enumerate(self.columns)}
+            self.handles = {col: open(os.path.join(self.path, name), 'wb') for col, name in self.files.items()}
+        else:
+            self.rows = manifest['rows']
+            self.files = {col: manifest['files'][col] for col in self.columns}
+            self.handles = {}
+            for col, name in self.files.items():
+                path = os.path.join(self.path, name)
+                # хвост от прерванного дописывания отбрасывается
+                os.truncate(path, self.rows * np.dtype(DTYPE).itemsize)
+                self.handles[col] = open(path, 'ab')
+        self.appending = manifest is not None
+
+    def write(self, chunk):
+        for col in self.columns:
+            values = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=DTYPE, na_value=np.nan)
+            self.handles[col].write(values.tobytes())
+        self.rows += len(chunk)
+
+    def close(self): # возвращает манифест для каталога
+        for handle in self.handles.values():
+            handle.close()
+        return {'dtype': DTYPE, 'rows': self.rows, 'files': {str(col): name for col, name in self.files.items()}}
+
+    def abort(self): # при дописывании манифест не меняется, и лишний хвост файлов не читается
+        for handle in self.handles.values():
+            handle.close()
+        if not self.appending:
+            remove_tree(self.db_path, self.path)
+
+
+def save_manifest(conn, dataset_name, manifest):
+    conn.execute("UPDATE datasets SET storage = 'columnar', manifest = ? WHERE name = ?",
+                 (json.dumps(manifest), dataset_name))
+    conn.commit()
+
+
+def drop_manifest(conn, dataset_name): # данные снова только в sqlite
+    conn.execute("UPDATE datasets SET storage = 'sqlite', manifest = NULL WHERE name = ?", (dataset_name,))
+    conn.commit()
+
+
+def load_manifest(conn, dataset_name):
+    row = conn.execute("SELECT storage, manifest FROM datasets WHERE name = ?", (dataset_name,)).fetchone()
+    if row is None or row[0] != 'columnar' or not row[1]:
+        return None
+    return json.loads(row[1])
+
+
+def open_column(db_path, dataset_name, manifest, column): # массив только для чтения поверх файла
+    path = os.path.join(dataset_dir(db_path, dataset_name), manifest['files'][column])
+    if not manifest['rows']:
+        return np.empty(0, dtype=manifest['dtype'])
+    return np.memmap(path, dtype=manifest['dtype'], mode='r', shape=(manifest['rows'],))
+
+
+def remove_dataset(db_path, dataset_name):
+    remove_tree(db_path, dataset_dir(db_path, dataset_name))
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# подключения к БД: журнал WAL, настраиваемые pragma, у каждого потока свое подключение на чтение,
+# все записи идут через одно подключение-писатель под блокировкой
+# в режиме WAL чтение не ждет запись, поэтому долгая загрузка не блокирует остальные окна и задачи
+
+DEFAULT_OPTIONS = {
+    'cache_size': -64 * 1024,  # в КБ (отрицательное значение), т.е. 64 МБ на подключение
+    'mmap_size': 256 * 1024 * 1024,  # байт файла БД, читаемых через mmap
+    'synchronous': 'NORMAL',  # в WAL достаточно для сохранности при сбое приложения
+    'temp_store': 'MEMORY',
+    'busy_timeout': 60000,  # мс ожидания блокировки другим процессом
+}
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def configure(options): # общие настройки для всех менеджеров, создаваемых в этом процессе
+    DEFAULT_OPTIONS.update({key: value for key, value in options.items() if value is not None})
+
+
+class ConnectionManager:
+    def __init__(self, db_path, **options):
+        self.db_path = db_path
+        self.options = dict(DEFAULT_OPTIONS, **options)
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.RLock()
+
+        # режим журнала сохраняется в самом файле БД, достаточно включить один раз
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.db_path, timeout=self.options['busy_timeout'] / 1000,
+                               check_same_thread=check_same_thread)
+        conn.execute(f"PRAGMA cache_size={int(self.options['cache_size'])}")
+        conn.execute(f"PRAGMA mmap_size={int(self.options['mmap_size'])}")
+        conn.execute(f"PRAGMA synchronous={self.options['synchronous']}")
+        conn.execute(f"PRAGMA temp_store={self.options['temp_store']}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.options['busy_timeout'])}")
+        return conn
+
+    def reader(self): # подключение текущего потока только для чтения
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    # единственный писатель: транзакция фиксируется при выходе, при ошибке откатывается
+    @contextmanager
+    def writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect(check_same_thread=False)
+            try:
+                yield self._writer
+                if self._writer.in_transaction:
+                    self._writer.commit()
+            except BaseException:
+                if self._writer.in_transaction:
+                    self._writer.rollback()
+                raise
+
+    def close(self):
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._readers_lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    pass  # подключение другого потока
+            self._readers.clear()
+
+
+def get_manager(db_path): # один менеджер на файл БД в процессе
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConnectionManager(db_path)
+        return manager
+
+
+def close_all():
+    with _managers_lock:
+        for manager in _managers.values():
+            manager.close()
+        _managers.clear()
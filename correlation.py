@@ -0,0 +1,127 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+# корреляционная матрица по кускам строк через достаточные статистики
+# (суммы, суммы квадратов, попарные произведения), с учетом пропусков как в pandas:
+# каждая пара столбцов считается только по строкам, где заполнены оба значения
+
+
+class CorrelationAccumulator:
+    def __init__(self, columns):
+        self.columns = list(columns)
+        size = len(self.columns)
+        self.shift = None  # сдвиг значений к первому куску, чтобы суммы не теряли точность
+        self.n = np.zeros((size, size))  # строк, где заполнены оба столбца
+        self.sx = np.zeros((size, size))  # сумма x_i по таким строкам
+        self.sxx = np.zeros((size, size))  # сумма x_i^2 по таким строкам
+        self.sxy = np.zeros((size, size))  # сумма x_i * x_j
+        self.rows = 0
+
+    def _values(self, chunk):
+        values = chunk[self.columns].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        if self.shift is None:
+            shift = np.nanmean(values, axis=0) if len(values) else np.zeros(len(self.columns))
+            self.shift = np.nan_to_num(shift)
+        return values - self.shift
+
+    # вклад одного куска: четыре матричных произведения
+    def _partial(self, values):
+        mask = (~np.isnan(values)).astype(float)
+        filled = np.nan_to_num(values)
+        return (mask.T @ mask, filled.T @ mask, (filled * filled).T @ mask, filled.T @ filled, len(values))
+
+    def _add(self, partial):
+        n, sx, sxx, sxy, rows = partial
+        self.n += n
+        self.sx += sx
+        self.sxx += sxx
+        self.sxy += sxy
+        self.rows += rows
+
+    def update(self, chunk):
+        self._add(self._partial(self._values(chunk)))
+
+    # параллельный подсчет по кускам; numpy отпускает GIL в матричных произведениях
+    def update_many(self, chunks, workers=None):
+        workers = workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for chunk in chunks:
+                pending.append(pool.submit(self._partial, self._values(chunk)))
+                if len(pending) >= workers * 2:
+                    self._add(pending.pop(0).result())
+            for future in pending:
+                self._add(future.result())
+
+    def merge(self, other): # объединение накопителей одинаковых столбцов
+        if other.shift is None:
+            return
+        if self.shift is None:
+            self.shift = other.shift.copy()
+        delta = other.shift - self.shift
+        # пересчет сумм other к сдвигу self: x + delta
+        d_row = delta[:, None]
+        sx = other.sx + d_row * other.n
+        sxx = other.sxx + 2 * d_row * other.sx + d_row ** 2 * other.n
+        sxy = other.sxy + d_row * other.sx.T + delta[None, :] * other.sx + np.outer(delta, delta) * other.n
+        self._add((other.n, sx, sxx, sxy, other.rows))
+
+    def matrix(self, min_periods=1): # пирсон, как DataFrame.corr()
+        n = self.n
+        sy = self.sx.T
+        syy = self.sxx.T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cov = n * self.sxy - self.sx * sy
+            var_x = n * self.sxx - self.sx ** 2
+            var_y = n * syy - sy ** 2
+            corr = cov / np.sqrt(var_x * var_y)
+        undefined = (n < max(min_periods, 2)) | (var_x <= 0) | (var_y <= 0)
+        corr = np.where(undefined, np.nan, np.clip(corr, -1, 1))
+        # на диагонали 1, если у столбца есть разброс
+        np.fill_diagonal(corr, np.where(np.diag(undefined), np.nan, 1.0))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def to_state(self): # для сохранения в кэш и дозаписи строк
+        return {
+            'columns': self.columns,
+            'shift': None if self.shift is None else self.shift.tolist(),
+            'n': self.n.tolist(), 'sx': self.sx.tolist(), 'sxx': self.sxx.tolist(), 'sxy': self.sxy.tolist(),
+            'rows': self.rows,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        acc = cls(state['columns'])
+        acc.shift = None if state['shift'] is None else np.array(state['shift'])
+        acc.n, acc.sx = np.array(state['n']), np.array(state['sx'])
+        acc.sxx, acc.sxy = np.array(state['sxx']), np.array(state['sxy'])
+        acc.rows = state['rows']
+        return acc
+
+
+# ранговая корреляция спирмена (ранги требуют все значения столбцов)
+def spearman(df):
+    df = df.apply(pd.to_numeric, errors='coerce')
+    columns = list(df.columns)
+    if not df.isnull().values.any():
+        ranks = df.rank()
+        acc = CorrelationAccumulator(columns)
+        acc.update(ranks)
+        return acc.matrix()
+
+    # с пропусками ранги считаются заново для каждой пары по общим строкам, как в pandas
+    result = np.full((len(columns), len(columns)), np.nan)
+    values = df.to_numpy(dtype=float)
+    for i in range(len(columns)):
+        for j in range(i, len(columns)):
+            both = ~np.isnan(values[:, i]) & ~np.isnan(values[:, j])
+            if both.sum() < 2:
+                continue
+            x = pd.Series(values[both, i]).rank().to_numpy()
+            y = pd.Series(values[both, j]).rank().to_numpy()
+            if x.std() == 0 or y.std() == 0:
+                continue
+            result[i, j] = result[j, i] = np.corrcoef(x, y)[0, 1]
+    return pd.DataFrame(result, index=columns, columns=columns)
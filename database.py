@@ -1,10 +1,24 @@
 import sqlite3
 import pandas as pd
 import numpy as np
+from stats_cache import invalidate, bump_version
+from rollups import drop_rollups
 
 
 def create_database(): # sozdanie bd
     conn = sqlite3.connect('data_visualization.db')
+    create_catalog(conn)
+
+    # primery dlya proverki
+    create_sample_data(conn)
+
+    conn.commit()
+    conn.close()
+    print("База данных 'data_visualization.db' создана успешно!")
+    print("Примеры датасетов загружены: sales_data, student_data, weather_data")
+
+
+def create_catalog(conn): # служебные таблицы, вызывается и для уже существующей БД
     cursor = conn.cursor()
     # с помощью функции cursor будем управлять нашей БД
     # tablica dlya infy o datasetah
@@ -15,17 +29,80 @@ def create_database(): # sozdanie bd
             description TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             row_count INTEGER,
-            column_count INTEGER
+            column_count INTEGER,
+            version INTEGER NOT NULL DEFAULT 1,
+            storage TEXT NOT NULL DEFAULT 'sqlite',
+            manifest TEXT,
+            schema TEXT
         )
     ''')
 
-    # primery dlya proverki
-    create_sample_data(conn)
+    # столбцы новых версий, для старых БД добавляем:
+    # version - версия содержимого датасета для проверки кэшей,
+    # storage/manifest - где лежат данные ('sqlite' или 'columnar') и описание файлов столбцов,
+    # schema - компактные типы столбцов для чтения в pandas (см. dtypes.py)
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(datasets)")]
+    for column, definition in (('version', "INTEGER NOT NULL DEFAULT 1"),
+                               ('storage', "TEXT NOT NULL DEFAULT 'sqlite'"),
+                               ('manifest', "TEXT"),
+                               ('schema', "TEXT")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE datasets ADD COLUMN {column} {definition}")
+
+    # кэш посчитанной статистики по датасетам
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dataset_stats (
+            dataset TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (dataset, kind)
+        )
+    ''')
 
+    # сколько раз по столбцу фильтровали - для автоматических индексов (см. query.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS column_usage (
+            dataset TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            uses INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dataset, column_name)
+        )
+    ''')
+
+    # агрегаты числовых столбцов по времени для графиков по датам (см. rollups.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS time_rollups (
+            dataset TEXT NOT NULL,
+            time_column TEXT NOT NULL,
+            level TEXT NOT NULL,
+            value_column TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            total REAL,
+            low REAL,
+            high REAL,
+            PRIMARY KEY (dataset, time_column, level, value_column, bucket)
+        )
+    ''')
     conn.commit()
-    conn.close()
-    print("База данных 'data_visualization.db' создана успешно!")
-    print("Примеры датасетов загружены: sales_data, student_data, weather_data")
+
+
+# таблица примера заменяется целиком: кэш статистики, агрегаты и схема типов прежних данных не подходят
+def save_sample(conn, df, name, description):
+    df.to_sql(name, conn, if_exists='replace', index=False)
+    conn.execute('''
+        INSERT OR IGNORE INTO datasets (name, description, row_count, column_count)
+        VALUES (?, ?, ?, ?)
+    ''', (name, description, len(df), len(df.columns)))
+    conn.execute('''
+        UPDATE datasets SET row_count = ?, column_count = ?, schema = NULL, storage = 'sqlite', manifest = NULL
+        WHERE name = ?
+    ''', (len(df), len(df.columns), name))
+    invalidate(conn, name)
+    bump_version(conn, name)
+    drop_rollups(conn, name)
 
 
 def create_sample_data(conn): # заполняем простыми данными БД
@@ -38,13 +115,7 @@ def create_sample_data(conn): # заполняем простыми данным
         'region': ['North', 'South', 'East', 'West'] * 25
     }
     sales_df = pd.DataFrame(sales_data)
-    sales_df.to_sql('sales_data', conn, if_exists='replace', index=False)
-
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR IGNORE INTO datasets (name, description, row_count, column_count)
-        VALUES (?, ?, ?, ?)
-    ''', ('sales_data', 'Данные о продажах компании', len(sales_df), len(sales_df.columns)))
+    save_sample(conn, sales_df, 'sales_data', 'Данные о продажах компании')
 
     # успеваемость студентов
     student_data = {
@@ -56,12 +127,7 @@ def create_sample_data(conn): # заполняем простыми данным
         'grade': np.random.choice(['A', 'B', 'C', 'D'], 50)
     }
     student_df = pd.DataFrame(student_data)
-    student_df.to_sql('student_data', conn, if_exists='replace', index=False)
-
-    cursor.execute('''
-        INSERT OR IGNORE INTO datasets (name, description, row_count, column_count)
-        VALUES (?, ?, ?, ?)
-    ''', ('student_data', 'Успеваемость студентов', len(student_df), len(student_df.columns)))
+    save_sample(conn, student_df, 'student_data', 'Успеваемость студентов')
 
     # погодные данные
     weather_data = {
@@ -72,12 +138,7 @@ def create_sample_data(conn): # заполняем простыми данным
         'rainfall': np.random.uniform(0, 10, 30)
     }
     weather_df = pd.DataFrame(weather_data)
-    weather_df.to_sql('weather_data', conn, if_exists='replace', index=False)
-
-    cursor.execute('''
-        INSERT OR IGNORE INTO datasets (name, description, row_count, column_count)
-        VALUES (?, ?, ?, ?)
-    ''', ('weather_data', 'Метеорологические данные', len(weather_df), len(weather_df.columns)))
+    save_sample(conn, weather_df, 'weather_data', 'Метеорологические данные')
 
 
 if __name__ == "__main__":
@@ -0,0 +1,310 @@
+import os
+import copy
+import json
+import time
+import pandas as pd
+import numpy as np
+from ingest import quote_ident, CHUNK_SIZE
+import columnar
+from dtypes import apply_schema, load_schema
+from rollups import is_date_column
+from connection import get_manager
+from frame_cache import frames
+from perf import span, tracer
+
+# ленивый доступ к датасету в БД: при открытии читаются только метаданные,
+# данные запрашиваются по нужным столбцам и диапазонам строк
+
+
+def is_numeric_type(sql_type): # правила определения типа столбца в sqlite
+    sql_type = (sql_type or '').upper()
+    return any(part in sql_type for part in ('INT', 'REAL', 'FLOA', 'DOUB', 'NUMERIC', 'DECIMAL'))
+
+
+class DatasetHandle:
+    where = None  # условие отбора строк (см. filtered)
+    where_params = ()
+    cacheable = True  # статистика относится ко всему датасету и может храниться в кэше
+
+    def __init__(self, db_path, name):
+        self.db_path = db_path
+        self.name = name
+        self.table = quote_ident(name)
+        self.db = get_manager(db_path)
+
+        conn = self.connect()
+        info = conn.execute(f"PRAGMA table_info({self.table})").fetchall()
+        if not info:
+            raise ValueError(f"Таблица датасета '{name}' не найдена")
+        # (cid, name, type, notnull, default, pk)
+        self.columns = [row[1] for row in info]
+        self.sql_types = {row[1]: row[2] for row in info}
+
+        # число строк берем из каталога, без полного прохода по таблице
+        row = conn.execute("SELECT row_count, version FROM datasets WHERE name = ?", (name,)).fetchone()
+        self.version = row[1] if row else None
+        if row is None or row[0] is None:
+            row = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        self.row_count = row[0]
+
+        # если rowid идут подряд, страницы читаются по диапазону rowid вместо OFFSET
+        # отдельные подзапросы: MIN и MAX в одном SELECT sqlite считает полным проходом по таблице
+        first, last = conn.execute(f"SELECT (SELECT MIN(rowid) FROM {self.table}), "
+                                   f"(SELECT MAX(rowid) FROM {self.table})").fetchone()
+        self.first_rowid = first
+        self.last_rowid = last
+        self.dense_rowid = first is not None and last - first + 1 == self.row_count
+
+        # числовые столбцы могут дополнительно лежать в колоночных файлах
+        self.manifest = columnar.load_manifest(conn, name)
+        # компактные типы столбцов, подобранные при загрузке или первом подсчете статистики
+        self.schema = load_schema(conn, name)
+
+    def connect(self): # подключение текущего потока только для чтения, закрывать не нужно
+        return self.db.reader()
+
+    @property
+    def numeric_columns(self):
+        return [col for col in self.columns if is_numeric_type(self.sql_types[col])]
+
+    @property
+    def time_columns(self): # столбцы дат (для графиков по времени)
+        schema = self.schema or {}
+        return [col for col in self.columns if is_date_column(self.sql_types[col], schema.get(col))]
+
+    # тот же датасет, но только строки, подходящие под условие (отбор выполняет sqlite)
+    def filtered(self, where, params=()):
+        view = copy.copy(self)
+        view.where = where
+        view.where_params = list(params)
+        view.cacheable = False
+        view.manifest = None  # в колоночных файлах все строки датасета
+        view.dense_rowid = False
+        view.row_count = view.connect().execute(f"SELECT COUNT(*) FROM {self.table} WHERE {where}",
+                                                view.where_params).fetchone()[0]
+        return view
+
+    def _select(self, columns=None, offset=0, limit=None, after_rowid=None):
+        columns_sql = ", ".join(quote_ident(col) for col in columns) if columns else "*"
+        sql = f"SELECT {columns_sql} FROM {self.table}"
+        conditions = [f"({self.where})"] if self.where else []
+        params = list(self.where_params)
+        if after_rowid is not None:
+            # только строки, дописанные после указанной
+            conditions.append("rowid > ?")
+            params.append(after_rowid)
+            return sql + " WHERE " + " AND ".join(conditions) + " ORDER BY rowid", params
+        if limit is None and not offset:
+            return (sql + " WHERE " + " AND ".join(conditions) if conditions else sql), params
+        if self.dense_rowid:
+            sql += " WHERE rowid >= ? ORDER BY rowid"
+            params.append(self.first_rowid + offset)
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+        else:
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            sql += " ORDER BY rowid LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset]
+        return sql, params
+
+    # страница строк по rowid соседней страницы (keyset) вместо OFFSET от начала таблицы:
+    # after_rowid - строки после него (skip строк пропускается), before_rowid - limit строк перед ним
+    # возвращает (строки, rowid первой, rowid последней)
+    def read_keyset(self, limit, after_rowid=None, before_rowid=None, skip=0):
+        sql = f"SELECT rowid, * FROM {self.table}"
+        conditions = [f"({self.where})"] if self.where else []
+        params = list(self.where_params)
+        if after_rowid is not None:
+            conditions.append("rowid > ?")
+            params.append(after_rowid)
+        if before_rowid is not None:
+            conditions.append("rowid < ?")
+            params.append(before_rowid)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY rowid {'DESC' if before_rowid is not None else ''} LIMIT ? OFFSET ?"
+        params += [limit, skip]
+        with span('read', 'sql', dataset=self.name) as info:
+            df = pd.read_sql_query(sql, self.connect(), params=params)
+            info['rows'] = len(df)
+        if before_rowid is not None:
+            df = df.iloc[::-1]
+        rowids = df.iloc[:, 0]
+        df = df.iloc[:, 1:].reset_index(drop=True)
+        if not len(df):
+            return df, None, None
+        return apply_schema(df, self.schema), int(rowids.iloc[0]), int(rowids.iloc[-1])
+
+    def min_max(self, columns): # минимум и максимум столбцов одним запросом
+        select = ", ".join(f"MIN({quote_ident(col)}), MAX({quote_ident(col)})" for col in columns)
+        sql = f"SELECT {select} FROM {self.table}" + (f" WHERE {self.where}" if self.where else "")
+        row = self.connect().execute(sql, list(self.where_params)).fetchone()
+        return {col: (row[2 * i], row[2 * i + 1]) for i, col in enumerate(columns)}
+
+    # случайные строки без прохода по таблице: при сплошных rowid выбираются случайные номера строк
+    # (None, если в rowid есть пропуски или это срез - тогда выборка делается проходом по кускам)
+    def sample_rows(self, columns, n, seed=None):
+        if not self.dense_rowid:
+            return None
+        rng = np.random.default_rng(seed)
+        positions = np.sort(rng.choice(self.row_count, size=min(n, self.row_count), replace=False))
+        if self.is_columnar(columns):
+            return pd.DataFrame({col: self.column_array(col)[positions] for col in columns}, columns=columns)
+        columns_sql = ", ".join(quote_ident(col) for col in columns)
+        sql = (f"SELECT {columns_sql} FROM {self.table} "
+               f"WHERE rowid IN (SELECT value FROM json_each(?)) ORDER BY rowid")
+        with span('sample', 'sql', dataset=self.name) as info:
+            df = pd.read_sql_query(sql, self.connect(), params=[json.dumps((positions + self.first_rowid).tolist())])
+            info['rows'] = len(df)
+        return apply_schema(df, self.schema)
+
+    # суммы для регрессии y ~ x одним проходом: (n, sx, sy, sxx, sxy, syy, min x, max x) по строкам,
+    # где оба значения - числа; значения берутся относительно shift, чтобы не терять точность на больших числах
+    def pair_sums(self, x, y, shift):
+        if self.is_columnar([x, y]):
+            dx, dy = self.column_array(x) - shift[0], self.column_array(y) - shift[1]
+            both = ~np.isnan(dx) & ~np.isnan(dy)
+            dx, dy = dx[both], dy[both]
+            if not len(dx):
+                return (0, 0.0, 0.0, 0.0, 0.0, 0.0, None, None)
+            return (len(dx), dx.sum(), dy.sum(), dx @ dx, dx @ dy, dy @ dy,
+                    dx.min() + shift[0], dx.max() + shift[0])
+        numbers = "IN ('integer', 'real')"
+        conditions = [f"typeof({quote_ident(x)}) {numbers}", f"typeof({quote_ident(y)}) {numbers}"]
+        if self.where:
+            conditions.append(f"({self.where})")
+        sql = f'''
+            SELECT COUNT(*), SUM(dx), SUM(dy), SUM(dx * dx), SUM(dx * dy), SUM(dy * dy), MIN(x), MAX(x) FROM (
+                SELECT {quote_ident(x)} AS x, {quote_ident(x)} - ? AS dx, {quote_ident(y)} - ? AS dy
+                FROM {self.table} WHERE {" AND ".join(conditions)})
+        '''
+        with span('pair_sums', 'sql', dataset=self.name):
+            row = self.connect().execute(sql, [float(shift[0]), float(shift[1])] + list(self.where_params)).fetchone()
+        return tuple(value or 0 for value in row[:6]) + tuple(row[6:])
+
+    def is_columnar(self, columns):
+        return bool(self.manifest and columns and self.manifest['rows'] == self.row_count
+                    and all(col in self.manifest['files'] for col in columns))
+
+    # массив значений столбца: из колоночного файла без копирования, иначе из sqlite
+    def column_array(self, name):
+        if self.is_columnar([name]):
+            return columnar.open_column(self.db_path, self.name, self.manifest, name)
+        return pd.to_numeric(self.column(name), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+    def _columnar_frame(self, columns, start, stop):
+        stop = max(min(stop, self.row_count), start)
+        return pd.DataFrame({col: self.column_array(col)[start:stop] for col in columns},
+                            index=pd.RangeIndex(start, stop), columns=columns)
+
+    # чтение выбранных столбцов и диапазона строк
+    # строки из sqlite приводятся к схеме типов (raw=True - как их отдает read_sql_query);
+    # колоночные файлы читаются как есть, без копирования
+    # столбцы целиком (без offset/limit) берутся из кэша в памяти, если их уже читали
+    def read(self, columns=None, offset=0, limit=None, raw=False):
+        if self.is_columnar(columns):
+            return self._columnar_frame(columns, offset, self.row_count if limit is None else offset + limit)
+        key = None
+        if not offset and limit is None:
+            key = self.cache_key(columns, raw)
+            df = frames.get(key)
+            if df is not None:
+                return df
+        sql, params = self._select(columns, offset, limit)
+        with span('read', 'sql', dataset=self.name) as info:
+            df = pd.read_sql_query(sql, self.connect(), params=params)
+            info['rows'] = len(df)
+            info['bytes'] = int(df.memory_usage(index=False).sum())
+        df.index = pd.RangeIndex(offset, offset + len(df))
+        if not raw:
+            df = apply_schema(df, self.schema)
+        if key is not None:
+            frames.put(key, df)
+        return df
+
+    def cache_key(self, columns, raw): # версия в ключе: после дописывания строк старая запись не подходит
+        return (os.path.abspath(self.db_path), self.name, self.version, self.where, tuple(self.where_params),
+                tuple(columns) if columns else None, raw, tuple(sorted((self.schema or {}).items())))
+
+    def head(self, n=20):
+        return self.read(limit=n)
+
+    def column(self, name): # один столбец целиком
+        return self.read(columns=[name])[name]
+
+    # проход по таблице кусками, для подсчетов без загрузки всего датасета в память
+    def iter_chunks(self, columns=None, chunksize=CHUNK_SIZE, after_rowid=None, raw=False):
+        if after_rowid is None and self.is_columnar(columns):
+            for start in range(0, self.row_count, chunksize):
+                yield self._columnar_frame(columns, start, start + chunksize)
+            return
+        sql, params = self._select(columns, after_rowid=after_rowid)
+        # в замер попадает только чтение из sqlite, а не обработка кусков вызывающим кодом
+        start = time.perf_counter()
+        fetching = 0.0
+        rows = 0
+        chunks = pd.read_sql_query(sql, self.connect(), params=params, chunksize=chunksize)
+        try:
+            while True:
+                fetch_start = time.perf_counter()
+                chunk = next(chunks, None)
+                fetching += time.perf_counter() - fetch_start
+                if chunk is None:
+                    break
+                rows += len(chunk)
+                yield chunk if raw else apply_schema(chunk, self.schema)
+        finally:
+            tracer.add('iter_chunks', 'sql', start, fetching, dataset=self.name, rows=rows)
+
+
+# небольшой результат запроса (например, группировки) в памяти с тем же интерфейсом чтения
+class FrameHandle:
+    cacheable = False
+    schema = None
+    manifest = None
+    last_rowid = None
+    dense_rowid = True  # строки в памяти: чтение по номеру строки и так не зависит от смещения
+
+    def __init__(self, df, name):
+        self.df = df.reset_index(drop=True)
+        self.df.columns = [str(col) for col in self.df.columns]
+        self.name = name
+        self.columns = list(self.df.columns)
+        self.row_count = len(self.df)
+
+    @property
+    def numeric_columns(self):
+        return self.df.select_dtypes(include=[np.number, 'bool']).columns.tolist()
+
+    @property
+    def time_columns(self):
+        return self.df.select_dtypes(include=['datetime']).columns.tolist()
+
+    def is_columnar(self, columns):
+        return False
+
+    def sample_rows(self, columns, n, seed=None): # таблица уже в памяти: выборка обычным проходом по кускам
+        return None
+
+    def read(self, columns=None, offset=0, limit=None, raw=False):
+        df = self.df[columns] if columns else self.df
+        return df.iloc[offset:None if limit is None else offset + limit]
+
+    def head(self, n=20):
+        return self.read(limit=n)
+
+    def column(self, name):
+        return self.df[name]
+
+    def column_array(self, name):
+        return pd.to_numeric(self.df[name], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+    def iter_chunks(self, columns=None, chunksize=CHUNK_SIZE, after_rowid=None, raw=False):
+        for start in range(0, self.row_count, chunksize):
+            yield self.read(columns, start, chunksize)
+
+    def min_max(self, columns):
+        return {col: (self.df[col].min(), self.df[col].max()) if self.df[col].notna().any() else (None, None)
+                for col in columns}
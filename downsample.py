@@ -0,0 +1,91 @@
+import numpy as np
+
+# прореживание длинных рядов перед отрисовкой: точек не больше, чем пикселей на холсте,
+# пики (минимумы и максимумы) при этом сохраняются
+
+
+# минимум и максимум в каждой корзине, в исходном порядке
+def minmax_decimate(x, y, n_buckets):
+    n = len(y)
+    if n <= 2 * n_buckets:
+        return x, y
+    size = int(np.ceil(n / n_buckets))
+    buckets = int(np.ceil(n / size))
+    # хвост дополняем последним значением, чтобы разложить ряд в матрицу корзин
+    padded = np.concatenate([y, np.full(buckets * size - n, y[-1])]).reshape(buckets, size)
+    # пропуски не должны становиться минимумом/максимумом
+    low = np.where(np.isnan(padded), np.inf, padded).argmin(axis=1)
+    high = np.where(np.isnan(padded), -np.inf, padded).argmax(axis=1)
+    offsets = np.arange(buckets) * size
+    index = np.sort(np.concatenate([offsets + low, offsets + high]))
+    index = np.unique(np.minimum(index, n - 1))
+    return x[index], y[index]
+
+
+# Largest-Triangle-Three-Buckets: n_out точек, сохраняющих форму ряда
+def lttb(x, y, n_out):
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    index = np.empty(n_out, dtype=int)
+    index[0], index[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # среднее следующей корзины (для последней - последняя точка)
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = np.nanmean(y[end:next_end]) if next_end > end else y[-1]
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        area = np.abs((x[previous] - next_x) * (bucket_y - y[previous])
+                      - (x[previous] - bucket_x) * (next_y - y[previous]))
+        previous = start + int(np.nanargmax(area)) if not np.all(np.isnan(area)) else start
+        index[i + 1] = previous
+    return x[index], y[index]
+
+
+class DecimatedLine: # линия на осях, которая перепрореживается при масштабировании и сдвиге
+    def __init__(self, ax, x, y, method='minmax', **plot_kwargs):
+        self.ax = ax
+        self.line, = ax.plot([], [], **plot_kwargs)
+        self.set_data(x, y, method)
+        # ссылку на объект нужно держать: matplotlib хранит слабую ссылку на обработчик
+        ax.callbacks.connect('xlim_changed', self.on_xlim_changed)
+
+    # новый ряд на тех же осях и линии (без перестроения графика)
+    def set_data(self, x, y, method='minmax'):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.method = method
+        if len(self.x):
+            self.ax.set_xlim(self.x[0], self.x[-1] if len(self.x) > 1 else self.x[0] + 1)
+            low, high = np.nanmin(self.y), np.nanmax(self.y)
+            margin = (high - low) * 0.05 or 1
+            self.ax.set_ylim(low - margin, high + margin)
+        self.update()
+
+    def width_px(self): # ширина осей в пикселях
+        try:
+            return max(int(self.ax.get_window_extent().width), 100)
+        except Exception:
+            return 1000
+
+    def update(self):
+        if not len(self.x):
+            return
+        low, high = self.ax.get_xlim()
+        # видимый диапазон плюс по точке с каждой стороны, чтобы линия уходила за край
+        start = max(np.searchsorted(self.x, low, side='left') - 1, 0)
+        end = min(np.searchsorted(self.x, high, side='right') + 1, len(self.x))
+        x, y = self.x[start:end], self.y[start:end]
+        width = self.width_px()
+        if self.method == 'lttb':
+            x, y = lttb(x, y, 2 * width)
+        else:
+            x, y = minmax_decimate(x, y, width)
+        self.line.set_data(x, y)
+        self.shown_points = len(x)
+
+    def on_xlim_changed(self, ax):
+        self.update()
@@ -0,0 +1,200 @@
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+# подбор компактных типов столбцов за один проход по кускам данных:
+# строки с небольшим числом различных значений -> category, даты в формате ISO -> datetime64,
+# целые без пропусков -> наименьший подходящий int, дробные -> float32, если точность не теряется
+# схема (столбец -> тип) хранится в каталоге datasets и применяется к каждому прочитанному куску
+
+CATEGORY_MAX = 1000  # различных значений не больше этого
+CATEGORY_RATIO = 0.5  # и не больше такой доли от числа строк
+INT_TYPES = ('int8', 'int16', 'int32', 'int64')
+ISO_DATE = r'\d{4}-\d{2}-\d{2}'  # только даты вида 2023-01-31, чтобы не принять числа за годы
+DATETIME = 'datetime64[ns]'
+
+
+def smallest_int(low, high):
+    for dtype in INT_TYPES:
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return 'int64'
+
+
+def codes_itemsize(categories): # размер кода категории, как выбирает pandas
+    for dtype in INT_TYPES:
+        if categories < np.iinfo(dtype).max:
+            return np.dtype(dtype).itemsize
+    return 8
+
+
+def plain(value): # число numpy -> число python (для json)
+    return value.item() if isinstance(value, np.generic) else value
+
+
+class ColumnProfile: # что известно о столбце по просмотренным кускам
+    def __init__(self):
+        self.kind = None  # 'bool', 'int', 'float', 'text'
+        self.nulls = 0
+        self.low = self.high = None
+        self.float32 = True
+        self.categories = set()  # None, если различных значений слишком много
+        self.dates = True
+        self.raw_bytes = 0
+
+    def update(self, series):
+        self.raw_bytes += int(series.memory_usage(deep=True, index=False))
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if not len(values):
+            return
+
+        if pd.api.types.is_bool_dtype(values):
+            kind = 'bool'
+        elif pd.api.types.is_numeric_dtype(values):
+            array = values.to_numpy()
+            kind = 'int' if pd.api.types.is_integer_dtype(values) or np.all(np.mod(array, 1) == 0) else 'float'
+            low, high = array.min(), array.max()
+            self.low = low if self.low is None else min(self.low, low)
+            self.high = high if self.high is None else max(self.high, high)
+            if self.float32:
+                as_float = array.astype(float)
+                self.float32 = bool(np.array_equal(as_float.astype(np.float32).astype(float), as_float))
+        else:
+            kind = 'text'
+            if self.categories is not None:
+                self.categories.update(values.unique())
+                if len(self.categories) > CATEGORY_MAX:
+                    self.categories = None
+            if self.dates:
+                text = values.astype(str)
+                self.dates = bool(text.str.match(ISO_DATE).all()
+                                  and pd.to_datetime(text, format='ISO8601', errors='coerce').notna().all())
+
+        # смесь типов в одном столбце: числа с дробными -> float, со строками -> text
+        if self.kind is None or self.kind == kind:
+            self.kind = kind
+        elif {self.kind, kind} <= {'bool', 'int', 'float'}:
+            self.kind = 'float' if 'float' in (self.kind, kind) else 'int'
+        else:
+            self.kind = 'text'
+            self.dates = False
+
+    def to_state(self): # для кэша (границы - обычные числа python, категории - список)
+        return {
+            'kind': self.kind, 'nulls': self.nulls, 'low': plain(self.low), 'high': plain(self.high),
+            'float32': self.float32, 'dates': self.dates, 'raw_bytes': self.raw_bytes,
+            'categories': None if self.categories is None else [plain(v) for v in self.categories],
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        profile = cls()
+        profile.kind, profile.nulls = state['kind'], state['nulls']
+        profile.low, profile.high = state['low'], state['high']
+        profile.float32, profile.dates, profile.raw_bytes = state['float32'], state['dates'], state['raw_bytes']
+        profile.categories = None if state['categories'] is None else set(state['categories'])
+        return profile
+
+    def dtype(self, rows):
+        if self.kind == 'bool' and not self.nulls:
+            return 'bool'
+        if self.kind == 'int' and not self.nulls:
+            return smallest_int(self.low, self.high)
+        if self.kind in ('bool', 'int', 'float'):
+            return 'float32' if self.float32 else 'float64'
+        if self.kind == 'text':
+            if self.dates:
+                return DATETIME
+            if self.categories is not None and len(self.categories) <= CATEGORY_RATIO * rows:
+                return 'category'
+        return None  # тип не меняется
+
+    def optimized_bytes(self, rows):
+        dtype = self.dtype(rows)
+        if dtype == 'category':
+            categories = len(self.categories)
+            return rows * codes_itemsize(categories) + sum(sys.getsizeof(v) + 8 for v in self.categories)
+        if dtype is None:
+            return self.raw_bytes
+        return rows * np.dtype(dtype).itemsize
+
+
+class SchemaInference: # профили всех столбцов по кускам, затем схема и оценка памяти
+    def __init__(self):
+        self.rows = 0
+        self.profiles = {}
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        for col in chunk.columns:
+            self.profiles.setdefault(str(col), ColumnProfile()).update(chunk[col])
+
+    def to_state(self):
+        return {'rows': self.rows, 'profiles': {col: profile.to_state() for col, profile in self.profiles.items()}}
+
+    @classmethod
+    def from_state(cls, state):
+        inference = cls()
+        inference.rows = state['rows']
+        inference.profiles = {col: ColumnProfile.from_state(v) for col, v in state['profiles'].items()}
+        return inference
+
+    def schema(self): # только столбцы, тип которых меняется
+        schema = {col: profile.dtype(self.rows) for col, profile in self.profiles.items()}
+        return {col: dtype for col, dtype in schema.items() if dtype is not None}
+
+    def memory(self): # (байт до, байт после) без учета индекса
+        before = sum(profile.raw_bytes for profile in self.profiles.values())
+        after = sum(profile.optimized_bytes(self.rows) for profile in self.profiles.values())
+        return before, after
+
+
+# приведение без потерь: пропуски на тех же местах, а обратное приведение дает те же значения
+def lossless(series, cast):
+    if not (cast.isna() == series.isna()).all():
+        return False  # значение не разобралось (to_numeric и to_datetime дают пропуск)
+    if pd.api.types.is_datetime64_any_dtype(cast):
+        return True
+    return bool(((cast.astype(series.dtype) == series) | series.isna()).all())
+
+
+# приведение куска к схеме; столбец, который не приводится без потерь (схема подобрана по другим
+# строкам), оставляется как есть
+def apply_schema(df, schema):
+    if not schema:
+        return df
+    for col in df.columns:
+        dtype = schema.get(col)
+        series = df[col]
+        if dtype is None or str(series.dtype) == dtype:
+            continue
+        if dtype == DATETIME:
+            cast = pd.to_datetime(series, format='ISO8601', errors='coerce')
+        elif dtype == 'category':
+            df[col] = series.astype('category')
+            continue
+        else:
+            numbers = pd.to_numeric(series, errors='coerce')
+            if dtype in INT_TYPES or dtype == 'bool':
+                if numbers.isna().any():
+                    continue  # в int и bool нет пропусков
+                if dtype != 'bool':
+                    info = np.iinfo(dtype)
+                    if len(numbers) and (numbers.min() < info.min or numbers.max() > info.max):
+                        continue
+            cast = numbers.astype(dtype)
+        if lossless(series, cast):
+            df[col] = cast
+    return df
+
+
+def save_schema(conn, dataset_name, schema):
+    conn.execute("UPDATE datasets SET schema = ? WHERE name = ?", (json.dumps(schema), dataset_name))
+
+
+def load_schema(conn, dataset_name):
+    row = conn.execute("SELECT schema FROM datasets WHERE name = ?", (dataset_name,)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
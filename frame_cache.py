@@ -0,0 +1,84 @@
+import os
+import threading
+from collections import OrderedDict
+
+# кэш прочитанных из БД таблиц в памяти процесса: при переключении между датасетами
+# и повторном построении графиков столбцы не читаются из sqlite заново
+# размер ограничен объемом памяти, а не числом записей; дольше всех не нужные вытесняются
+# ключ включает версию датасета, поэтому дописанные строки сразу дают новый ключ;
+# при загрузке и удалении датасета его записи убираются явно (имя могут занять заново)
+# тот же кэш с другой функцией размера хранит картинки графиков (chart_canvas.py, server.py)
+# и страницы таблицы предпросмотра (table_model.py)
+
+DEFAULT_BUDGET_MB = 512
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def frame_copy(df): # копия без копирования данных: изменение столбцов не портит кэш
+    return df.copy(deep=False)
+
+
+class FrameCache:
+    # size(значение) - байт в памяти; copy - копия значения при записи и чтении (None - значение как есть)
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB, size=frame_bytes, copy=frame_copy):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.size = size
+        self.copy = copy
+        self.entries = OrderedDict()  # ключ -> (значение, байт)
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # читают фоновые задачи
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0] if self.copy is None else self.copy(entry[0])
+
+    def put(self, key, value):
+        size = self.size(value)
+        if size > self.budget:
+            return  # больше всего бюджета - не храним
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.used -= old[1]
+            self.entries[key] = (value if self.copy is None else self.copy(value), size)
+            self.used += size
+            while self.used > self.budget:
+                _, (_, freed) = self.entries.popitem(last=False)
+                self.used -= freed
+
+    def invalidate(self, db_path, dataset_name): # все записи датасета (ключ начинается с пути и имени)
+        with self.lock:
+            prefix = (os.path.abspath(db_path), dataset_name)
+            for key in [key for key in self.entries if key[:2] == prefix]:
+                self.used -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.used = 0
+
+    def set_budget(self, budget_mb):
+        with self.lock:
+            self.budget = int(budget_mb * 1024 * 1024)
+            while self.used > self.budget and self.entries:
+                _, (_, freed) = self.entries.popitem(last=False)
+                self.used -= freed
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'used_mb': self.used / 1024 / 1024,
+                    'budget_mb': self.budget / 1024 / 1024, 'hits': self.hits, 'misses': self.misses}
+
+
+frames = FrameCache()  # один на процесс
@@ -0,0 +1,293 @@
+import os
+import sqlite3
+import pandas as pd
+from stats_cache import invalidate, bump_version
+
+# потоковая загрузка цсв в локальную БД кусками фиксированного размера,
+# чтобы память не росла вместе с размером файла
+
+CHUNK_SIZE = 50000  # строк в одном куске
+ENGINES = ('c', 'pyarrow')  # парсеры цсв: обычный pandas и многопоточный pyarrow (если установлен)
+COMPRESSION = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}  # сжатые файлы читаются потоком
+ARROW_BLOCK_SIZE = 4 * 1024 * 1024  # байт на блок pyarrow; по первому блоку подбираются типы столбцов
+# значения, которые pandas по умолчанию читает как пропуск; pyarrow получает тот же список,
+# чтобы от выбора парсера не зависели пропуски, частые значения и подбор типов
+NA_VALUES = ['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>',
+             'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null']
+
+
+class CsvEngineError(ValueError): # pyarrow не смог разобрать файл, его можно прочитать обычным парсером
+    pass
+
+
+def quote_ident(name): # экранирование имени таблицы/столбца для sql
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def sql_type(dtype): # тип столбца в sqlite по типу pandas (как у to_sql)
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
+def infer_schema(df): # схема столбцов по первому куску
+    return [(str(col), sql_type(dtype)) for col, dtype in df.dtypes.items()]
+
+
+def chunk_rows(df): # строки куска в виде кортежей питоновских значений, NaN -> NULL
+    values = df.astype(object).where(df.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def insert_statement(dataset_name, columns):
+    return (f"INSERT INTO {quote_ident(dataset_name)} ({', '.join(quote_ident(col) for col in columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})")
+
+
+def table_exists(conn, name):
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,))
+    return cursor.fetchone() is not None
+
+
+# имя индекса: префикс idx__ и длина имени датасета делают его однозначным
+# (датасет a__b и столбец c не совпадают с датасетом a и столбцом b__c, а индекс - с таблицей a__b)
+def index_name(dataset_name, column):
+    return f"idx__{len(dataset_name)}_{dataset_name}__{column}"
+
+
+def ensure_index(conn, dataset_name, column): # индекс по столбцу датасета, True - если создан сейчас
+    table = quote_ident(dataset_name)
+    # уже есть индекс ровно по этому столбцу (в том числе созданный под старым именем)
+    for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        if [row[2] for row in conn.execute(f"PRAGMA index_info({quote_ident(index[1])})")] == [column]:
+            return False
+    conn.execute(f"CREATE INDEX {quote_ident(index_name(dataset_name, column))} ON {table} ({quote_ident(column)})")
+    return True
+
+
+def csv_stem(file_path): # sales.csv.gz -> sales
+    root, ext = os.path.splitext(os.path.basename(file_path))
+    if ext.lower() in COMPRESSION:
+        root, ext = os.path.splitext(root)
+    return root
+
+
+def compression_of(file_path):
+    return COMPRESSION.get(os.path.splitext(file_path)[1].lower())
+
+
+def pyarrow_available():
+    try:
+        import pyarrow.csv
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_engine(engine): # парсер, который будет использован на самом деле
+    return 'pyarrow' if engine == 'pyarrow' and pyarrow_available() else 'c'
+
+
+class ArrowChunkReader: # цсв через pyarrow: блоки разбираются в нескольких потоках, куски по chunksize строк
+    def __init__(self, file_path, chunksize=CHUNK_SIZE):
+        import pyarrow as pa
+        self.pa = pa
+        self.file_path = file_path
+        self.chunksize = chunksize
+        self.offset = 0
+        self.source = self.reader = None
+        try:
+            self.open({})
+            # даты остаются строками, как у обычного парсера: datetime подбирает схема типов (dtypes.py)
+            dates = {field.name: pa.string() for field in self.reader.schema
+                     if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type)
+                     or pa.types.is_time(field.type)}
+            if dates:
+                self.close()
+                self.open(dates)
+        except pa.ArrowInvalid as e:
+            self.close()
+            raise CsvEngineError(str(e))
+
+    def open(self, column_types):
+        import pyarrow.csv as pa_csv
+        codec = compression_of(self.file_path)
+        if codec is None or (codec != 'xz' and self.pa.Codec.is_available(codec)):
+            self.source = self.pa.input_stream(self.file_path, compression=codec)
+        else:  # xz (и кодеки, которых нет в сборке pyarrow) - распаковка средствами питона
+            self.source = open_compressed(self.file_path, codec)
+        self.reader = pa_csv.open_csv(self.source,
+                                      read_options=pa_csv.ReadOptions(use_threads=True,
+                                                                       block_size=ARROW_BLOCK_SIZE),
+                                      convert_options=pa_csv.ConvertOptions(column_types=column_types,
+                                                                            null_values=NA_VALUES,
+                                                                            strings_can_be_null=True))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        batches = []
+        rows = 0
+        while rows < self.chunksize:
+            try:
+                batch = self.reader.read_next_batch()
+            except StopIteration:
+                break
+            except self.pa.ArrowInvalid as e:  # например, в столбце целых дальше первого блока дробные
+                raise CsvEngineError(str(e))
+            batches.append(batch)
+            rows += batch.num_rows
+        if not batches:
+            raise StopIteration
+        df = self.pa.Table.from_batches(batches).to_pandas()
+        df.index = pd.RangeIndex(self.offset, self.offset + len(df))
+        self.offset += len(df)
+        return df
+
+    def close(self):
+        if self.reader is not None:
+            self.reader.close()
+        if self.source is not None:
+            self.source.close()
+        self.source = self.reader = None
+
+
+def open_compressed(file_path, codec): # файловый объект с распаковкой на лету
+    if codec == 'gzip':
+        import gzip
+        return gzip.open(file_path, 'rb')
+    if codec == 'bz2':
+        import bz2
+        return bz2.open(file_path, 'rb')
+    if codec == 'xz':
+        import lzma
+        return lzma.open(file_path, 'rb')
+    import zstandard
+    return zstandard.open(file_path, 'rb')
+
+
+# цсв кусками (читатель нужно закрыть); сжатые файлы распаковываются потоком, без временных файлов
+# engine='pyarrow' без установленного pyarrow или для файла, который он не открыл, - обычный парсер
+def read_csv_chunks(file_path, chunksize=CHUNK_SIZE, engine='c'):
+    if resolve_engine(engine) == 'pyarrow':
+        try:
+            return ArrowChunkReader(file_path, chunksize)
+        except CsvEngineError:
+            pass
+    return pd.read_csv(file_path, chunksize=chunksize)
+
+
+def check_new_dataset(conn, dataset_name):
+    exists = conn.execute("SELECT 1 FROM datasets WHERE name = ?", (dataset_name,)).fetchone()
+    # имя занято и таблицей, и индексом (у них в sqlite общее пространство имен)
+    taken = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (dataset_name,)).fetchone()
+    if exists or taken:
+        raise sqlite3.IntegrityError(f"Датасет '{dataset_name}' уже существует")
+
+
+# новый датасет из кусков (DataFrame) одной транзакцией, возвращает (строк, столбцов)
+# куски могут прийти из цсв или уже разобранными в другом процессе (bulk_import.py);
+# on_chunk вызывается для каждого куска (например, для подсчета статистики за тот же проход)
+def frames_to_db(conn, chunks, dataset_name, description="", progress=None, on_chunk=None):
+    check_new_dataset(conn, dataset_name)
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        raise ValueError("CSV файл не содержит данных")
+
+    schema = infer_schema(first)
+    columns = [col for col, _ in schema]
+    table = quote_ident(dataset_name)
+    columns_sql = ", ".join(f"{quote_ident(col)} {kind}" for col, kind in schema)
+    insert_sql = insert_statement(dataset_name, columns)
+
+    row_count = 0
+    if conn.in_transaction:
+        conn.commit()
+    try:
+        conn.execute("BEGIN")
+        conn.execute(f"CREATE TABLE {table} ({columns_sql})")
+
+        chunk = first
+        while chunk is not None:
+            conn.executemany(insert_sql, chunk_rows(chunk))
+            if on_chunk is not None:
+                on_chunk(chunk)
+            row_count += len(chunk)
+            if progress is not None:
+                progress(row_count)
+            chunk = next(chunks, None)
+
+        conn.execute('''
+            INSERT INTO datasets (name, description, row_count, column_count)
+            VALUES (?, ?, ?, ?)
+        ''', (dataset_name, description, row_count, len(columns)))
+        # кэш мог остаться от удаленного датасета с тем же именем
+        invalidate(conn, dataset_name)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return row_count, len(columns)
+
+
+# дописывание кусков (DataFrame) в существующий датасет одной транзакцией, возвращает (добавлено, заменено)
+# key - столбец-ключ: строки с тем же значением ключа удаляются перед вставкой новых
+# (в пределах одного файла остается последняя строка с ключом; пустой ключ - тоже значение, как в pandas)
+def append_frames_to_db(conn, chunks, dataset_name, key=None, progress=None, on_chunk=None):
+    exists = conn.execute("SELECT 1 FROM datasets WHERE name = ?", (dataset_name,)).fetchone()
+    if not exists or not table_exists(conn, dataset_name):
+        raise ValueError(f"Датасет '{dataset_name}' не найден")
+
+    table = quote_ident(dataset_name)
+    table_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+    inserted = replaced = 0
+    insert_sql = None
+    if conn.in_transaction:
+        conn.commit()
+    try:
+        conn.execute("BEGIN")
+        for chunk in chunks:
+            chunk.columns = [str(col) for col in chunk.columns]
+            if insert_sql is None:
+                # столбцов, которых нет в файле, в новых строках не будет (NULL)
+                extra = [col for col in chunk.columns if col not in table_columns]
+                if extra:
+                    raise ValueError(f"В датасете '{dataset_name}' нет столбцов: {', '.join(extra)}")
+                if key is not None:
+                    if key not in chunk.columns:
+                        raise ValueError(f"В файле нет ключевого столбца '{key}'")
+                    # индекс по ключу, чтобы удаление старых строк не просматривало всю таблицу
+                    ensure_index(conn, dataset_name, key)
+                insert_sql = insert_statement(dataset_name, list(chunk.columns))
+
+            if key is not None:
+                chunk = chunk.drop_duplicates(subset=[key], keep='last')
+                before = conn.total_changes
+                conn.executemany(f"DELETE FROM {table} WHERE {quote_ident(key)} IS ?", chunk_rows(chunk[[key]]))
+                replaced += conn.total_changes - before
+
+            conn.executemany(insert_sql, chunk_rows(chunk))
+            if on_chunk is not None:
+                on_chunk(chunk)
+            inserted += len(chunk)
+            if progress is not None:
+                progress(inserted)
+
+        conn.execute("UPDATE datasets SET row_count = row_count + ? WHERE name = ?",
+                     (inserted - replaced, dataset_name))
+        # содержимое изменилось: записи кэша прежней версии больше не действительны
+        bump_version(conn, dataset_name)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+    return inserted, replaced
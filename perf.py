@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+# замеры времени горячих участков: загрузка, sql, вычисления в pandas/numpy, отрисовка
+# участки (span) хранятся в кольцевом буфере ограниченного размера, выгружаются в json
+# или в формат chrome trace (открывается в chrome://tracing или ui.perfetto.dev)
+
+MAX_SPANS = 5000
+
+
+def peak_rss_mb(): # пиковая память процесса с начала работы, None - если не узнать
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024  # macos - байты, linux - КБ
+
+
+class Tracer:
+    def __init__(self, capacity=MAX_SPANS):
+        self.spans = deque(maxlen=capacity)
+        self.origin = time.perf_counter()
+
+    # участок кода: в with можно дописать в словарь rows, bytes и другие сведения
+    @contextmanager
+    def span(self, name, category='compute', **args):
+        peak_before = peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, category, start, time.perf_counter() - start, peak_before, **args)
+
+    def add(self, name, category, start, duration, peak_before=None, **args):
+        peak = peak_rss_mb()
+        if peak is not None:
+            args['peak_rss_mb'] = round(peak, 1)
+            if peak_before is not None:
+                args['peak_growth_mb'] = round(peak - peak_before, 1)
+        self.spans.append({
+            'name': name,
+            'cat': category,
+            'start': start - self.origin,
+            'duration': duration,
+            'thread': threading.current_thread().name,
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+    def snapshot(self):
+        return list(self.spans)
+
+    def clear(self):
+        self.spans.clear()
+
+    # сводка по участкам: число, суммарное/среднее/наибольшее время, строки последнего вызова
+    def summary(self):
+        groups = {}
+        for span in self.snapshot():
+            group = groups.setdefault((span['cat'], span['name']), {
+                'cat': span['cat'], 'name': span['name'], 'count': 0, 'total': 0.0, 'max': 0.0, 'last': None})
+            group['count'] += 1
+            group['total'] += span['duration']
+            group['max'] = max(group['max'], span['duration'])
+            group['last'] = span
+        result = sorted(groups.values(), key=lambda group: group['total'], reverse=True)
+        for group in result:
+            group['mean'] = group['total'] / group['count']
+        return result
+
+    def export_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'spans': self.snapshot()}, f, ensure_ascii=False, indent=1)
+
+    def export_chrome_trace(self, path): # события 'X' (полные участки), время в микросекундах
+        events = [{
+            'name': span['name'],
+            'cat': span['cat'],
+            'ph': 'X',
+            'ts': round(span['start'] * 1e6),
+            'dur': round(span['duration'] * 1e6),
+            'pid': os.getpid(),
+            'tid': span['tid'],
+            'args': span['args'],
+        } for span in self.snapshot()]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+
+
+tracer = Tracer()  # один на процесс
+
+
+def span(name, category='compute', **args):
+    return tracer.span(name, category, **args)
+
+
+def format_summary(summary): # текст для вкладки производительности
+    if not summary:
+        return "Замеров пока нет"
+    lines = [f"{'категория':<10} {'участок':<28} {'раз':>5} {'всего, с':>9} {'среднее':>9} {'макс.':>9}  последний вызов"]
+    for group in summary:
+        args = group['last']['args']
+        details = ", ".join(f"{key}={value:,}" if isinstance(value, int) else f"{key}={value}"
+                            for key, value in args.items())
+        lines.append(f"{group['cat']:<10} {group['name'][:28]:<28} {group['count']:>5} {group['total']:>9.3f} "
+                     f"{group['mean']:>9.3f} {group['max']:>9.3f}  {details}")
+    return "\n".join(lines)
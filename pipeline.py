@@ -0,0 +1,537 @@
+import os
+import time
+import pandas as pd
+import numpy as np
+from ingest import (frames_to_db, append_frames_to_db, read_csv_chunks, quote_ident, ArrowChunkReader,
+                    CsvEngineError)
+from dataset import DatasetHandle, FrameHandle
+import query
+from perf import span
+from connection import get_manager
+from frame_cache import frames
+import stats_cache
+import columnar
+import rollups
+from dtypes import SchemaInference, save_schema
+from streaming_stats import StreamingDescriber
+from correlation import CorrelationAccumulator, spearman
+from sampling import SAMPLE_CAP, ReservoirSample, StratifiedSample, LinearFit, DensityGrid
+
+# тяжелые операции приложения без зависимости от виджетов
+# каждая функция может выполняться в фоновом потоке: чтение идет через подключение потока,
+# запись через общего писателя (см. connection.py);
+# task - фоновая задача (см. tasks.py) для прогресса и отмены, может быть None
+
+
+def report(task, done, total=None):
+    if task is not None:
+        task.report(done, total)
+
+
+# чтение цсв выбранным парсером (engine, см. ingest.ENGINES) и загрузка кусков функцией load;
+# если pyarrow не справился с файлом посреди чтения, транзакция откатывается и файл читается обычным парсером
+# info (словарь) получает парсер, размер файла и время - для МБ/с в логе
+def load_csv(file_path, engine, load, info=None):
+    start = time.perf_counter()
+    while True:
+        reader = read_csv_chunks(file_path, engine=engine)
+        used = 'pyarrow' if isinstance(reader, ArrowChunkReader) else 'c'
+        try:
+            result = load(reader)
+            break
+        except CsvEngineError:
+            engine = 'c'
+        finally:
+            reader.close()
+    if info is not None:
+        info.update(engine=used, bytes=os.path.getsize(file_path), seconds=time.perf_counter() - start)
+    return result
+
+
+def throughput(info): # строка для лога: объем, время, скорость и парсер
+    mb = info['bytes'] / 1024 / 1024
+    speed = mb / info['seconds'] if info['seconds'] > 0 else 0.0
+    return f"{mb:.1f} MB за {info['seconds']:.2f} с, {speed:.1f} MB/с (парсер {info['engine']})"
+
+
+# загрузка цсв в БД, статистика считается за тот же проход и сразу попадает в кэш
+# storage='columnar' - числовые столбцы дополнительно пишутся в колоночные файлы
+def ingest_csv(db_path, file_path, dataset_name, description="", storage='sqlite', engine='c', info=None,
+               task=None):
+    size = os.path.getsize(file_path)
+    return load_csv(file_path, engine, lambda reader: ingest_frames(db_path, reader, dataset_name, description,
+                                                                    storage, task, size), info)
+
+
+# то же для готовых кусков (DataFrame), source_bytes - размер исходного файла для замеров
+def ingest_frames(db_path, chunks, dataset_name, description="", storage='sqlite', task=None, source_bytes=None):
+    frames.invalidate(db_path, dataset_name)  # имя могло принадлежать удаленному датасету
+    writers = []
+    try:
+        describer = StreamingDescriber()
+        inference = SchemaInference()
+        accumulators = []
+        builders = []
+
+        def on_chunk(chunk):
+            describer.update(chunk)
+            inference.update(chunk)
+            if not accumulators:
+                accumulators.append(CorrelationAccumulator(describer.numeric_columns))
+                if storage == 'columnar':
+                    writers.append(columnar.ColumnarWriter(db_path, dataset_name, describer.numeric_columns))
+                # столбцы дат определяются по первому куску
+                time_columns = rollups.date_columns(chunk)
+                if time_columns and describer.numeric_columns:
+                    builders.append(rollups.RollupBuilder(time_columns, describer.numeric_columns))
+            accumulators[0].update(chunk)
+            if writers:
+                writers[0].write(chunk)
+            if builders:
+                builders[0].update(chunk)
+
+        with get_manager(db_path).writer() as conn:
+            with span('ingest', 'ingest', dataset=dataset_name, bytes=source_bytes) as info:
+                result = frames_to_db(conn, chunks, dataset_name, description,
+                                      progress=lambda rows: report(task, rows), on_chunk=on_chunk)
+                info['rows'] = result[0]
+            if writers:
+                columnar.save_manifest(conn, dataset_name, writers.pop().close())
+            rollups.drop_rollups(conn, dataset_name)  # могли остаться от удаленного датасета с тем же именем
+            if builders:
+                with span('rollups', 'ingest', dataset=dataset_name):
+                    builders[0].save(conn, dataset_name)
+                mark_rollups(conn, dataset_name, builders[0].time_columns)
+            last_rowid = conn.execute(f"SELECT MAX(rowid) FROM {quote_ident(dataset_name)}").fetchone()[0]
+            summary = with_schema(describer.summary(), inference)
+            save_schema(conn, dataset_name, summary['schema'])
+            put_summary(conn, dataset_name, summary, describer, inference, last_rowid)
+            if accumulators:
+                stats_cache.put_cached(conn, dataset_name, 'corr',
+                                       {'state': accumulators[0].to_state(), 'last_rowid': last_rowid})
+        return result
+    except BaseException:
+        if writers:
+            writers[0].abort()
+        raise
+
+
+# сводка в кэш вместе с состоянием накопителей: дописанные строки объединяются с ним без чтения таблицы
+def put_summary(conn, dataset_name, summary, describer, inference, last_rowid):
+    stats_cache.put_cached(conn, dataset_name, 'summary', summary)
+    stats_cache.put_cached(conn, dataset_name, 'summary_state', {
+        'describer': describer.to_state(), 'schema': inference.to_state(), 'last_rowid': last_rowid})
+
+
+# дописывание цсв в существующий датасет, возвращает (добавлено, заменено)
+# key - столбец-ключ для замены строк с тем же ключом (иначе строки просто добавляются)
+# версия датасета меняется: сводка статистики, корреляции пирсона и агрегаты по времени досчитываются
+# по новым строкам за тот же проход (после замены строк сводка пересчитывается при следующем запросе,
+# агрегаты строятся заново), спирмен пересчитывается при следующем запросе
+def append_csv(db_path, file_path, dataset_name, key=None, engine='c', info=None, task=None):
+    size = os.path.getsize(file_path)
+    return load_csv(file_path, engine, lambda reader: append_frames(db_path, reader, dataset_name, key, task, size),
+                    info)
+
+
+def append_frames(db_path, chunks, dataset_name, key=None, task=None, source_bytes=None):
+    handle = DatasetHandle(db_path, dataset_name)
+    columns = handle.numeric_columns
+    cached = stats_cache.get_cached(handle.connect(), dataset_name, 'corr')
+    acc = None
+    if cached is not None and cached['last_rowid'] == handle.last_rowid and cached['state']['columns'] == columns:
+        acc = CorrelationAccumulator.from_state(cached['state'])
+    state = stats_cache.get_cached(handle.connect(), dataset_name, 'summary_state')
+    describer = inference = None
+    if (state is not None and state['last_rowid'] == handle.last_rowid
+            and state['describer']['numeric_columns'] == columns):
+        describer = StreamingDescriber.from_state(state['describer'])
+        inference = SchemaInference.from_state(state['schema'])
+
+    # колоночные файлы дописываются, только если старые строки не удаляются
+    stored = list(handle.manifest['files']) if handle.manifest else []
+    writer = None
+    if key is None and handle.is_columnar(stored):
+        writer = columnar.ColumnarWriter(db_path, dataset_name, stored, handle.manifest)
+
+    # агрегаты по времени дополняются только для уже построенных уровней
+    levels = rollups.stored_levels(handle.connect(), dataset_name)
+    builder = rollups.RollupBuilder(levels, columns, levels) if levels else None
+
+    def on_chunk(chunk):
+        if acc is not None:
+            acc.update(chunk.reindex(columns=columns))
+        if describer is not None:
+            describer.update(chunk)
+            inference.update(chunk)
+        if writer is not None:
+            writer.write(chunk.reindex(columns=stored))
+        if builder is not None:
+            builder.update(chunk)
+
+    try:
+        with handle.db.writer() as conn:
+            with span('append', 'ingest', dataset=dataset_name, bytes=source_bytes) as info:
+                inserted, replaced = append_frames_to_db(conn, chunks, dataset_name, key,
+                                                         progress=lambda rows: report(task, rows),
+                                                         on_chunk=on_chunk)
+                info['rows'] = inserted
+            if writer is not None:
+                columnar.save_manifest(conn, dataset_name, writer.close())
+                writer = None
+            # после удаления строк накопленные суммы уже неверны, сводка и корреляции пересчитаются целиком
+            last_rowid = conn.execute(f"SELECT MAX(rowid) FROM {handle.table}").fetchone()[0]
+            if describer is not None and not replaced:
+                summary = with_schema(describer.summary(), inference)
+                if summary['schema'] != handle.schema:
+                    save_schema(conn, dataset_name, summary['schema'])
+                put_summary(conn, dataset_name, summary, describer, inference, last_rowid)
+            elif handle.schema:  # схема могла не подойти к новым строкам: подбирается заново вместе со сводкой
+                save_schema(conn, dataset_name, None)
+            if acc is not None and not replaced:
+                stats_cache.put_cached(conn, dataset_name, 'corr', {'state': acc.to_state(), 'last_rowid': last_rowid})
+            if builder is not None and not replaced:
+                builder.save(conn, dataset_name)
+    except BaseException:
+        if writer is not None:
+            writer.abort()
+        raise
+
+    frames.invalidate(db_path, dataset_name)  # прочитанное до дописывания больше не нужно
+    if stored and key is not None:
+        rebuild_columnar(DatasetHandle(db_path, dataset_name), stored, task)
+    if levels and replaced:  # вклад удаленных строк из корзин не вычесть
+        build_rollups(DatasetHandle(db_path, dataset_name), list(levels), task)
+    return inserted, replaced
+
+
+# колоночные файлы заново по таблице (после замены строк по ключу)
+def rebuild_columnar(handle, columns, task=None):
+    with handle.db.writer() as conn:
+        columnar.drop_manifest(conn, handle.name)
+    handle.manifest = None  # куски читаются из sqlite
+    writer = columnar.ColumnarWriter(handle.db_path, handle.name, columns)
+    try:
+        for chunk in handle.iter_chunks(columns=columns, raw=True):
+            writer.write(chunk)
+            report(task, writer.rows, handle.row_count)
+    except BaseException:
+        writer.abort()
+        raise
+    with handle.db.writer() as conn:
+        columnar.save_manifest(conn, handle.name, writer.close())
+
+
+# агрегаты по времени заново по таблице (для датасетов, загруженных раньше, и после замены строк)
+def build_rollups(handle, time_columns, task=None):
+    builder = rollups.RollupBuilder(time_columns, handle.numeric_columns)
+    with span('rollups', 'sql', dataset=handle.name) as info:
+        for chunk in handle.iter_chunks(columns=list(time_columns) + handle.numeric_columns, raw=True):
+            builder.update(chunk)
+            report(task, builder.rows, handle.row_count)
+        info['rows'] = builder.rows
+        with handle.db.writer() as conn:
+            for time_column in time_columns:
+                rollups.drop_rollups(conn, handle.name, time_column)
+            builder.save(conn, handle.name)
+            mark_rollups(conn, handle.name, time_columns)
+
+
+# столбцы времени, для которых агрегаты уже строились при этой версии датасета: если ни один уровень
+# не подошел (данных мало), построение не повторяется при каждом запросе графика
+def mark_rollups(conn, dataset_name, time_columns):
+    built = stats_cache.get_cached(conn, dataset_name, 'rollups') or []
+    stats_cache.put_cached(conn, dataset_name, 'rollups', sorted(set(built) | set(time_columns)))
+
+
+# служебные таблицы (каталог, кэш статистики) для новой БД или БД старой версии
+def prepare_database(db_path, task=None):
+    from database import create_catalog
+    with get_manager(db_path).writer() as conn:
+        create_catalog(conn)
+
+
+# удаление датасета: таблица, записи каталога и кэшей, агрегаты и файлы столбцов
+def delete_dataset(db_path, dataset_name, task=None):
+    with get_manager(db_path).writer() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {quote_ident(dataset_name)}")
+        cursor.execute("DELETE FROM datasets WHERE name = ?", (dataset_name,))
+        stats_cache.invalidate(conn, dataset_name)
+        cursor.execute("DELETE FROM column_usage WHERE dataset = ?", (dataset_name,))
+        rollups.drop_rollups(conn, dataset_name)
+    columnar.remove_dataset(db_path, dataset_name)
+    frames.invalidate(db_path, dataset_name)
+
+
+# открытие датасета: только метаданные, данные читаются по запросу
+def open_dataset(db_path, dataset_name, task=None):
+    return DatasetHandle(db_path, dataset_name)
+
+
+# компактные типы столбцов и память до и после их применения
+def with_schema(summary, inference):
+    summary['schema'] = inference.schema()
+    summary['memory_bytes'], summary['memory_optimized'] = inference.memory()
+    return summary
+
+
+# сводка статистики датасета за один проход по кускам таблицы (словарь, сохраняется в кэш как json)
+# куски читаются без приведения типов: заодно заново подбирается схема
+def compute_summary(handle, task=None):
+    return scan_summary(handle, task)[0]
+
+
+def scan_summary(handle, task=None): # (сводка, накопители) - накопители сохраняются для дописывания
+    describer = StreamingDescriber(handle.numeric_columns)
+    inference = SchemaInference()
+    with span('summary', dataset=handle.name) as info:
+        for chunk in handle.iter_chunks(raw=True):
+            describer.update(chunk)
+            inference.update(chunk)
+            report(task, describer.rows, handle.row_count)
+        summary = with_schema(describer.summary(), inference)
+        info['rows'] = describer.rows
+    if handle.cacheable and summary['schema'] != handle.schema:
+        with handle.db.writer() as conn:
+            save_schema(conn, handle.name, summary['schema'])
+        handle.schema = summary['schema']
+    return summary, describer, inference
+
+
+# текст для вкладки статистики
+def format_stats(summary):
+    #основная информация
+    stats_text = f"ОСНОВНАЯ ИНФОРМАЦИЯ:\n"
+    stats_text += f"Размер данных: {summary['rows']:,} строк × {summary['columns']} столбцов\n"
+    stats_text += f"Объем памяти: {summary['memory_bytes'] / 1024 / 1024:.2f} MB\n"
+    if summary['memory_bytes']:
+        optimized = summary['memory_optimized']
+        stats_text += (f"Объем памяти после оптимизации типов: {optimized / 1024 / 1024:.2f} MB "
+                       f"({optimized / summary['memory_bytes'] * 100:.0f}% от исходного)\n")
+    stats_text += f"\n"
+
+    # тип данных (и компактный тип, в котором столбец читается)
+    stats_text += f"ТИПЫ ДАННЫХ:\n"
+    for col, dtype in summary['dtypes'].items():
+        optimized = summary['schema'].get(col, dtype)
+        stats_text += f"  {col}: {dtype} -> {optimized}\n" if optimized != dtype else f"  {col}: {dtype}\n"
+    stats_text += f"\n"
+
+    # статистика числовых столбцов
+    describe = summary['describe']
+    if describe:
+        stats_text += f"СТАТИСТИКА ЧИСЛОВЫХ СТОЛБЦОВ:\n"
+        stats_text += str(pd.DataFrame(describe['data'], index=describe['index'], columns=describe['columns']))
+    else:
+        stats_text += "Числовые столбцы не найдены\n"
+
+    # нечисловые столбцы: число различных значений и самые частые (приближенно для больших таблиц)
+    if summary['categorical']:
+        stats_text += f"\n КАТЕГОРИАЛЬНЫЕ СТОЛБЦЫ:\n"
+        for col, info in summary['categorical'].items():
+            distinct = f"{info['distinct']:,}" if info['exact'] else f"~{info['distinct']:,}"
+            stats_text += f"  {col}: {distinct} различных значений\n"
+            for value, count, error in info['top']:
+                share = count / info['count'] * 100 if info['count'] else 0.0
+                count = f"{count:,}" if not error else f"~{count:,} (±{error:,})"
+                stats_text += f"    {value[:40]}: {count} ({share:.1f}%)\n"
+
+    # пропуски
+    if summary['missing']:
+        stats_text += f"\n ПРОПУЩЕННЫЕ ЗНАЧЕНИЯ:\n"
+        for col, count in summary['missing'].items():
+            stats_text += f"  {col}: {count} пропусков ({count / summary['rows'] * 100:.1f}%)\n"
+
+    return stats_text
+
+
+# статистика из кэша в БД, при промахе считается и сохраняется
+def dataset_stats(handle, task=None):
+    if not handle.cacheable:  # срез или группировка: статистика только по ним, без кэша
+        return format_stats(compute_summary(handle, task))
+    return format_stats(cached_summary(handle, task))
+
+
+def cached_summary(handle, task=None): # сводка датасета из кэша (словарь, как у compute_summary)
+    summary = stats_cache.get_cached(handle.connect(), handle.name, 'summary')
+    # сводки, посчитанные до появления схемы типов и эскизов текстовых столбцов, пересчитываются
+    if summary is None or 'schema' not in summary or 'categorical' not in summary:
+        summary, describer, inference = scan_summary(handle, task)
+        with handle.db.writer() as conn:
+            put_summary(conn, handle.name, summary, describer, inference, handle.last_rowid)
+    return summary
+
+
+# минимум и максимум столбцов (для датасета в БД - одним запросом)
+def column_ranges(handle, columns):
+    ranges = {}
+    for col, (low, high) in handle.min_max(columns).items():
+        ranges[col] = (float(low), float(high)) if low is not None else (0.0, 1.0)
+    return ranges
+
+
+# данные для графиков корреляции, читаются только нужные столбцы
+# mode: 'auto' - все точки, если строк не больше cap, иначе выборка;
+# 'sample' - равномерная (или по группам stratify) выборка из cap строк;
+# 'density' - двумерные гистограммы по всем строкам
+# для regplot прямая всегда строится по всем строкам через суммы
+def correlation_data(handle, plot_type, mode='auto', cap=SAMPLE_CAP, stratify=None, task=None):
+    columns = handle.numeric_columns[:4 if plot_type == "pairplot" else 2]
+    if mode == 'auto':
+        mode = 'full' if handle.row_count <= cap else 'sample'
+    data = {'columns': columns, 'mode': mode, 'rows': handle.row_count, 'stratify': stratify}
+    fit = LinearFit() if plot_type == "regplot" else None
+
+    sample = x_range = None
+    if mode == 'sample' and not stratify:
+        # строки идут подряд: читаются только cap случайных строк, прямая - по суммам одним запросом
+        with span(f'{mode}_{plot_type}', dataset=handle.name, rows=handle.row_count):
+            sample = handle.sample_rows(columns, cap)
+            if sample is not None and fit is not None:
+                # средние по выборке близки к средним по всем строкам - хороший сдвиг для сумм
+                shift = sample[columns[:2]].apply(pd.to_numeric, errors='coerce').mean().fillna(0.0).tolist()
+                *sums, x_min, x_max = handle.pair_sums(columns[0], columns[1], shift)
+                fit = LinearFit.from_sums(shift, sums)
+                x_range = (float(x_min), float(x_max)) if x_min is not None else (0.0, 1.0)
+
+    if mode == 'full':
+        sample = handle.read(columns=columns + ([stratify] if stratify else []))
+        data['sample'] = sample
+        if fit is not None:
+            fit.update(sample[columns[0]], sample[columns[1]])
+    elif sample is not None:
+        data['sample'] = sample.reset_index(drop=True)
+        data['grid'] = None
+    else:
+        sampler = grid = None
+        if mode == 'density':
+            grid = DensityGrid(columns, column_ranges(handle, columns))
+        elif stratify:
+            sampler = StratifiedSample(stratify, cap)
+        else:
+            sampler = ReservoirSample(cap)
+
+        rows = 0
+        with span(f'{mode}_{plot_type}', dataset=handle.name, rows=handle.row_count):
+            for chunk in handle.iter_chunks(columns=columns + ([stratify] if stratify and sampler else [])):
+                if sampler is not None:
+                    sampler.update(chunk)
+                if grid is not None:
+                    grid.update(chunk)
+                if fit is not None:
+                    fit.update(chunk[columns[0]], chunk[columns[1]])
+                rows += len(chunk)
+                report(task, rows, handle.row_count)
+        data['sample'] = sampler.result() if sampler is not None else None
+        data['grid'] = grid
+
+    if fit is not None:
+        x_min, x_max = x_range or column_ranges(handle, columns[:1])[columns[0]]
+        data['fit'] = fit.line(x_min, x_max)
+    return data
+
+
+# корреляционная матрица для тепловой карты
+# пирсон: в кэше лежат достаточные статистики, дописанные строки досчитываются отдельно;
+# спирмен: нужны ранги по всем строкам, кэшируется готовая матрица
+def correlation_matrix(handle, method='pearson', task=None):
+    if not handle.cacheable:
+        with span(f'corr_{method}', dataset=handle.name, rows=handle.row_count):
+            if method == 'spearman':
+                return spearman(handle.read(columns=handle.numeric_columns))
+            acc = CorrelationAccumulator(handle.numeric_columns)
+            acc.update_many(handle.iter_chunks(columns=handle.numeric_columns))
+            return acc.matrix()
+
+    conn = handle.connect()
+    if method == 'spearman':
+        cached = stats_cache.get_cached(conn, handle.name, 'corr_spearman')
+        if cached is not None:
+            return pd.DataFrame(cached['data'], index=cached['index'], columns=cached['columns'])
+        with span('corr_spearman', dataset=handle.name, rows=handle.row_count):
+            corr_matrix = spearman(handle.read(columns=handle.numeric_columns))
+        with handle.db.writer() as conn:
+            stats_cache.put_cached(conn, handle.name, 'corr_spearman', corr_matrix.to_dict(orient='split'))
+        return corr_matrix
+
+    cached = stats_cache.get_cached(conn, handle.name, 'corr')
+    if cached is not None and cached['state']['columns'] == handle.numeric_columns:
+        acc = CorrelationAccumulator.from_state(cached['state'])
+        after_rowid = cached['last_rowid']
+    else:
+        acc = CorrelationAccumulator(handle.numeric_columns)
+        after_rowid = None
+
+    if handle.last_rowid is not None and (after_rowid is None or handle.last_rowid > after_rowid):
+        def chunks():
+            for chunk in handle.iter_chunks(columns=handle.numeric_columns, after_rowid=after_rowid):
+                yield chunk
+                report(task, acc.rows, handle.row_count)
+        with span('corr_pearson', dataset=handle.name, rows=handle.row_count, after_rowid=after_rowid):
+            acc.update_many(chunks())
+        with handle.db.writer() as conn:
+            stats_cache.put_cached(conn, handle.name, 'corr',
+                                   {'state': acc.to_state(), 'last_rowid': handle.last_rowid})
+    return acc.matrix()
+
+
+# срез или свертка датасета: условия и группировка выполняются в sqlite, в pandas приходит результат
+# filters - список (столбец, операция, значение); group_by/bucket/func - группировка (см. query.py)
+# возвращает (handle для графиков и предпросмотра, столбцы, на которых только что создан индекс)
+def query_dataset(handle, filters=(), group_by=None, bucket=None, func=None, task=None):
+    where, params = query.compile_filters(filters, handle.sql_types)
+    indexed = []
+    if filters:
+        with span('column_usage', 'sql', dataset=handle.name) as info, handle.db.writer() as conn:
+            indexed = query.record_usage(conn, handle.name, [column for column, _, _ in filters])
+            info['indexed'] = len(indexed)
+    if group_by is None and func is None:
+        if not where:
+            return handle, indexed
+        with span('filter', 'sql', dataset=handle.name) as info:
+            view = handle.filtered(where, params)
+            info['rows'] = view.row_count
+        return view, indexed
+
+    sql, params = query.compile_aggregate(handle.table, handle.sql_types, where, params, group_by, bucket,
+                                          func or 'avg')
+    with span('group_by', 'sql', dataset=handle.name) as info:
+        df = pd.read_sql_query(sql, handle.connect(), params=params)
+        info['rows'] = len(df)
+    return FrameHandle(df, handle.name), indexed
+
+
+# значения столбца для линейного графика
+def line_data(handle, column, task=None):
+    values = handle.column_array(column)
+    nulls = np.isnan(values)
+    return values[~nulls] if nulls.any() else values
+
+
+# ряд для линейного графика по времени: x - секунды от 1970, y - среднее, low/high - минимум и максимум корзины
+# берется самый грубый уровень агрегатов, корзин которого хватает на width пикселей;
+# если такого нет (данных мало) или это срез по фильтру - строки датасета
+def time_line_data(handle, column, time_column, width=1000, task=None):
+    if handle.cacheable:
+        sizes = rollups.level_sizes(handle.connect(), handle.name, time_column, column)
+        built = stats_cache.get_cached(handle.connect(), handle.name, 'rollups') or []
+        if not sizes and time_column not in built:
+            build_rollups(handle, [time_column], task)
+            sizes = rollups.level_sizes(handle.connect(), handle.name, time_column, column)
+        level = rollups.choose_level(sizes, width)
+        if level is not None:
+            with span('rollup_read', 'sql', dataset=handle.name, level=level) as info:
+                df = rollups.read_level(handle.connect(), handle.name, time_column, column, level)
+                info['rows'] = len(df)
+            df = df[df['n'] > 0]
+            return {'x': df['bucket'].to_numpy(dtype=float), 'y': (df['total'] / df['n']).to_numpy(dtype=float),
+                    'low': df['low'].to_numpy(dtype=float), 'high': df['high'].to_numpy(dtype=float),
+                    'level': level}
+
+    df = handle.read(columns=[time_column, column])
+    x = rollups.to_seconds(df[time_column])
+    y = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    order = np.argsort(x[valid], kind='stable')
+    return {'x': x[valid][order], 'y': y[valid][order], 'low': None, 'high': None, 'level': None}
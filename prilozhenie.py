@@ -1,26 +1,37 @@
 import sys
 import os
-import pandas as pd
-import numpy as np
+import time
+STARTED_AT = time.perf_counter()  # отсчет времени запуска до первой отрисовки окна
 import sqlite3
+from collections import deque
 from datetime import datetime # даты для логов
-import seaborn as sns
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas # встраиваем графики прямо в приложение
-from matplotlib.figure import Figure
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QTabWidget, QPushButton, QFileDialog,
-                             QComboBox, QLabel, QTextEdit, QTableWidget,
-                             QTableWidgetItem, QMessageBox, QScrollArea, QGroupBox,
-                             QLineEdit, QDialog, QFormLayout, QDialogButtonBox)
-from PyQt5.QtCore import Qt
+                             QComboBox, QLabel, QTextEdit, QTableView, QHeaderView,
+                             QMessageBox, QScrollArea, QGroupBox,
+                             QLineEdit, QDialog, QFormLayout, QDialogButtonBox,
+                             QProgressBar, QSpinBox, QCheckBox)
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QFont
+from tasks import TaskManager, write_key
+from table_model import DatasetTableModel
+from connection import get_manager, close_all
+from perf import span, tracer, format_summary
+from frame_cache import frames
+
+# быстрый запуск: pandas, matplotlib и seaborn подключаются внутри методов при первом обращении,
+# вкладки с графиками строятся при первом открытии, БД подключается после первой отрисовки окна
+STARTUP_TARGET_MS = 500  # цель по времени до первой отрисовки
+CSV_FILTER = "CSV Files (*.csv *.csv.gz *.csv.bz2 *.csv.xz *.csv.zst);;Все файлы (*)"  # в том числе сжатые
+MAX_LOG_ENTRIES = 1000  # записей в логе действий, старые вытесняются
 
 
 class DatasetName(QDialog): # всплывающее окно для названия и описания загруженного с цсв датасета
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, current=None, bulk=False):
         super().__init__(parent)
-        self.setWindowTitle("Добавить датасет")
+        self.current = current  # выбранный датасет - по умолчанию для дописывания
+        self.bulk = bulk  # пакетная загрузка папки: маска файлов и датасет на каждый файл
+        self.setWindowTitle("Пакетная загрузка" if bulk else "Добавить датасет")
         self.setModal(True)
         self.initUI()
 
@@ -30,27 +41,89 @@ class DatasetName(QDialog): # всплывающее окно для назва
         self.name_input = QLineEdit()
         self.description_input = QLineEdit()
 
+        # новый датасет или дописывание строк в существующий (с заменой по ключу)
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItem("Новый датасет", "new")
+        self.mode_combo.addItem("Дописать в существующий", "append")
+        self.mode_combo.addItem("Дописать с заменой по ключу", "upsert")
+        self.mode_combo.currentIndexChanged.connect(self.on_mode_changed)
+        self.key_input = QLineEdit()
+        self.key_input.setPlaceholderText("столбец-ключ")
+        self.key_input.setEnabled(False)
+
+        layout.addRow("Режим:", self.mode_combo)
         layout.addRow("Название датасета:", self.name_input)
         layout.addRow("Описание:", self.description_input)
+        layout.addRow("Ключ:", self.key_input)
+
+        # числовые столбцы дополнительно в файлах по столбцам - быстрее для графиков
+        self.columnar_check = QCheckBox("Колоночное хранение числовых столбцов")
+        layout.addRow(self.columnar_check)
+
+        # парсер цсв: скорость каждого пишется в лог, чтобы выбрать самый быстрый для своих файлов
+        from ingest import ENGINES, pyarrow_available
+        self.engine_combo = QComboBox()
+        for engine in ENGINES:
+            available = engine != 'pyarrow' or pyarrow_available()
+            self.engine_combo.addItem(engine if available else f"{engine} (не установлен, будет c)", engine)
+        layout.addRow("Парсер:", self.engine_combo)
+
+        if self.bulk:
+            self.pattern_input = QLineEdit("*.csv*")
+            layout.addRow("Маска файлов:", self.pattern_input)
+            self.per_file_check = QCheckBox("Каждый файл - отдельный датасет (название - префикс)")
+            layout.addRow(self.per_file_check)
 
         buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         buttons.accepted.connect(self.accept)
         buttons.rejected.connect(self.reject)
         layout.addRow(buttons)
 
+    def on_mode_changed(self):
+        mode = self.mode_combo.currentData()
+        self.key_input.setEnabled(mode == "upsert")
+        # описание и способ хранения задаются только для нового датасета
+        self.description_input.setEnabled(mode == "new")
+        self.columnar_check.setEnabled(mode == "new")
+        if mode != "new" and not self.name_input.text() and self.current:
+            self.name_input.setText(self.current)
+
     def get_data(self): # получение данных
-        return self.name_input.text(), self.description_input.text()
+        storage = 'columnar' if self.columnar_check.isChecked() else 'sqlite'
+        key = self.key_input.text().strip() if self.mode_combo.currentData() == "upsert" else None
+        return (self.name_input.text(), self.description_input.text(), storage,
+                self.mode_combo.currentData(), key or None)
+
+    def get_engine(self):
+        return self.engine_combo.currentData()
+
+    def get_bulk_options(self): # (маска файлов, датасет на каждый файл)
+        return self.pattern_input.text().strip() or "*.csv*", self.per_file_check.isChecked()
 
 
 class DataVisualizationApp(QMainWindow): # главное приложение как класс
-    def __init__(self):
+    def __init__(self, fast_start=True, exit_after_paint=False):
         super().__init__()
-        self.current_df = None
-        self.db_conn = None
+        self.fast_start = fast_start
+        self.exit_after_paint = exit_after_paint  # только замер времени запуска
+        self.startup_ms = None
+        self.column_combo = None  # комбобоксы вкладок графиков, пока вкладки не построены
+        self.stratify_combo = None
+        self.current_handle = None  # ленивый доступ к текущему датасету (или к его срезу)
+        self.base_handle = None  # весь выбранный датасет, без фильтров
+        self.filters = []  # условия отбора: (столбец, операция, значение)
+        self.db = None  # подключения к БД (см. connection.py)
+        self.db_path = 'data_visualization.db'
         self.current_dataset = None
-        self.log_actions = []
+        self.log_actions = deque(maxlen=MAX_LOG_ENTRIES)
+        # фоновые задачи, чтобы интерфейс не зависал на больших датасетах
+        self.tasks = TaskManager(self)
+        self.tasks.task_started.connect(self.on_task_started)
+        self.tasks.task_progress.connect(self.on_task_progress)
+        self.tasks.idle.connect(self.on_tasks_idle)
         self.initUI()
-        self.connect_to_database()
+        if not self.fast_start:
+            self.connect_to_database()
 
     def initUI(self):
         self.setWindowTitle('Data Visualization App')
@@ -103,6 +176,17 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
                 border-radius: 4px;
             }
         """)
+        # много цсв из папки за раз (например, выгрузки по дням)
+        self.bulk_btn = QPushButton('Импорт папки')
+        self.bulk_btn.clicked.connect(self.bulk_import_dialog)
+        self.bulk_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #388E3C;
+                color: white;
+                padding: 8px;
+                border-radius: 4px;
+            }
+        """)
         # удаление датасета
         self.delete_btn = QPushButton('Удалить датасет')
         self.delete_btn.clicked.connect(self.delete_dataset)
@@ -116,6 +200,7 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         """)
 
         action_layout.addWidget(self.load_btn)
+        action_layout.addWidget(self.bulk_btn)
         action_layout.addWidget(self.delete_btn)
         action_layout.addStretch()
 
@@ -126,8 +211,32 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         self.status_label.setStyleSheet("font-weight: bold; color: #d32f2f;")
         header_layout.addWidget(self.status_label)
 
+        # прогресс фоновых задач
+        progress_layout = QVBoxLayout()
+        self.task_label = QLabel('')
+        progress_layout.addWidget(self.task_label)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(250)
+        progress_layout.addWidget(self.progress_bar)
+        self.cancel_btn = QPushButton('Отмена')
+        self.cancel_btn.clicked.connect(self.cancel_tasks)
+        self.cancel_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #795548;
+                color: white;
+                padding: 5px;
+                border-radius: 3px;
+            }
+        """)
+        progress_layout.addWidget(self.cancel_btn)
+        header_layout.addLayout(progress_layout)
+        self.on_tasks_idle()
+
         main_layout.addLayout(header_layout)
 
+        # фильтр и группировка выполняются в sqlite, графики строятся по результату
+        main_layout.addWidget(self.setup_query_panel())
+
         # создание вкладок
         self.tabs = QTabWidget()
         self.tab1 = QWidget()  # статистика
@@ -135,48 +244,95 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         self.tab3 = QWidget()  # тепловая карта
         self.tab4 = QWidget()  # линейный график
         self.tab5 = QWidget()  # лог действий
+        self.tab6 = QWidget()  # замеры производительности
         # задаем названия вкладок
         self.tabs.addTab(self.tab1, "📊 Статистика")
         self.tabs.addTab(self.tab2, "📈 Корреляции")
         self.tabs.addTab(self.tab3, "🎯 Тепловая карта")
         self.tabs.addTab(self.tab4, "📉 Линейный график")
         self.tabs.addTab(self.tab5, "📝 Лог действий")
+        self.tabs.addTab(self.tab6, "⏱ Производительность")
         # добавляем наши созданные вкладки на главный экран
+        # вкладки с графиками строятся при первом открытии
+        self.tab_builders = {1: self.setup_tab2, 2: self.setup_tab3, 3: self.setup_tab4}
         self.setup_tab1()
-        self.setup_tab2()
-        self.setup_tab3()
-        self.setup_tab4()
         self.setup_tab5()
+        self.setup_tab6()
+        if not self.fast_start:
+            for index in list(self.tab_builders):
+                self.build_tab(index)
+        self.tabs.currentChanged.connect(self.build_tab)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
 
         main_layout.addWidget(self.tabs)
         # добавление действия в лог
         self.add_log("Приложение запущено")
+    def build_tab(self, index):
+        builder = self.tab_builders.pop(index, None)
+        if builder is not None:
+            builder()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.startup_ms is None:
+            # таймер срабатывает, когда обработана очередь событий с первой отрисовкой
+            QTimer.singleShot(0, self.on_first_paint)
+
+    def on_first_paint(self):
+        if self.startup_ms is not None:
+            return
+        self.startup_ms = (time.perf_counter() - STARTED_AT) * 1000
+        verdict = "в пределах цели" if self.startup_ms <= STARTUP_TARGET_MS else "дольше цели"
+        self.add_log(f"Окно отображено за {self.startup_ms:.0f} мс ({verdict} {STARTUP_TARGET_MS} мс)")
+        tracer.add('first_paint', 'ui', STARTED_AT, self.startup_ms / 1000, fast_start=self.fast_start)
+        if self.exit_after_paint:
+            print(f"{self.startup_ms:.0f}")
+            self.close()  # задачи останавливаются в closeEvent
+        elif self.fast_start:
+            QTimer.singleShot(0, self.connect_to_database)
     # функция для подключения к созданной локальной БД
     def connect_to_database(self):
-        try:
-            self.db_conn = sqlite3.connect('data_visualization.db')
-            self.status_label.setText('База данных подключена')
-            self.status_label.setStyleSheet("font-weight: bold; color: #388e3c;")
-            self.refresh_datasets()
-            self.add_log("Подключение к базе данных установлено")
-
-        except Exception as e:
-            self.status_label.setText('Ошибка подключения к БД')
-            QMessageBox.critical(self, "Ошибка",
-                                 f"Не удалось подключиться к базе данных")
+        import pipeline
+        self.status_label.setText('Подключение к базе данных...')
+        # служебные таблицы создаются в фоне: запись может ждать загрузку из другого процесса
+        self.tasks.submit('database', pipeline.prepare_database, self.db_path,
+                          on_result=lambda _: self.on_database_ready(),
+                          on_error=lambda error: self.on_database_failed(),
+                          description="Подключение к базе данных")
+
+    def on_database_ready(self):
+        self.db = get_manager(self.db_path)
+        self.status_label.setText('База данных подключена')
+        self.status_label.setStyleSheet("font-weight: bold; color: #388e3c;")
+        self.refresh_datasets()
+        self.add_log("Подключение к базе данных установлено")
+
+    def on_database_failed(self):
+        self.status_label.setText('Ошибка подключения к БД')
+        QMessageBox.critical(self, "Ошибка",
+                             f"Не удалось подключиться к базе данных")
     # обновление списка загруженных датасетов
     def refresh_datasets(self):
-        if not self.db_conn:
+        if not self.db:
             return
 
         try:
-            cursor = self.db_conn.cursor()
+            cursor = self.db.reader().cursor()
             cursor.execute("SELECT name FROM datasets ORDER BY created_at DESC")
             datasets = cursor.fetchall()
 
+            # список перезаполняется без сигналов, иначе каждое изменение перечитывает датасет;
+            # выбор сохраняется, датасет читается, только если выбор пришлось сменить
+            previous = self.dataset_combo.currentText()
+            self.dataset_combo.blockSignals(True)
             self.dataset_combo.clear()
             for dataset in datasets:
                 self.dataset_combo.addItem(dataset[0])
+            if previous and self.dataset_combo.findText(previous) >= 0:
+                self.dataset_combo.setCurrentText(previous)
+            self.dataset_combo.blockSignals(False)
+            if self.dataset_combo.currentText() != previous:
+                self.load_dataset(self.dataset_combo.currentText())
 
             if datasets:
                 self.add_log(f"Список датасетов обновлен: {len(datasets)} датасетов")
@@ -189,70 +345,164 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
     def load_csv_dialog(self):
         try:
             file_path, _ = QFileDialog.getOpenFileName(
-                self, "Выберите CSV файл", "", "CSV Files (*.csv)"
+                self, "Выберите CSV файл", "", CSV_FILTER
             )
 
             if file_path:
                 # диалог для ввода названия датасета
-                dialog = DatasetName(self)
+                dialog = DatasetName(self, self.current_dataset)
                 if dialog.exec_() == QDialog.Accepted:
-                    name, description = dialog.get_data()
-                    if name:
-                        self.load_csv(file_path, name, description)
+                    name, description, storage, mode, key = dialog.get_data()
+                    if name and mode == "upsert" and not key:
+                        QMessageBox.warning(self, "Предупреждение", "Введите ключевой столбец")
+                    elif name and mode != "new":
+                        self.append_csv(file_path, name, key, dialog.get_engine())
+                    elif name:
+                        self.load_csv(file_path, name, description, storage, dialog.get_engine())
                     else:
                         QMessageBox.warning(self, "Предупреждение", "Введите название датасета")
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при выборе файла: {str(e)}")
-    # загрузка цсв в локальную БД
-    def load_csv(self, file_path, dataset_name, description=""):
-        try:
-            self.add_log(f"Загрузка файла: {os.path.basename(file_path)} как '{dataset_name}'")
-
-            # чтение CSV
-            df = pd.read_csv(file_path)
-
-            # сохранение в БД
-            df.to_sql(dataset_name, self.db_conn, if_exists='fail', index=False)
-
-            # добавление информации
-            cursor = self.db_conn.cursor()
-            cursor.execute('''
-                INSERT INTO datasets (name, description, row_count, column_count)
-                VALUES (?, ?, ?, ?)
-            ''', (dataset_name, description, len(df), len(df.columns)))
-
-            self.db_conn.commit()
-
-            # обновление интерфейса
-            self.refresh_datasets()
-            self.dataset_combo.setCurrentText(dataset_name)
-
-            self.add_log(f"Датасет '{dataset_name}' успешно загружен: {len(df)} строк, {len(df.columns)} столбцов")
+    # загрузка цсв в локальную БД (в фоне)
+    def load_csv(self, file_path, dataset_name, description="", storage='sqlite', engine='c'):
+        import pipeline
+        self.add_log(f"Загрузка файла: {os.path.basename(file_path)} как '{dataset_name}'")
+        info = {}  # парсер, размер и время - заполняются в фоне
+        self.tasks.submit(write_key(dataset_name), pipeline.ingest_csv, self.db_path, file_path, dataset_name,
+                          description, storage, engine, info,
+                          on_result=lambda result: self.on_csv_loaded(dataset_name, result, info),
+                          on_error=lambda error: self.on_csv_error(dataset_name, error),
+                          on_cancel=lambda: self.add_log(f"Загрузка датасета '{dataset_name}' отменена"),
+                          description=f"Загрузка '{dataset_name}'")
+
+    def on_csv_loaded(self, dataset_name, result, info=None):
+        import pipeline
+        row_count, column_count = result
+        self.invalidate_charts(dataset_name)  # имя могло принадлежать удаленному датасету
+
+        # обновление интерфейса
+        self.refresh_datasets()
+        self.dataset_combo.setCurrentText(dataset_name)
+
+        self.add_log(f"Датасет '{dataset_name}' успешно загружен: {row_count} строк, {column_count} столбцов"
+                     + (f" ({pipeline.throughput(info)})" if info else ""))
+
+    # дописывание цсв в существующий датасет (в фоне)
+    def append_csv(self, file_path, dataset_name, key=None, engine='c'):
+        import pipeline
+        self.add_log(f"Дописывание файла: {os.path.basename(file_path)} в '{dataset_name}'"
+                     + (f" с заменой по ключу '{key}'" if key else ""))
+        info = {}
+        self.tasks.submit(write_key(dataset_name), pipeline.append_csv, self.db_path, file_path, dataset_name, key,
+                          engine, info,
+                          on_result=lambda result: self.on_csv_appended(dataset_name, result, info),
+                          on_error=lambda error: self.on_csv_error(dataset_name, error),
+                          on_cancel=lambda: self.add_log(f"Дописывание в '{dataset_name}' отменено"),
+                          description=f"Дописывание в '{dataset_name}'")
+
+    def on_csv_appended(self, dataset_name, result, info=None):
+        import pipeline
+        inserted, replaced = result
+
+        # список заново, выбранный датасет перечитывается с новым числом строк
+        self.refresh_datasets()
+        self.dataset_combo.setCurrentText(dataset_name)
+        self.load_dataset(dataset_name)
+
+        self.add_log(f"В датасет '{dataset_name}' добавлено строк: {inserted}, заменено: {replaced}"
+                     + (f" ({pipeline.throughput(info)})" if info else ""))
+
+    # готовые картинки графиков датасета больше не подходят
+    def invalidate_charts(self, dataset_name):
+        for name in ('corr_canvas', 'heatmap_canvas', 'line_canvas'):
+            canvas = getattr(self, name, None)
+            if canvas is not None:
+                canvas.invalidate(self.db_path, dataset_name)
+
+    # пакетная загрузка: папка, затем название (или префикс) и маска файлов
+    def bulk_import_dialog(self):
+        directory = QFileDialog.getExistingDirectory(self, "Выберите папку с CSV файлами")
+        if not directory:
+            return
+        dialog = DatasetName(self, self.current_dataset, bulk=True)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        name, description, storage, mode, key = dialog.get_data()
+        pattern, per_file = dialog.get_bulk_options()
+        if not name and not per_file:
+            QMessageBox.warning(self, "Предупреждение", "Введите название датасета")
+        elif mode == "upsert" and not key:
+            QMessageBox.warning(self, "Предупреждение", "Введите ключевой столбец")
+        else:
+            self.bulk_import(directory, name or None, description, storage, key, pattern, per_file,
+                             dialog.get_engine(), append=mode != "new")
+
+    # файлы разбираются в отдельных процессах, пишутся по очереди; отчет по каждому файлу в лог
+    def bulk_import(self, directory, name=None, description="", storage='sqlite', key=None, pattern="*.csv*",
+                    per_file=False, engine='c', append=True):
+        import bulk_import
+        started = time.perf_counter()
+        self.add_log(f"Пакетная загрузка: {os.path.join(directory, pattern)}"
+                     + (" по датасету на файл" if per_file else f" в '{name}'"))
+        self.tasks.submit(write_key(name or directory), bulk_import.bulk_import, self.db_path, directory, name,
+                          per_file, description, storage, key, pattern, None, engine, append=append,
+                          on_result=lambda results: self.on_bulk_imported(name, results,
+                                                                          time.perf_counter() - started),
+                          on_error=lambda error: self.on_csv_error(name, error),
+                          on_cancel=lambda: self.add_log("Пакетная загрузка отменена"),
+                          description="Пакетная загрузка")
+
+    def on_bulk_imported(self, name, results, elapsed):
+        import bulk_import
+        for result in results:
+            self.add_log(bulk_import.format_file(result))
+            self.invalidate_charts(result['dataset'])
+        self.add_log(bulk_import.format_total(results, elapsed))
+
+        self.refresh_datasets()
+        if name and any(result['error'] is None and result['dataset'] == name for result in results):
+            self.dataset_combo.setCurrentText(name)
+            self.load_dataset(name)  # мог быть дописан уже открытый датасет
+        failed = [result for result in results if result['error'] is not None]
+        if failed:
+            QMessageBox.warning(self, "Пакетная загрузка",
+                                f"Не загружено файлов: {len(failed)} из {len(results)}, подробности в логе")
+
+    def on_csv_error(self, dataset_name, error):
         # вывод ошибки при одинаковом названии
-        except sqlite3.IntegrityError:
+        if isinstance(error, sqlite3.IntegrityError):
             QMessageBox.warning(self, "Ошибка", "Датасет с таким названием уже существует")
             self.add_log(f"Ошибка: датасет с именем '{dataset_name}' уже существует")
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке файла: {str(e)}")
-            self.add_log(f"Ошибка при загрузке файла: {str(e)}")
-    # загрузка датасета
+        else:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке файла: {str(error)}")
+            self.add_log(f"Ошибка при загрузке файла: {str(error)}")
+    # загрузка датасета (в фоне, прежние задачи этого датасета отменяются)
     def load_dataset(self, dataset_name):
-        if not dataset_name or not self.db_conn:
+        if not dataset_name or not self.db:
             return
+        import pipeline
 
-        try:
-            # загрузка данных
-            self.current_df = pd.read_sql_query(f"SELECT * FROM {dataset_name}", self.db_conn)
-            self.current_dataset = dataset_name
+        self.tasks.submit(dataset_name, pipeline.open_dataset, self.db_path, dataset_name,
+                          on_result=lambda handle: self.on_dataset_loaded(dataset_name, handle),
+                          on_error=lambda error: QMessageBox.critical(
+                              self, "Ошибка", f"Ошибка при загрузке датасета: {str(error)}"),
+                          description=f"Чтение '{dataset_name}'", replace=True)
 
-            # обновление интерфейса
-            self.update_interface()
+    def on_dataset_loaded(self, dataset_name, handle):
+        # пока грузили, пользователь мог выбрать другой датасет
+        if dataset_name != self.dataset_combo.currentText():
+            return
 
-            self.add_log(f"Загружен датасет: {dataset_name}")
+        self.current_handle = handle
+        self.base_handle = handle
+        self.current_dataset = dataset_name
+        self.fill_query_panel()
 
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке датасета: {str(e)}")
+        # обновление интерфейса
+        self.update_interface()
+
+        self.add_log(f"Загружен датасет: {dataset_name}")
     # удаление датасета
     def delete_dataset(self):
         dataset_name = self.dataset_combo.currentText()
@@ -264,27 +514,29 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
                                      QMessageBox.Yes | QMessageBox.No)
 
         if reply == QMessageBox.Yes:
-            try:
-                cursor = self.db_conn.cursor()
-
-                # удаление таблицы с данными
-                cursor.execute(f"DROP TABLE IF EXISTS {dataset_name}")
-
-                # удаление информации
-                cursor.execute("DELETE FROM datasets WHERE name = ?", (dataset_name,))
-
-                self.db_conn.commit()
-
-                # обновление интерфейса
-                self.refresh_datasets()
-                self.current_df = None
-                self.current_dataset = None
-                self.update_interface()
-
-                self.add_log(f"Датасет '{dataset_name}' удален")
+            import pipeline
+            # фоновые задачи удаляемого датасета больше не нужны; само удаление тоже в фоне,
+            # запись в БД может ждать загрузку другого датасета
+            self.tasks.cancel(dataset_name)
+            self.tasks.cancel(write_key(dataset_name))
+            self.tasks.submit(write_key(dataset_name), pipeline.delete_dataset, self.db_path, dataset_name,
+                              on_result=lambda _: self.on_dataset_deleted(dataset_name),
+                              on_error=lambda error: QMessageBox.critical(
+                                  self, "Ошибка", f"Ошибка при удалении датасета: {str(error)}"),
+                              description=f"Удаление '{dataset_name}'")
+
+    def on_dataset_deleted(self, dataset_name):
+        self.invalidate_charts(dataset_name)
+
+        # обновление интерфейса
+        self.refresh_datasets()
+        self.current_handle = None
+        self.base_handle = None
+        self.fill_query_panel()
+        self.current_dataset = None
+        self.update_interface()
 
-            except Exception as e:
-                QMessageBox.critical(self, "Ошибка", f"Ошибка при удалении датасета: {str(e)}")
+        self.add_log(f"Датасет '{dataset_name}' удален")
     # первая вкладка статистика данных
     def setup_tab1(self):
         layout = QVBoxLayout(self.tab1)
@@ -308,15 +560,129 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         layout.addWidget(stats_group)
 
         # предпросмотр данных
-        preview_group = QGroupBox("Предпросмотр данных (первые 20 строк)")
+        preview_group = QGroupBox("Предпросмотр данных")
         preview_layout = QVBoxLayout(preview_group)
 
-        self.table_preview = QTableWidget()
+        # строки подгружаются страницами по мере прокрутки
+        self.table_preview = QTableView()
+        self.preview_model = DatasetTableModel(parent=self)
+        self.table_preview.setModel(self.preview_model)
+        self.table_preview.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         preview_layout.addWidget(self.table_preview)
 
         layout.addWidget(preview_group)
+    # панель фильтра и группировки над вкладками
+    def setup_query_panel(self):
+        query_group = QGroupBox("Фильтр и группировка")
+        layout = QHBoxLayout(query_group)
+
+        self.filter_column_combo = QComboBox()
+        layout.addWidget(self.filter_column_combo)
+        self.filter_op_combo = QComboBox()
+        for label, op in (("=", "="), ("≠", "!="), ("<", "<"), ("≤", "<="), (">", ">"), ("≥", ">="),
+                          ("содержит", "contains"), ("в списке", "in")):
+            self.filter_op_combo.addItem(label, op)
+        layout.addWidget(self.filter_op_combo)
+        self.filter_value_input = QLineEdit()
+        self.filter_value_input.setPlaceholderText("значение (список - через запятую)")
+        layout.addWidget(self.filter_value_input)
+        add_filter_btn = QPushButton("Добавить условие")
+        add_filter_btn.clicked.connect(self.add_filter)
+        layout.addWidget(add_filter_btn)
+        self.filters_label = QLabel("Условий нет")
+        layout.addWidget(self.filters_label)
+
+        layout.addWidget(QLabel("Группировка:"))
+        self.group_column_combo = QComboBox()
+        layout.addWidget(self.group_column_combo)
+        # для дат - по периодам
+        self.group_bucket_combo = QComboBox()
+        for label, bucket in (("без периода", None), ("день", "day"), ("неделя", "week"),
+                              ("месяц", "month"), ("год", "year")):
+            self.group_bucket_combo.addItem(label, bucket)
+        layout.addWidget(self.group_bucket_combo)
+        self.group_func_combo = QComboBox()
+        for label, func in (("среднее", "avg"), ("сумма", "sum"), ("минимум", "min"),
+                            ("максимум", "max"), ("количество", "count")):
+            self.group_func_combo.addItem(label, func)
+        layout.addWidget(self.group_func_combo)
+
+        self.apply_query_btn = QPushButton("Применить")
+        self.apply_query_btn.clicked.connect(self.apply_query)
+        self.apply_query_btn.setStyleSheet("""
+            QPushButton {
+                background-color: #2196F3;
+                color: white;
+                padding: 5px;
+                border-radius: 3px;
+            }
+        """)
+        layout.addWidget(self.apply_query_btn)
+        reset_query_btn = QPushButton("Сбросить")
+        reset_query_btn.clicked.connect(self.reset_query)
+        layout.addWidget(reset_query_btn)
+        layout.addStretch()
+        return query_group
+
+    def fill_query_panel(self): # столбцы выбранного датасета, условия сбрасываются
+        self.filters = []
+        self.filters_label.setText("Условий нет")
+        self.filter_column_combo.clear()
+        self.group_column_combo.clear()
+        self.group_column_combo.addItem("нет", None)
+        if self.base_handle is not None:
+            self.filter_column_combo.addItems(self.base_handle.columns)
+            for col in self.base_handle.columns:
+                self.group_column_combo.addItem(col, col)
+
+    def add_filter(self):
+        column = self.filter_column_combo.currentText()
+        value = self.filter_value_input.text()
+        if not column or not value.strip():
+            QMessageBox.warning(self, "Предупреждение", "Выберите столбец и введите значение")
+            return
+        self.filters.append((column, self.filter_op_combo.currentData(), value))
+        self.filters_label.setText(" и ".join(f"{col} {op} {val}" for col, op, val in self.filters))
+        self.filter_value_input.clear()
+
+    # отбор и группировка в фоне; графики и предпросмотр переключаются на результат
+    def apply_query(self):
+        if self.base_handle is None:
+            QMessageBox.warning(self, "Предупреждение", "Сначала загрузите данные")
+            return
+        import pipeline
+        group_by = self.group_column_combo.currentData()
+        func = self.group_func_combo.currentData() if group_by else None
+        bucket = self.group_bucket_combo.currentData() if group_by else None
+        dataset_name = self.current_dataset
+        self.tasks.submit(dataset_name, pipeline.query_dataset, self.base_handle, list(self.filters),
+                          group_by, bucket, func,
+                          on_result=lambda result: self.on_query_ready(dataset_name, result),
+                          on_error=lambda error: QMessageBox.critical(
+                              self, "Ошибка", f"Ошибка в фильтре: {str(error)}"),
+                          description="Фильтр и группировка")
+
+    def on_query_ready(self, dataset_name, result):
+        if dataset_name != self.current_dataset:
+            return
+        handle, indexed = result
+        self.current_handle = handle
+        self.update_interface()
+        if indexed:
+            self.add_log(f"Созданы индексы по часто используемым столбцам: {', '.join(indexed)}")
+        self.add_log(f"Применен фильтр к '{dataset_name}': {handle.row_count:,} строк в результате")
+
+    def reset_query(self):
+        self.fill_query_panel()
+        if self.base_handle is not None and self.current_handle is not self.base_handle:
+            self.current_handle = self.base_handle
+            self.update_interface()
+            self.add_log(f"Фильтр датасета '{self.current_dataset}' сброшен")
     # графики корреляции
     def setup_tab2(self):
+        from chart_canvas import CachedCanvas # встраиваем графики прямо в приложение, готовые картинки кэшируются
+        from matplotlib.figure import Figure
+        from sampling import SAMPLE_CAP
         layout = QVBoxLayout(self.tab2)
 
         # выбор конкретного графика
@@ -325,6 +691,23 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         self.corr_combo = QComboBox()
         self.corr_combo.addItems(["scatterplot", "regplot", "pairplot"])
         controls_layout.addWidget(self.corr_combo)
+        # на больших таблицах рисуем выборку или плотность вместо всех точек
+        controls_layout.addWidget(QLabel("Режим:"))
+        self.corr_mode_combo = QComboBox()
+        self.corr_mode_combo.addItem("авто", "auto")
+        self.corr_mode_combo.addItem("выборка", "sample")
+        self.corr_mode_combo.addItem("плотность", "density")
+        controls_layout.addWidget(self.corr_mode_combo)
+        controls_layout.addWidget(QLabel("Точек:"))
+        self.sample_cap_spin = QSpinBox()
+        self.sample_cap_spin.setRange(100, 1000000)
+        self.sample_cap_spin.setSingleStep(1000)
+        self.sample_cap_spin.setValue(SAMPLE_CAP)
+        controls_layout.addWidget(self.sample_cap_spin)
+        controls_layout.addWidget(QLabel("Группы:"))
+        self.stratify_combo = QComboBox()
+        self.stratify_combo.addItem("нет", None)
+        controls_layout.addWidget(self.stratify_combo)
 
         self.plot_corr_btn = QPushButton("Построить график")
         self.plot_corr_btn.clicked.connect(self.plot_correlation)
@@ -358,13 +741,21 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         layout.addLayout(controls_layout)
 
         # plot area
-        self.corr_canvas = FigureCanvas(Figure(figsize=(10, 8)))
+        self.corr_canvas = CachedCanvas(Figure(figsize=(10, 8)))
         layout.addWidget(self.corr_canvas)
+        self.fill_column_combos()
     # вкладка с тепловой картой
     def setup_tab3(self):
+        from chart_canvas import CachedCanvas
+        from matplotlib.figure import Figure
         layout = QVBoxLayout(self.tab3)
 
         controls_layout = QHBoxLayout()
+        # метод корреляции
+        controls_layout.addWidget(QLabel("Метод:"))
+        self.corr_method_combo = QComboBox()
+        self.corr_method_combo.addItems(["pearson", "spearman"])
+        controls_layout.addWidget(self.corr_method_combo)
 
         self.heatmap_btn = QPushButton("Построить тепловую карту")
         self.heatmap_btn.clicked.connect(self.plot_heatmap)
@@ -397,16 +788,28 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         layout.addLayout(controls_layout)
 
         # plot area
-        self.heatmap_canvas = FigureCanvas(Figure(figsize=(10, 8)))
+        self.heatmap_canvas = CachedCanvas(Figure(figsize=(10, 8)))
         layout.addWidget(self.heatmap_canvas)
     # постройка линейных графиков
     def setup_tab4(self):
+        from chart_canvas import CachedCanvas
+        from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
+        from matplotlib.figure import Figure
         layout = QVBoxLayout(self.tab4)
         # выбор столбца по которому нужно строить график
         controls_layout = QHBoxLayout()
         controls_layout.addWidget(QLabel("Выберите столбец:"))
         self.column_combo = QComboBox()
         controls_layout.addWidget(self.column_combo)
+        # ось x: номер строки или столбец дат (тогда график строится по агрегатам за период)
+        controls_layout.addWidget(QLabel("Ось X:"))
+        self.time_combo = QComboBox()
+        controls_layout.addWidget(self.time_combo)
+        # способ прореживания длинных рядов
+        controls_layout.addWidget(QLabel("Прореживание:"))
+        self.decimation_combo = QComboBox()
+        self.decimation_combo.addItems(["minmax", "lttb"])
+        controls_layout.addWidget(self.decimation_combo)
 
         self.plot_line_btn = QPushButton("Построить линейный график")
         self.plot_line_btn.clicked.connect(self.plot_line_chart)
@@ -439,15 +842,20 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
 
         layout.addLayout(controls_layout)
 
-        # plot area
-        self.line_canvas = FigureCanvas(Figure(figsize=(10, 6)))
+        # plot area, панель инструментов для масштабирования и сдвига
+        self.line_canvas = CachedCanvas(Figure(figsize=(10, 6)))
+        self.line_series = None
+        self.line_by_time = False
+        layout.addWidget(NavigationToolbar(self.line_canvas, self.tab4))
         layout.addWidget(self.line_canvas)
+        self.fill_column_combos()
     # вкладка с логами пользователя
     def setup_tab5(self):
         layout = QVBoxLayout(self.tab5)
 
         self.log_text = QTextEdit()
         self.log_text.setReadOnly(True)
+        self.log_text.document().setMaximumBlockCount(MAX_LOG_ENTRIES)
         layout.addWidget(self.log_text)
 
         clear_btn = QPushButton("Очистить лог")
@@ -462,191 +870,291 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         """)
         layout.addWidget(clear_btn)
 
+    # вкладка с замерами: сводка по участкам (sql, вычисления, отрисовка) и выгрузка
+    def setup_tab6(self):
+        layout = QVBoxLayout(self.tab6)
+
+        self.perf_text = QTextEdit()
+        self.perf_text.setReadOnly(True)
+        self.perf_text.setFont(QFont("Consolas", 9))
+        self.perf_text.setLineWrapMode(QTextEdit.NoWrap)
+        layout.addWidget(self.perf_text)
+
+        buttons_layout = QHBoxLayout()
+        for title, slot in (("Обновить", self.refresh_perf), ("Экспорт JSON", self.export_perf_json),
+                            ("Экспорт Chrome trace", self.export_perf_trace), ("Очистить замеры", self.clear_perf)):
+            button = QPushButton(title)
+            button.clicked.connect(slot)
+            button.setStyleSheet("""
+                QPushButton {
+                    background-color: #607D8B;
+                    color: white;
+                    padding: 8px;
+                    border-radius: 4px;
+                }
+            """)
+            buttons_layout.addWidget(button)
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+
+    def on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.tab6:
+            self.refresh_perf()
+
+    def refresh_perf(self):
+        cache = frames.stats()
+        self.perf_text.setPlainText(
+            format_summary(tracer.summary())
+            + f"\n\nКэш таблиц в памяти: {cache['entries']} записей, {cache['used_mb']:.1f} из "
+              f"{cache['budget_mb']:.0f} MB, попаданий {cache['hits']}, промахов {cache['misses']}")
+
+    def export_perf_json(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить замеры", "perf.json", "JSON (*.json)")
+        if path:
+            tracer.export_json(path)
+            self.add_log(f"Замеры сохранены: {path}")
+
+    def export_perf_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Сохранить trace", "trace.json", "Chrome trace (*.json)")
+        if path:
+            tracer.export_chrome_trace(path)
+            self.add_log(f"Trace сохранен: {path}")
+
+    def clear_perf(self):
+        tracer.clear()
+        self.refresh_perf()
+
     def update_interface(self):
-        if self.current_df is not None and self.current_dataset:
+        if self.current_handle is not None and self.current_dataset:
             # обновление информации о датасете
             self.dataset_info_label.setText(
                 f"Текущий датасет: {self.current_dataset} | "
-                f"Строк: {len(self.current_df):,} | "
-                f"Столбцов: {len(self.current_df.columns)} | "
+                f"Строк: {self.current_handle.row_count:,} | "
+                f"Столбцов: {len(self.current_handle.columns)} | "
                 f"Загружен: {datetime.now().strftime('%H:%M:%S')}"
+                + (" | срез по фильтру" if self.current_handle is not self.base_handle else "")
             )
 
             # обновление комбобоксов для графиков
-            self.column_combo.clear()
-            numeric_columns = self.current_df.select_dtypes(include=[np.number]).columns.tolist()
-            self.column_combo.addItems(numeric_columns)
+            self.fill_column_combos()
+
+            # предпросмотр читает только видимые строки
+            self.show_table_preview(self.current_handle)
 
             # автоматическая загрузка статистики
             self.load_dataset_stats()
         else:
             self.dataset_info_label.setText('Датасет не выбран')
             self.stats_text.clear()
-            self.table_preview.setRowCount(0)
-            self.table_preview.setColumnCount(0)
+            self.preview_model.set_handle(None)
+            self.fill_column_combos()
+    # столбцы текущего датасета в комбобоксах уже построенных вкладок графиков
+    def fill_column_combos(self):
+        handle = self.current_handle
+        if self.column_combo is not None:
             self.column_combo.clear()
-    # загрузка статистики датасета
+            if handle is not None:
+                self.column_combo.addItems(handle.numeric_columns)
+            self.time_combo.clear()
+            self.time_combo.addItem("Номер", None)
+            if handle is not None:
+                for col in handle.time_columns:
+                    self.time_combo.addItem(col, col)
+        if self.stratify_combo is not None:
+            self.stratify_combo.clear()
+            self.stratify_combo.addItem("нет", None)
+            if handle is not None:
+                # даты почти всегда разные в каждой строке: группами они не служат
+                for col in handle.columns:
+                    if col not in handle.numeric_columns and col not in handle.time_columns:
+                        self.stratify_combo.addItem(col, col)
+    # загрузка статистики датасета (подсчет в фоне)
     def load_dataset_stats(self):
-        if self.current_df is None:
+        if self.current_handle is None:
             return
 
-        try:
-            #основная информация
-            stats_text = f"ОСНОВНАЯ ИНФОРМАЦИЯ:\n"
-            stats_text += f"Размер данных: {self.current_df.shape[0]:,} строк × {self.current_df.shape[1]} столбцов\n"
-            stats_text += f"Объем памяти: {self.current_df.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MB\n\n"
-
-            # тип данных
-            stats_text += f"ТИПЫ ДАННЫХ:\n"
-            for col, dtype in self.current_df.dtypes.items():
-                stats_text += f"  {col}: {dtype}\n"
-            stats_text += f"\n"
-
-            # статистика числовых столбцов
-            numeric_df = self.current_df.select_dtypes(include=[np.number])
-            if not numeric_df.empty:
-                stats_text += f"СТАТИСТИКА ЧИСЛОВЫХ СТОЛБЦОВ:\n"
-                stats_text += str(numeric_df.describe())
-            else:
-                stats_text += "Числовые столбцы не найдены\n"
-
-            # пропуски
-            missing_values = self.current_df.isnull().sum()
-            if missing_values.sum() > 0:
-                stats_text += f"\n ПРОПУЩЕННЫЕ ЗНАЧЕНИЯ:\n"
-                for col, count in missing_values[missing_values > 0].items():
-                    stats_text += f"  {col}: {count} пропусков ({count / len(self.current_df) * 100:.1f}%)\n"
-
-            self.stats_text.setText(stats_text)
+        import pipeline
+        dataset_name = self.current_dataset
+        self.tasks.submit(dataset_name, pipeline.dataset_stats, self.current_handle,
+                          on_result=lambda text: self.on_stats_ready(dataset_name, text),
+                          on_error=lambda error: QMessageBox.critical(
+                              self, "Ошибка", f"Ошибка при загрузке статистики: {str(error)}"),
+                          description="Статистика")
 
-            # предпросмотр
-            self.show_table_preview(self.current_df.head(20))
+    def on_stats_ready(self, dataset_name, stats_text):
+        if dataset_name != self.current_dataset:
+            return
 
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при загрузке статистики: {str(e)}")
+        self.stats_text.setText(stats_text)
     # отображение предпросмотра талиц
-    def show_table_preview(self, df):
-        self.table_preview.setRowCount(df.shape[0])
-        self.table_preview.setColumnCount(df.shape[1])
-        self.table_preview.setHorizontalHeaderLabels(df.columns)
-
-        for i in range(df.shape[0]):
-            for j in range(df.shape[1]):
-                item = QTableWidgetItem(str(df.iloc[i, j]))
-                self.table_preview.setItem(i, j, item)
-
+    def show_table_preview(self, handle):
+        self.preview_model.set_handle(handle)
         self.table_preview.resizeColumnsToContents()
-    # построение графиков корреляции
+    # построение графиков корреляции: подготовка данных в фоне, отрисовка в интерфейсе
     def plot_correlation(self):
-        if self.current_df is None:
+        if self.current_handle is None:
             QMessageBox.warning(self, "Предупреждение", "Сначала загрузите данные")
             return
 
-        try:
-            numeric_df = self.current_df.select_dtypes(include=[np.number])
-            if len(numeric_df.columns) < 2:
-                QMessageBox.warning(self, "Предупреждение", "Недостаточно числовых столбцов для анализа корреляции")
-                return
+        if len(self.current_handle.numeric_columns) < 2:
+            QMessageBox.warning(self, "Предупреждение", "Недостаточно числовых столбцов для анализа корреляции")
+            return
 
-            plot_type = self.corr_combo.currentText()
-            self.corr_canvas.figure.clear()
-            ax = self.corr_canvas.figure.add_subplot(111)
-
-            if plot_type == "scatterplot":
-                col1, col2 = numeric_df.columns[:2]
-                sns.scatterplot(data=numeric_df, x=col1, y=col2, ax=ax)
-                ax.set_title(f'Scatter Plot: {col1} vs {col2}')
-
-            elif plot_type == "regplot":
-                col1, col2 = numeric_df.columns[:2]
-                sns.regplot(data=numeric_df, x=col1, y=col2, ax=ax)
-                ax.set_title(f'Regression Plot: {col1} vs {col2}')
-
-            elif plot_type == "pairplot":
-                pairplot_df = numeric_df.iloc[:, :min(4, len(numeric_df.columns))]
-                self.corr_canvas.figure.clear()
-                fig = sns.pairplot(pairplot_df)
-                fig.figure.subplots_adjust(top=0.95)
-                fig.figure.suptitle('Pairplot')
-                self.corr_canvas.figure = fig.figure
-
-            self.corr_canvas.draw()
+        import pipeline
+        from chart_canvas import chart_key
+        plot_type = self.corr_combo.currentText()
+        mode, cap, stratify = (self.corr_mode_combo.currentData(), self.sample_cap_spin.value(),
+                               self.stratify_combo.currentData())
+        key = chart_key(self.current_handle, plot_type, mode, cap, stratify)
+        if self.corr_canvas.show_cached(key):
+            self.add_log(f"График корреляции {plot_type} показан из кэша")
+            return
+        self.tasks.submit(self.current_dataset, pipeline.correlation_data, self.current_handle, plot_type,
+                          mode, cap, stratify,
+                          on_result=lambda data: self.draw_correlation(plot_type, data, key),
+                          on_error=self.on_correlation_error,
+                          description=f"График {plot_type}")
+
+    def draw_correlation(self, plot_type, data, key=None):
+        import charts
+        try:
+            # все типы графиков рисуются на фигуре самого холста; scatterplot тех же столбцов
+            # обновляется на месте, без перестроения осей
+            with span(f'draw_{plot_type}', 'render', dataset=self.current_dataset):
+                self.corr_canvas.render(key, lambda figure: charts.draw_correlation(figure, plot_type, data),
+                                        (lambda figure: charts.update_scatter(figure, data))
+                                        if plot_type == "scatterplot" else None)
             self.add_log(f"Построен график корреляции: {plot_type}")
 
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при построении графика: {str(e)}")
-            self.add_log(f"Ошибка при построении графика корреляции: {str(e)}")
+            self.on_correlation_error(e)
+
+    def on_correlation_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при построении графика: {str(error)}")
+        self.add_log(f"Ошибка при построении графика корреляции: {str(error)}")
     # очистка графиков корреляции
     def clear_correlation_plots(self):
-        self.corr_canvas.figure.clear()
-        self.corr_canvas.draw()
+        self.corr_canvas.clear_chart()
         self.add_log("Графики корреляции очищены")
 
     def plot_heatmap(self):
-        if self.current_df is None:
+        if self.current_handle is None:
             QMessageBox.warning(self, "Предупреждение", "Сначала загрузите данные")
             return
 
-        try:
-            numeric_df = self.current_df.select_dtypes(include=[np.number])
-            if len(numeric_df.columns) < 2:
-                QMessageBox.warning(self, "Предупреждение", "Недостаточно числовых столбцов для тепловой карты")
-                return
-
-            self.heatmap_canvas.figure.clear()
-            ax = self.heatmap_canvas.figure.add_subplot(111)
+        if len(self.current_handle.numeric_columns) < 2:
+            QMessageBox.warning(self, "Предупреждение", "Недостаточно числовых столбцов для тепловой карты")
+            return
 
-            # вычисление корреляционной матрицы
-            corr_matrix = numeric_df.corr()
+        import pipeline
+        from chart_canvas import chart_key
+        # вычисление корреляционной матрицы в фоне
+        method = self.corr_method_combo.currentText()
+        key = chart_key(self.current_handle, 'heatmap', method)
+        if self.heatmap_canvas.show_cached(key):
+            self.add_log(f"Тепловая карта ({method}) показана из кэша")
+            return
+        self.tasks.submit(self.current_dataset, pipeline.correlation_matrix, self.current_handle, method,
+                          on_result=lambda corr_matrix: self.draw_heatmap(corr_matrix, method, key),
+                          on_error=self.on_heatmap_error,
+                          description="Тепловая карта")
 
+    def draw_heatmap(self, corr_matrix, method='pearson', key=None):
+        import charts
+        try:
             # построение тепловой карты
-            sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', center=0, ax=ax)
-            ax.set_title('Тепловая карта корреляций')
-
-            self.heatmap_canvas.draw()
-            self.add_log("Построена тепловая карта корреляций")
+            with span('draw_heatmap', 'render', dataset=self.current_dataset):
+                self.heatmap_canvas.render(key, lambda figure: charts.draw_heatmap(figure, corr_matrix, method))
+            self.add_log(f"Построена тепловая карта корреляций ({method})")
 
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при построении тепловой карты: {str(e)}")
-            self.add_log(f"Ошибка при построении тепловой карты: {str(e)}")
+            self.on_heatmap_error(e)
+
+    def on_heatmap_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при построении тепловой карты: {str(error)}")
+        self.add_log(f"Ошибка при построении тепловой карты: {str(error)}")
 
     def clear_heatmap(self):
-        self.heatmap_canvas.figure.clear()
-        self.heatmap_canvas.draw()
+        self.heatmap_canvas.clear_chart()
         self.add_log("Тепловая карта очищена")
 
     def plot_line_chart(self):
-        if self.current_df is None:
+        if self.current_handle is None:
             QMessageBox.warning(self, "Предупреждение", "Сначала загрузите данные")
             return
 
+        column = self.column_combo.currentText()
+        if not column:
+            QMessageBox.warning(self, "Предупреждение", "Выберите столбец для построения графика")
+            return
+
+        import pipeline
+        from chart_canvas import chart_key
+        method = self.decimation_combo.currentText()
+        time_column = self.time_combo.currentData()
+        key = chart_key(self.current_handle, 'line', column, method, time_column)
+        if self.line_canvas.show_cached(key):
+            self.add_log(f"Линейный график для столбца {column} показан из кэша")
+            return
+        if time_column is not None:
+            # уровень агрегатов подбирается по ширине холста
+            self.tasks.submit(self.current_dataset, pipeline.time_line_data, self.current_handle, column, time_column,
+                              self.line_canvas.width(),
+                              on_result=lambda data: self.draw_time_line_chart(column, time_column, data, method, key),
+                              on_error=self.on_line_chart_error,
+                              description=f"Линейный график {column} по {time_column}")
+            return
+        self.tasks.submit(self.current_dataset, pipeline.line_data, self.current_handle, column,
+                          on_result=lambda values: self.draw_line_chart(column, values, method, key),
+                          on_error=self.on_line_chart_error,
+                          description=f"Линейный график {column}")
+
+    def draw_line_chart(self, column, values, method='minmax', key=None):
+        import charts
+        def build(figure):
+            self.line_series = charts.draw_line(figure, column, values, method)
+            self.line_by_time = False
+
+        def update(figure): # линия уже на холсте - меняются только данные
+            if self.line_series is None or self.line_series.ax not in figure.axes or self.line_by_time:
+                return False
+            charts.update_line(self.line_series, column, values, method)
+            return True
+
         try:
-            column = self.column_combo.currentText()
-            if not column:
-                QMessageBox.warning(self, "Предупреждение", "Выберите столбец для построения графика")
-                return
+            # построение линейного графика: на холст попадает не больше точек, чем пикселей,
+            # при масштабировании видимый участок прореживается заново
+            with span('draw_line', 'render', dataset=self.current_dataset, rows=len(values)):
+                self.line_canvas.render(key, build, update, extra_bytes=values.nbytes)
+            self.add_log(f"Построен линейный график для столбца: {column}")
 
-            self.line_canvas.figure.clear()
-            ax = self.line_canvas.figure.add_subplot(111)
+        except Exception as e:
+            self.on_line_chart_error(e)
 
-            # построение линейного графика
-            data = self.current_df[column].dropna()
-            ax.plot(data.values, linewidth=2)
-            ax.set_title(f'Линейный график: {column}')
-            ax.set_ylabel(column)
-            ax.set_xlabel('Номер')
-            ax.grid(True, alpha=0.3)
+    def draw_time_line_chart(self, column, time_column, data, method='minmax', key=None):
+        import charts
+        from rollups import LEVEL_NAMES
+        def build(figure):
+            self.line_series = charts.draw_time_line(figure, column, data, time_column, method)
+            self.line_by_time = True  # ось x - даты, обычный график на этих осях не обновить
 
-            self.line_canvas.draw()
-            self.add_log(f"Построен линейный график для столбца: {column}")
+        try:
+            with span('draw_line', 'render', dataset=self.current_dataset, rows=len(data['x'])):
+                self.line_canvas.render(key, build, extra_bytes=data['x'].nbytes * 4)
+            source = f"агрегаты по {LEVEL_NAMES[data['level']]}" if data['level'] else "строки датасета"
+            self.add_log(f"Построен линейный график для столбца {column} по {time_column} "
+                         f"({source}, точек: {len(data['x']):,})")
 
         except Exception as e:
-            QMessageBox.critical(self, "Ошибка", f"Ошибка при построении линейного графика: {str(e)}")
-            self.add_log(f"Ошибка при построении линейного графика: {str(e)}")
+            self.on_line_chart_error(e)
+
+    def on_line_chart_error(self, error):
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при построении линейного графика: {str(error)}")
+        self.add_log(f"Ошибка при построении линейного графика: {str(error)}")
 
     def clear_line_chart(self):
-        self.line_canvas.figure.clear()
-        self.line_canvas.draw()
+        self.line_series = None
+        self.line_canvas.clear_chart()
         self.add_log("Линейный график очищен")
 
     def add_log(self, message):
@@ -659,10 +1167,32 @@ class DataVisualizationApp(QMainWindow): # главное приложение 
         self.log_text.clear()
         self.log_actions.clear()
         self.add_log("Лог очищен")
+    # отображение хода фоновых задач
+    def on_task_started(self, task):
+        self.task_label.setText(task.description)
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.show()
+        self.cancel_btn.show()
+
+    def on_task_progress(self, task, done, total):
+        if total:
+            self.progress_bar.setRange(0, total)
+            self.progress_bar.setValue(done)
+        else:
+            self.task_label.setText(f"{task.description}: {done:,}")
+
+    def on_tasks_idle(self):
+        self.task_label.setText('')
+        self.progress_bar.hide()
+        self.cancel_btn.hide()
+
+    def cancel_tasks(self):
+        self.tasks.cancel()
+        self.add_log("Фоновые задачи отменены")
 
     def closeEvent(self, event):
-        if self.db_conn:
-            self.db_conn.close()
+        self.tasks.shutdown()
+        close_all()
         event.accept()
 
 
@@ -685,7 +1215,10 @@ def main():
                                      f"Не удалось создать базу данных: {e}")
                 return
 
-    window = DataVisualizationApp()
+    # --full-start: все вкладки и подключение к БД сразу, как раньше;
+    # --startup-time: вывести время до первой отрисовки в мс и выйти
+    window = DataVisualizationApp(fast_start='--full-start' not in sys.argv,
+                                  exit_after_paint='--startup-time' in sys.argv)
     window.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,94 @@
+from ingest import quote_ident, ensure_index
+from dataset import is_numeric_type
+
+# фильтры и группировка для выполнения внутри sqlite:
+# условия превращаются в параметризованный WHERE, группировка - в GROUP BY с агрегатами,
+# в pandas попадает только отобранный или сгруппированный результат
+
+OPERATORS = ('=', '!=', '<', '<=', '>', '>=', 'contains', 'in')
+AGGREGATES = ('count', 'sum', 'avg', 'min', 'max')
+TIME_BUCKETS = {'day': '%Y-%m-%d', 'week': '%Y-%W', 'month': '%Y-%m', 'year': '%Y'}  # форматы strftime
+INDEX_AFTER = 3  # после стольких фильтров по столбцу на нем создается индекс
+
+
+def coerce_value(value, sql_type): # значение из поля ввода в тип столбца
+    value = str(value).strip()
+    if not is_numeric_type(sql_type):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            raise ValueError(f"Значение '{value}' не является числом")
+
+
+# список (столбец, операция, значение) -> текст условия WHERE и параметры
+def compile_filters(filters, sql_types):
+    conditions = []
+    params = []
+    for column, op, value in filters:
+        if column not in sql_types:
+            raise ValueError(f"Столбец '{column}' не найден")
+        col = quote_ident(column)
+        if op == 'contains':
+            conditions.append(f"{col} LIKE ?")
+            params.append(f"%{str(value).strip()}%")
+        elif op == 'in':
+            values = [coerce_value(v, sql_types[column]) for v in str(value).split(',') if v.strip()]
+            if not values:
+                raise ValueError(f"Пустой список значений для '{column}'")
+            conditions.append(f"{col} IN ({', '.join('?' * len(values))})")
+            params += values
+        elif op in OPERATORS:
+            conditions.append(f"{col} {op} ?")
+            params.append(coerce_value(value, sql_types[column]))
+        else:
+            raise ValueError(f"Неизвестная операция: {op}")
+    return " AND ".join(conditions), params
+
+
+# запрос с группировкой: по столбцу (для дат - по дню/неделе/месяцу/году) и агрегатом
+# по всем числовым столбцам; без group_by - одна строка итогов
+def compile_aggregate(table, sql_types, where="", params=(), group_by=None, bucket=None, func='avg'):
+    if func not in AGGREGATES:
+        raise ValueError(f"Неизвестная агрегация: {func}")
+    if group_by is not None and group_by not in sql_types:
+        raise ValueError(f"Столбец '{group_by}' не найден")
+
+    select = []
+    group_sql = ""
+    if group_by is not None:
+        group = quote_ident(group_by)
+        if bucket is not None:
+            group = f"strftime('{TIME_BUCKETS[bucket]}', {group})"
+        select.append(f"{group} AS {quote_ident(group_by)}")
+        group_sql = f" GROUP BY 1 ORDER BY 1"
+
+    if func == 'count':
+        select.append('COUNT(*) AS "count"')
+    else:
+        for col, sql_type in sql_types.items():
+            if col != group_by and is_numeric_type(sql_type):
+                select.append(f"{func.upper()}({quote_ident(col)}) AS {quote_ident(col)}")
+
+    sql = f"SELECT {', '.join(select)} FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    return sql + group_sql, list(params)
+
+
+# учет фильтров по столбцам (в транзакции писателя); часто фильтруемые столбцы получают индекс
+def record_usage(conn, dataset_name, columns):
+    indexed = []
+    for column in set(columns):
+        conn.execute('''
+            INSERT INTO column_usage (dataset, column_name, uses) VALUES (?, ?, 1)
+            ON CONFLICT (dataset, column_name) DO UPDATE SET uses = uses + 1
+        ''', (dataset_name, column))
+        uses = conn.execute("SELECT uses FROM column_usage WHERE dataset = ? AND column_name = ?",
+                            (dataset_name, column)).fetchone()[0]
+        if uses >= INDEX_AFTER and ensure_index(conn, dataset_name, column):
+            indexed.append(column)
+    return indexed
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from dtypes import ISO_DATE, DATETIME
+
+# пирамида агрегатов по времени для датасетов со столбцом дат: count/sum/min/max числовых столбцов
+# по минутам, часам, дням, неделям и месяцам в таблице time_rollups (см. database.py)
+# строится за тот же проход, что и загрузка, при дописывании строк корзины дополняются;
+# линейный график по времени читает самый грубый уровень, которого хватает на ширину холста,
+# а не строки датасета
+
+LEVELS = ('minute', 'hour', 'day', 'week', 'month')  # от мелкого к крупному
+STEP = {'minute': 60, 'hour': 3600, 'day': 86400, 'week': 7 * 86400}  # секунд в корзине
+MONDAY = 4 * 86400  # 1970-01-01 - четверг, недели начинаются с понедельника
+LEVEL_NAMES = {'minute': 'минутам', 'hour': 'часам', 'day': 'дням', 'week': 'неделям', 'month': 'месяцам'}
+KEEP_RATIO = 0.5  # уровень хранится, если корзин не больше этой доли строк (иначе он почти не сжимает)
+COMPACT_ROWS = 200000  # накопленных строк агрегатов, после которых они сворачиваются
+DATE_SQL_TYPES = ('TIMESTAMP', 'DATETIME', 'DATE')
+
+UPSERT = '''
+    INSERT INTO time_rollups (dataset, time_column, level, value_column, bucket, n, total, low, high)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (dataset, time_column, level, value_column, bucket) DO UPDATE SET
+        n = n + excluded.n,
+        total = COALESCE(total, 0) + COALESCE(excluded.total, 0),
+        low = MIN(COALESCE(low, excluded.low), COALESCE(excluded.low, low)),
+        high = MAX(COALESCE(high, excluded.high), COALESCE(excluded.high, high))
+'''
+
+
+def to_seconds(values): # секунды от 1970 (float, NaN - не дата)
+    if not pd.api.types.is_datetime64_any_dtype(values):
+        values = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    if getattr(values.dt, 'tz', None) is not None:
+        values = values.dt.tz_convert(None)
+    seconds = values.to_numpy(dtype='datetime64[s]').astype(np.int64).astype(float)
+    seconds[values.isna().to_numpy()] = np.nan
+    return seconds
+
+
+def date_columns(chunk): # столбцы дат по первому куску: datetime или строки вида 2023-01-31
+    columns = []
+    for col in chunk.columns:
+        values = chunk[col]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            columns.append(str(col))
+            continue
+        if pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+            continue
+        values = values.dropna().astype(str)
+        if len(values) and values.str.match(ISO_DATE).all() and not np.isnan(to_seconds(values)).any():
+            columns.append(str(col))
+    return columns
+
+
+def is_date_column(sql_type, dtype): # по типу в sqlite или по схеме типов датасета
+    return dtype == DATETIME or (sql_type or '').upper() in DATE_SQL_TYPES
+
+
+def bucket_starts(seconds, level): # начало корзины уровня для каждого момента
+    if level == 'month':
+        months = seconds.astype('datetime64[s]').astype('datetime64[M]')
+        return months.astype('datetime64[s]').astype(np.int64)
+    if level == 'week':
+        return (seconds - MONDAY) // STEP['week'] * STEP['week'] + MONDAY
+    return seconds // STEP[level] * STEP[level]
+
+
+# агрегаты (count/sum/min/max по столбцам) из агрегатов более мелкого уровня
+def coarser(stats, buckets):
+    return {'n': stats['n'].groupby(buckets).sum(), 'total': stats['total'].groupby(buckets).sum(),
+            'low': stats['low'].groupby(buckets).min(), 'high': stats['high'].groupby(buckets).max()}
+
+
+class RollupBuilder: # агрегаты по кускам в памяти, затем одна запись в БД
+    # levels - {столбец времени: уровни}; None - все уровни, лишние отбрасываются при сохранении
+    def __init__(self, time_columns, value_columns, levels=None):
+        self.time_columns = list(time_columns)
+        self.value_columns = list(value_columns)
+        self.prune = levels is None
+        self.levels = levels if levels is not None else {col: list(LEVELS) for col in self.time_columns}
+        self.parts = {}  # (столбец времени, уровень) -> список агрегатов кусков
+        self.pending = 0
+        self.rows = 0
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        values = chunk.reindex(columns=self.value_columns).apply(pd.to_numeric, errors='coerce').astype(float)
+        for time_col in self.time_columns:
+            if time_col not in chunk.columns:
+                continue
+            seconds = to_seconds(chunk[time_col])
+            valid = ~np.isnan(seconds)
+            if not valid.any():
+                continue
+            seconds = seconds[valid].astype(np.int64)
+            rows = values[valid]
+            # минуты считаются по строкам, остальные уровни - по агрегатам предыдущего
+            minutes = rows.groupby(bucket_starts(seconds, 'minute'))
+            stats = {'n': minutes.count(), 'total': minutes.sum(), 'low': minutes.min(), 'high': minutes.max()}
+            by_level = {'minute': stats}
+            by_level['hour'] = coarser(stats, bucket_starts(stats['n'].index.to_numpy(), 'hour'))
+            by_level['day'] = coarser(by_level['hour'], bucket_starts(by_level['hour']['n'].index.to_numpy(), 'day'))
+            days = by_level['day']['n'].index.to_numpy()
+            by_level['week'] = coarser(by_level['day'], bucket_starts(days, 'week'))
+            by_level['month'] = coarser(by_level['day'], bucket_starts(days, 'month'))
+            for level in self.levels.get(time_col, ()):
+                self.parts.setdefault((time_col, level), []).append(by_level[level])
+                self.pending += len(by_level[level]['n'])
+        if self.pending > COMPACT_ROWS:
+            self.compact()
+
+    def compact(self): # агрегаты кусков одного уровня сворачиваются в один
+        self.pending = 0
+        for (time_col, level), parts in list(self.parts.items()):
+            if len(parts) > 1:
+                merged = {stat: pd.concat([part[stat] for part in parts]) for stat in ('n', 'total', 'low', 'high')}
+                parts[:] = [coarser(merged, merged['n'].index.to_numpy())]
+            if self.prune and level != LEVELS[-1] and len(parts[0]['n']) > KEEP_RATIO * self.rows:
+                # уровень почти не сжимает строки (например, минуты у суточных данных) - не храним
+                self.levels[time_col].remove(level)
+                del self.parts[(time_col, level)]
+                continue
+            self.pending += len(parts[0]['n'])
+
+    # запись в time_rollups: корзины, которые уже есть (дописывание), дополняются
+    def save(self, conn, dataset_name):
+        self.compact()
+        for time_col in self.time_columns:
+            for level in self.levels.get(time_col, ()):
+                parts = self.parts.get((time_col, level))
+                if not parts:
+                    continue
+                stats = parts[0]
+                for value_col in self.value_columns:
+                    rows = pd.DataFrame({stat: stats[stat][value_col] for stat in ('n', 'total', 'low', 'high')})
+                    rows = rows.astype(object).where(rows.notna(), None)
+                    conn.executemany(UPSERT, ((dataset_name, time_col, level, value_col, int(bucket), int(n), total,
+                                               low, high)
+                                              for bucket, n, total, low, high in rows.itertuples(name=None)))
+        conn.commit()
+
+
+def stored_levels(conn, dataset_name): # {столбец времени: уровни}, для которых агрегаты уже построены
+    levels = {}
+    for time_col, level in conn.execute("SELECT DISTINCT time_column, level FROM time_rollups WHERE dataset = ?",
+                                        (dataset_name,)):
+        levels.setdefault(time_col, []).append(level)
+    return {col: [level for level in LEVELS if level in found] for col, found in levels.items()}
+
+
+def drop_rollups(conn, dataset_name, time_column=None):
+    if time_column is None:
+        conn.execute("DELETE FROM time_rollups WHERE dataset = ?", (dataset_name,))
+    else:
+        conn.execute("DELETE FROM time_rollups WHERE dataset = ? AND time_column = ?", (dataset_name, time_column))
+
+
+def level_sizes(conn, dataset_name, time_column, value_column): # уровень -> число корзин
+    return dict(conn.execute('''
+        SELECT level, COUNT(*) FROM time_rollups
+        WHERE dataset = ? AND time_column = ? AND value_column = ?
+        GROUP BY level
+    ''', (dataset_name, time_column, value_column)).fetchall())
+
+
+def choose_level(sizes, width): # самый грубый уровень, корзин которого не меньше ширины холста
+    for level in reversed(LEVELS):
+        if sizes.get(level, 0) >= width:
+            return level
+    return None
+
+
+def read_level(conn, dataset_name, time_column, value_column, level):
+    return pd.read_sql_query('''
+        SELECT bucket, n, total, low, high FROM time_rollups
+        WHERE dataset = ? AND time_column = ? AND value_column = ? AND level = ?
+        ORDER BY bucket
+    ''', conn, params=(dataset_name, time_column, value_column, level))
@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+# выборки и плотности для графиков корреляции на больших таблицах:
+# проход по кускам, память ограничена размером выборки и числом ячеек сетки
+
+SAMPLE_CAP = 5000  # точек на графике по умолчанию
+STRATA_MAX = 20  # групп в выборке по группам (и цветов на графике)
+OTHER = 'другие'  # группа для остальных значений
+
+
+class ReservoirSample: # равномерная выборка: случайный ключ у каждой строки, храним k наименьших
+    def __init__(self, k=SAMPLE_CAP, seed=None):
+        self.k = k
+        self.rng = np.random.default_rng(seed)
+        self.rows = None
+        self.keys = np.empty(0)
+        self.seen = 0
+
+    def update(self, chunk):
+        self.seen += len(chunk)
+        if self.rows is None:
+            self.rows = chunk.iloc[:0]
+        self._keep(pd.concat([self.rows, chunk], ignore_index=True),
+                   np.concatenate([self.keys, self.rng.random(len(chunk))]))
+
+    def merge(self, other):
+        if other.rows is None:
+            return
+        if self.rows is None:
+            self.rows = other.rows.iloc[:0]
+        self.seen += other.seen
+        self._keep(pd.concat([self.rows, other.rows], ignore_index=True),
+                   np.concatenate([self.keys, other.keys]))
+
+    def _keep(self, rows, keys):
+        if len(keys) > self.k:
+            keep = np.argpartition(keys, self.k)[:self.k]
+            rows, keys = rows.iloc[keep].reset_index(drop=True), keys[keep]
+        self.rows, self.keys = rows, keys
+
+    def result(self, n=None): # строки с наименьшими ключами - тоже равномерная выборка
+        if self.rows is None:
+            return pd.DataFrame()
+        order = np.argsort(self.keys)[:n]
+        return self.rows.iloc[order].reset_index(drop=True)
+
+
+class StratifiedSample: # выборка по группам столбца: каждая группа представлена пропорционально
+    # групп не больше STRATA_MAX (первые встреченные значения), остальные строки - в группу OTHER
+    def __init__(self, by, k=SAMPLE_CAP, seed=None):
+        self.by = by
+        self.k = k
+        self.seed = seed
+        self.strata = {}  # значение -> ReservoirSample
+        self.other = ReservoirSample(k, seed)
+
+    def update(self, chunk):
+        values = chunk[self.by]
+        if len(self.strata) < STRATA_MAX:
+            for value in pd.unique(values):
+                if len(self.strata) >= STRATA_MAX:
+                    break
+                if value not in self.strata:
+                    self.strata[value] = ReservoirSample(self.k, self.seed)
+        known = values.isin(list(self.strata))
+        for value, group in chunk[known].groupby(self.by, dropna=False, sort=False, observed=True):
+            self.strata[value].update(group)
+        if not known.all():
+            self.other.update(chunk[~known])
+
+    def result(self):
+        samples = list(self.strata.values())
+        if self.other.seen:
+            samples.append(self.other)
+        parts = [sample.result(share) for sample, share in zip(samples, self.shares(samples))]
+        if self.other.seen:
+            parts[-1] = parts[-1].astype({self.by: object}).assign(**{self.by: OTHER})
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    def shares(self, samples):
+        # доля группы в выборке как в данных, но хотя бы одна строка (если k хватает); всего не больше k
+        seen = np.array([sample.seen for sample in samples], dtype=float)
+        if not seen.sum():
+            return [0] * len(samples)
+        least = 1 if self.k >= len(samples) else 0
+        exact = (self.k - least * len(samples)) * seen / seen.sum()
+        shares = least + np.floor(exact).astype(int)
+        # остаток раздается группам с наибольшей дробной частью
+        for i in np.argsort(np.floor(exact) - exact)[:self.k - shares.sum()]:
+            shares[i] += 1
+        return shares.tolist()
+
+
+class LinearFit: # регрессия y ~ x по всем строкам через суммы, без бутстрэпа
+    def __init__(self):
+        self.shift = None
+        self.n = 0
+        self.sx = self.sy = self.sxx = self.sxy = self.syy = 0.0
+
+    def update(self, x, y):
+        x = pd.to_numeric(x, errors='coerce').to_numpy(dtype=float)
+        y = pd.to_numeric(y, errors='coerce').to_numpy(dtype=float)
+        both = ~np.isnan(x) & ~np.isnan(y)
+        x, y = x[both], y[both]
+        if not len(x):
+            return
+        if self.shift is None:
+            self.shift = (x.mean(), y.mean())
+        x, y = x - self.shift[0], y - self.shift[1]
+        self.n += len(x)
+        self.sx += x.sum()
+        self.sy += y.sum()
+        self.sxx += (x * x).sum()
+        self.sxy += (x * y).sum()
+        self.syy += (y * y).sum()
+
+    @classmethod
+    def from_sums(cls, shift, sums): # суммы, посчитанные в sql (DatasetHandle.pair_sums) относительно shift
+        fit = cls()
+        fit.n, fit.sx, fit.sy, fit.sxx, fit.sxy, fit.syy = sums
+        fit.shift = tuple(shift) if fit.n else None
+        return fit
+
+    def line(self, x_min, x_max, points=100, z=1.96):
+        # прямая и 95% доверительная полоса для среднего значения
+        if self.n < 3:
+            return None
+        mean_x, mean_y = self.sx / self.n, self.sy / self.n
+        ssx = self.sxx - self.n * mean_x ** 2
+        if ssx <= 0:
+            return None
+        slope = (self.sxy - self.n * mean_x * mean_y) / ssx
+        intercept = mean_y - slope * mean_x
+        ssy = self.syy - self.n * mean_y ** 2
+        residual = max(ssy - slope ** 2 * ssx, 0) / (self.n - 2)
+        xs = np.linspace(x_min, x_max, points)
+        shifted = xs - self.shift[0]
+        ys = intercept + slope * shifted + self.shift[1]
+        band = z * np.sqrt(residual * (1 / self.n + (shifted - mean_x) ** 2 / ssx))
+        return {'x': xs, 'y': ys, 'low': ys - band, 'high': ys + band, 'slope': slope, 'n': self.n}
+
+
+class DensityGrid: # гистограммы по каждому столбцу и двумерные по каждой паре, по всем строкам
+    def __init__(self, columns, ranges, bins=80):
+        self.columns = list(columns)
+        self.edges = {col: np.linspace(low, high if high > low else low + 1, bins + 1)
+                      for col, (low, high) in ranges.items()}
+        self.hist = {col: np.zeros(bins) for col in self.columns}
+        self.hist2d = {(a, b): np.zeros((bins, bins))
+                       for i, a in enumerate(self.columns) for b in self.columns[i + 1:]}
+
+    def update(self, chunk):
+        values = {col: pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=float) for col in self.columns}
+        for col in self.columns:
+            v = values[col]
+            self.hist[col] += np.histogram(v[~np.isnan(v)], bins=self.edges[col])[0]
+        for a, b in self.hist2d:
+            both = ~np.isnan(values[a]) & ~np.isnan(values[b])
+            self.hist2d[(a, b)] += np.histogram2d(values[a][both], values[b][both],
+                                                  bins=[self.edges[a], self.edges[b]])[0]
@@ -0,0 +1,345 @@
+import io
+import os
+import json
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs, unquote
+from ingest import CHUNK_SIZE, pyarrow_available
+from connection import get_manager
+from dataset import DatasetHandle
+from frame_cache import FrameCache, frames
+from perf import span
+import pipeline
+import charts
+
+# локальный сервер для доступа к датасетам из других процессов (ноутбуки, скрипты) без открытия файла БД:
+# список датасетов, описание столбцов, кэшированная статистика, срезы столбцов и картинки графиков
+# запросы обслуживает фиксированный пул потоков, у каждого свое подключение на чтение (см. connection.py),
+# поэтому кэши процесса (прочитанные таблицы, статистика, картинки) общие для всех клиентов
+# большие срезы отдаются потоком (chunked) кусками по CHUNK_SIZE строк: в формате Arrow IPC, если установлен
+# pyarrow, иначе цсв
+#
+#   GET /datasets                                    список датасетов
+#   GET /datasets/<имя>                              столбцы, типы, число строк, версия
+#   GET /datasets/<имя>/stats                        сводка статистики (из кэша или считается)
+#   GET /datasets/<имя>/columns?columns=a,b&offset=0&limit=1000&format=arrow|csv
+#   GET /datasets/<имя>/chart/<тип>?column=&time=&method=&mode=&decimation=&width=&height=   картинка png
+#
+# пример из питона:
+#   import pyarrow as pa, urllib.request
+#   table = pa.ipc.open_stream(urllib.request.urlopen("http://127.0.0.1:8765/datasets/sales_data/columns")).read_all()
+
+HOST = '127.0.0.1'  # только локальные подключения
+PORT = 8765
+CHART_CACHE_MB = 64
+FORMATS = ('arrow', 'csv')
+METHODS = ('pearson', 'spearman')  # допустимые значения параметров графика
+MODES = ('auto', 'sample', 'density')
+DECIMATIONS = ('minmax', 'lttb')
+MAX_CHART_PX = 4000
+
+
+class ChunkedWriter: # тело ответа с Transfer-Encoding: chunked, как файловый объект
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+
+    def write(self, data):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode() + bytes(data) + b"\r\n")
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        if not self.closed:
+            self.wfile.write(b"0\r\n\r\n")
+            self.closed = True
+
+
+class NotFound(Exception):
+    pass
+
+
+def first(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values else default
+
+
+def int_param(query, name, default=None):
+    value = first(query, name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Параметр {name} должен быть целым числом")
+
+
+def choice_param(query, name, choices, default):
+    value = first(query, name, default)
+    if value not in choices:
+        raise ValueError(f"Параметр {name} должен быть одним из: {', '.join(choices)}")
+    return value
+
+
+def column_param(query, name, handle, allowed, kind): # столбец датасета подходящего типа
+    value = first(query, name)
+    if value is None:
+        return None
+    if value not in handle.columns:
+        raise NotFound(f"В датасете нет столбца: {value}")
+    if value not in allowed:
+        raise ValueError(f"Столбец {value}: нужен {kind}")
+    return value
+
+
+class DatasetRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # нужен для chunked и повторного использования соединения
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = parse_qs(url.query)
+        try:
+            with span('request', 'server', path=url.path):
+                self.route(parts, query)
+        except NotFound as e:
+            self.send_json({'error': str(e)}, 404)
+        except ValueError as e:
+            self.send_json({'error': str(e)}, 400)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # клиент ушел, не дочитав ответ
+        except Exception as e:
+            self.send_json({'error': str(e) or type(e).__name__}, 500)
+
+    def route(self, parts, query):
+        if parts == ['datasets']:
+            return self.send_json(self.server.list_datasets())
+        if len(parts) < 2 or parts[0] != 'datasets':
+            raise NotFound(f"Неизвестный адрес: {self.path}")
+        handle = self.server.open(parts[1])
+        if len(parts) == 2:
+            return self.send_json(describe_dataset(handle))
+        if parts[2:] == ['stats']:
+            return self.send_json(self.server.summary(handle))
+        if parts[2:] == ['columns']:
+            return self.send_columns(handle, query)
+        if len(parts) == 4 and parts[2] == 'chart':
+            return self.send_chart(handle, parts[3], query)
+        raise NotFound(f"Неизвестный адрес: {self.path}")
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # срез столбцов потоком: заголовки уходят сразу, куски по мере чтения из БД или колоночных файлов
+    def send_columns(self, handle, query):
+        columns = [col for col in (first(query, 'columns') or '').split(',') if col] or None
+        missing = [col for col in columns or [] if col not in handle.columns]
+        if missing:
+            raise NotFound(f"В датасете нет столбцов: {', '.join(missing)}")
+        offset = int_param(query, 'offset', 0)
+        limit = int_param(query, 'limit')
+        if offset < 0 or (limit is not None and limit < 0):
+            raise ValueError("offset и limit не могут быть отрицательными")
+        fmt = first(query, 'format', 'arrow' if pyarrow_available() else 'csv')
+        if fmt not in FORMATS:
+            raise ValueError(f"Неизвестный формат: {fmt}")
+        if fmt == 'arrow' and not pyarrow_available():
+            raise ValueError("Формат arrow недоступен: pyarrow не установлен")
+
+        chunks = column_chunks(handle, columns, offset, limit)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.apache.arrow.stream' if fmt == 'arrow' else 'text/csv')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        body = ChunkedWriter(self.wfile)
+        try:
+            with span('stream', 'server', dataset=handle.name, format=fmt) as info:
+                info['rows'] = write_arrow(body, chunks) if fmt == 'arrow' else write_csv(body, chunks)
+        except Exception:
+            # заголовки уже отправлены: ответ обрывается без завершающего куска, клиент увидит ошибку
+            self.close_connection = True
+            if self.server.verbose:
+                raise
+            return
+        body.close()
+
+    def send_chart(self, handle, kind, query):
+        if kind not in charts.CHART_KINDS:
+            raise NotFound(f"Неизвестный тип графика: {kind}")
+        # неизвестный столбец - 404, неподходящие значения параметров - 400 (а не ошибка при отрисовке)
+        width, height = int_param(query, 'width', 1000), int_param(query, 'height', 800)
+        if not (0 < width <= MAX_CHART_PX and 0 < height <= MAX_CHART_PX):
+            raise ValueError(f"width и height должны быть от 1 до {MAX_CHART_PX}")
+        options = {'column': column_param(query, 'column', handle, handle.numeric_columns, "числовой столбец"),
+                   'time_column': column_param(query, 'time', handle, handle.time_columns, "столбец дат"),
+                   'method': choice_param(query, 'method', METHODS, 'pearson'),
+                   'mode': choice_param(query, 'mode', MODES, 'auto'),
+                   'decimation': choice_param(query, 'decimation', DECIMATIONS, 'minmax'),
+                   'figsize': (width / 100, height / 100)}
+        body = self.server.chart(handle, kind, options)
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self): # у unix-сокета нет адреса клиента
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def describe_dataset(handle):
+    return {'name': handle.name, 'rows': handle.row_count, 'version': handle.version,
+            'columns': [{'name': col, 'sql_type': handle.sql_types[col], 'dtype': (handle.schema or {}).get(col)}
+                        for col in handle.columns],
+            'numeric_columns': handle.numeric_columns, 'time_columns': handle.time_columns,
+            'storage': 'columnar' if handle.manifest else 'sqlite'}
+
+
+# куски среза: из таблицы, уже прочитанной в кэш процесса, иначе весь датасет - одним проходом (iter_chunks),
+# диапазон строк - чтением страниц по rowid; небольшие датасеты целиком читаются в кэш для следующих клиентов
+def column_chunks(handle, columns, offset, limit):
+    end = handle.row_count if limit is None else min(offset + limit, handle.row_count)
+    df = frames.get(handle.cache_key(columns, True))
+    if df is None and not offset and limit is None and fits_cache(handle, columns):
+        df = handle.read(columns=columns, raw=True)
+    if df is not None:
+        for start in range(offset, end, CHUNK_SIZE):
+            yield df.iloc[start:min(start + CHUNK_SIZE, end)]
+        return
+    if not offset and limit is None:
+        yield from handle.iter_chunks(columns=columns, raw=True)
+        return
+    for start in range(offset, end, CHUNK_SIZE):
+        yield handle.read(columns=columns, offset=start, limit=min(CHUNK_SIZE, end - start), raw=True)
+
+
+def fits_cache(handle, columns): # грубая оценка: по 16 байт на значение, не больше четверти кэша
+    return handle.row_count * len(columns or handle.columns) * 16 <= frames.stats()['budget_mb'] * 1024 * 1024 / 4
+
+
+def write_arrow(body, chunks): # Arrow IPC stream: схема по первому куску, дальше куски приводятся к ней
+    import pyarrow as pa
+    writer = None
+    rows = 0
+    for chunk in chunks:
+        if writer is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            # столбец из одних NULL в первом куске - текстовый
+            schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                                for field in schema]).remove_metadata()
+            writer = pa.ipc.new_stream(body, schema)
+        writer.write_batch(pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+        rows += len(chunk)
+    if writer is not None:
+        writer.close()
+    return rows
+
+
+def write_csv(body, chunks):
+    rows = 0
+    for chunk in chunks:
+        body.write(chunk.to_csv(index=False, header=not rows, lineterminator='\n').encode('utf-8'))
+        rows += len(chunk)
+    return rows
+
+
+class PooledServerMixIn(ThreadingMixIn): # запросы выполняются в фиксированном пуле потоков, а не в новом потоке
+    def setup_pool(self, db_path, workers, verbose):
+        self.db_path = db_path
+        self.verbose = verbose
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='server')
+        # готовые png по ключу (датасет, версия, параметры)
+        self.charts = FrameCache(CHART_CACHE_MB, size=len, copy=None)
+        self.chart_lock = threading.Lock()  # отрисовка matplotlib по одной
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+    def list_datasets(self):
+        rows = get_manager(self.db_path).reader().execute('''
+            SELECT name, description, row_count, column_count, storage, version FROM datasets ORDER BY created_at DESC
+        ''').fetchall()
+        return [dict(zip(('name', 'description', 'rows', 'columns', 'storage', 'version'), row)) for row in rows]
+
+    def open(self, name):
+        try:
+            return DatasetHandle(self.db_path, name)
+        except ValueError:
+            raise NotFound(f"Датасет '{name}' не найден")
+
+    def summary(self, handle): # та же сводка, что во вкладке статистики
+        return pipeline.cached_summary(handle)
+
+    def chart(self, handle, kind, options):
+        key = (handle.name, handle.version, kind) + tuple(sorted(options.items()))
+        data = self.charts.get(key)
+        if data is None:
+            out = io.BytesIO()
+            with self.chart_lock:
+                charts.render_chart(self.db_path, handle.name, kind, out, **options)
+            data = out.getvalue()
+            self.charts.put(key, data)
+        return data
+
+
+class DatasetServer(PooledServerMixIn, HTTPServer):
+    def __init__(self, db_path, host=HOST, port=PORT, workers=None, verbose=False):
+        super().__init__((host, port), DatasetRequestHandler)
+        self.setup_pool(db_path, workers or os.cpu_count() or 1, verbose)
+
+
+class UnixDatasetServer(PooledServerMixIn, UnixStreamServer):
+    def __init__(self, db_path, path, workers=None, verbose=False):
+        if os.path.lexists(path):
+            if not stat.S_ISSOCK(os.lstat(path).st_mode):
+                raise FileExistsError(f"Путь {path} занят и не является сокетом")
+            os.remove(path)  # сокет от прошлого запуска
+        super().__init__(path, DatasetRequestHandler)
+        self.socket_inode = os.lstat(path).st_ino
+        self.setup_pool(db_path, workers or os.cpu_count() or 1, verbose)
+
+    # удаляется только свой сокет: если путь уже занят другим файлом, он не трогается
+    def server_close(self):
+        super().server_close()
+        path = self.server_address
+        try:
+            info = os.lstat(path)
+        except OSError:
+            return
+        if stat.S_ISSOCK(info.st_mode) and info.st_ino == self.socket_inode:
+            os.remove(path)
+
+
+# запуск до Ctrl+C; unix_socket - путь к сокету вместо порта
+def serve(db_path, host=HOST, port=PORT, unix_socket=None, workers=None, verbose=False):
+    if unix_socket:
+        server = UnixDatasetServer(db_path, unix_socket, workers, verbose)
+        print(f"Сервер датасетов: unix-сокет {unix_socket}")
+    else:
+        server = DatasetServer(db_path, host, port, workers, verbose)
+        print(f"Сервер датасетов: http://{host}:{server.server_address[1]}/datasets")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,41 @@
+import json
+
+# кэш статистики датасетов в таблице dataset_stats рядом с каталогом datasets
+# запись действительна, пока совпадает версия содержимого датасета
+
+
+def dataset_version(conn, dataset_name):
+    row = conn.execute("SELECT version FROM datasets WHERE name = ?", (dataset_name,)).fetchone()
+    return row[0] if row else None
+
+
+def get_cached(conn, dataset_name, kind): # None, если нет записи или датасет изменился
+    row = conn.execute('''
+        SELECT s.payload FROM dataset_stats s
+        JOIN datasets d ON d.name = s.dataset AND d.version = s.version
+        WHERE s.dataset = ? AND s.kind = ?
+    ''', (dataset_name, kind)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def put_cached(conn, dataset_name, kind, payload):
+    version = dataset_version(conn, dataset_name)
+    if version is None:
+        return
+    conn.execute('''
+        INSERT OR REPLACE INTO dataset_stats (dataset, kind, version, payload)
+        VALUES (?, ?, ?, ?)
+    ''', (dataset_name, kind, version, json.dumps(payload)))
+    conn.commit()
+
+
+def invalidate(conn, dataset_name, kinds=None): # удаление кэша датасета (или только части)
+    if kinds is None:
+        conn.execute("DELETE FROM dataset_stats WHERE dataset = ?", (dataset_name,))
+    else:
+        conn.executemany("DELETE FROM dataset_stats WHERE dataset = ? AND kind = ?",
+                         [(dataset_name, kind) for kind in kinds])
+
+
+def bump_version(conn, dataset_name): # содержимое изменилось - все записи кэша устаревают
+    conn.execute("UPDATE datasets SET version = version + 1 WHERE name = ?", (dataset_name,))
@@ -0,0 +1,403 @@
+import base64
+import numpy as np
+import pandas as pd
+
+# статистика датасета за один проход по кускам (из sqlite или цсв) без загрузки всей таблицы
+# все накопители можно объединять (merge), поэтому куски можно считать в разных процессах
+
+PERCENTILES = (0.25, 0.5, 0.75)
+HLL_PRECISION = 12  # 2**12 регистров (4 KB на столбец), ошибка числа различных значений ~1.6%
+TOP_CAPACITY = 100  # счетчиков частых значений на столбец
+TOP_SHOWN = 5  # частых значений во вкладке статистики
+
+
+def pack(values, dtype=float): # массив numpy -> строка для json (состояние накопителей в кэше)
+    return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+
+def unpack(text, dtype=float):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).copy()
+
+
+class QuantileSketch: # объединяемый эскиз квантилей с ограниченной памятью
+    def __init__(self, k=4096, seed=None):
+        self.k = k  # сколько значений держим на каждом уровне
+        self.levels = [np.empty(0)]  # значения уровня i имеют вес 2**i
+        self.count = 0
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, values in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], values])
+        self.count += other.count
+        self._compress()
+
+    # переполненный уровень сортируется и каждое второе значение уходит уровнем выше
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            values = self.levels[level]
+            if len(values) > self.k:
+                values = np.sort(values)
+                keep = np.empty(0)
+                if len(values) % 2:
+                    keep_index = self.rng.integers(len(values))
+                    keep = values[keep_index:keep_index + 1]
+                    values = np.delete(values, keep_index)
+                promoted = values[self.rng.integers(2)::2]
+                self.levels[level] = keep
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def to_state(self):
+        return {'k': self.k, 'count': self.count, 'levels': [pack(values) for values in self.levels]}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state['k'])
+        sketch.count = state['count']
+        sketch.levels = [unpack(values) for values in state['levels']]
+        return sketch
+
+    @property
+    def exact(self): # пока ничего не сжималось, квантили точные
+        return len(self.levels) == 1
+
+    def quantiles(self, qs):
+        if not self.count:
+            return [np.nan] * len(qs)
+        if self.exact:
+            # та же линейная интерполяция, что и в pandas describe
+            return [float(v) for v in np.percentile(self.levels[0], [q * 100 for q in qs])]
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(v), 2.0 ** level) for level, v in enumerate(self.levels)])
+        order = np.argsort(values)
+        values = values[order]
+        cumulative = np.cumsum(weights[order])
+        result = []
+        for q in qs:
+            index = np.searchsorted(cumulative, q * cumulative[-1], side='left')
+            result.append(float(values[min(index, len(values) - 1)]))
+        return result
+
+
+class ColumnMoments: # count/mean/std/min/max по формулам Уэлфорда и Чана
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        other = ColumnMoments()
+        other.count = len(values)
+        other.mean = float(values.mean())
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other):
+        if not other.count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def to_state(self):
+        return [self.count, self.mean, self.m2, self.min, self.max]
+
+    @classmethod
+    def from_state(cls, state):
+        moments = cls()
+        moments.count, moments.mean, moments.m2, moments.min, moments.max = state
+        return moments
+
+    @property
+    def std(self): # ddof=1, как в pandas
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+def text_hashes(values): # 64-битные хэши строковых значений (одинаковые между запусками и процессами)
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def bit_length(values): # число значащих бит uint64 (через frexp, точно для 32-битных половин)
+    high = (values >> np.uint64(32)).astype(np.uint32)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    high_bits = np.frexp(high.astype(float))[1]
+    low_bits = np.frexp(low.astype(float))[1]
+    return np.where(high > 0, high_bits + 32, low_bits)
+
+
+class HyperLogLog: # приближенное число различных значений в памяти 2**precision байт
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def update(self, hashes):
+        if not len(hashes):
+            return
+        rest_bits = 64 - self.precision
+        index = (hashes >> np.uint64(rest_bits)).astype(np.intp)
+        rest = hashes & np.uint64((1 << rest_bits) - 1)
+        # позиция первой единицы в оставшихся битах
+        rank = (rest_bits - bit_length(rest) + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def to_state(self):
+        return {'precision': self.precision, 'registers': pack(self.registers, np.uint8)}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state['precision'])
+        sketch.registers = unpack(state['registers'], np.uint8)
+        return sketch
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(float))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:  # мало значений: линейный подсчет по пустым регистрам
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+# частые значения по алгоритму Space-Saving с объединением сводок:
+# count - оценка сверху, count - error - оценка снизу; значения без счетчика встречались не больше floor раз
+class SpaceSaving:
+    def __init__(self, capacity=TOP_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    def update(self, counts): # точные частоты куска (value_counts), обрезанные до capacity, объединяются со сводкой
+        if not len(counts):
+            return
+        other = SpaceSaving(self.capacity)
+        other.total = int(counts.sum())
+        if len(counts) > self.capacity:
+            other.floor = int(counts.iloc[self.capacity])
+            counts = counts.iloc[:self.capacity]
+        other.counts = {str(value): int(count) for value, count in counts.items()}
+        other.errors = dict.fromkeys(other.counts, 0)
+        self.merge(other)
+
+    def merge(self, other):
+        counts = {}
+        errors = {}
+        for value in set(self.counts) | set(other.counts):
+            counts[value] = self.counts.get(value, self.floor) + other.counts.get(value, other.floor)
+            errors[value] = self.errors.get(value, self.floor) + other.errors.get(value, other.floor)
+        self.floor += other.floor
+        self.total += other.total
+        if len(counts) > self.capacity:
+            ranked = sorted(counts, key=counts.get, reverse=True)
+            self.floor = max(self.floor, counts[ranked[self.capacity]])
+            counts = {value: counts[value] for value in ranked[:self.capacity]}
+        self.counts = counts
+        self.errors = {value: errors[value] for value in counts}
+
+    def to_state(self):
+        return {'capacity': self.capacity, 'floor': self.floor, 'total': self.total,
+                'counts': [[value, count, self.errors[value]] for value, count in self.counts.items()]}
+
+    @classmethod
+    def from_state(cls, state):
+        sketch = cls(state['capacity'])
+        sketch.floor, sketch.total = state['floor'], state['total']
+        sketch.counts = {value: count for value, count, error in state['counts']}
+        sketch.errors = {value: error for value, count, error in state['counts']}
+        return sketch
+
+    @property
+    def exact(self): # ни одно значение не вытеснялось: частоты и число значений точные
+        return self.floor == 0
+
+    def top(self, n):
+        ranked = sorted(self.counts, key=lambda value: (-self.counts[value], value))[:n]
+        return [[value, self.counts[value], self.errors[value]] for value in ranked]
+
+
+class StreamingDescriber: # аналог сводки по DataFrame (describe, пропуски, типы, память)
+    def __init__(self, numeric_columns=None, k=4096):
+        self.numeric_columns = list(numeric_columns) if numeric_columns is not None else None
+        self.k = k
+        self.rows = 0
+        self.memory_bytes = 0
+        self.dtypes = {}
+        self.missing = {}
+        self.moments = {}
+        self.sketches = {}
+        self.distinct = {}  # текстовые столбцы: HyperLogLog
+        self.frequent = {}  # текстовые столбцы: Space-Saving
+
+    def _numeric(self, chunk):
+        if self.numeric_columns is not None:
+            return [col for col in self.numeric_columns if col in chunk.columns]
+        # bool тоже числовой: в sqlite он хранится как INTEGER
+        return chunk.select_dtypes(include=[np.number, 'bool']).columns.tolist()
+
+    def update(self, chunk):
+        if self.numeric_columns is None:
+            self.numeric_columns = self._numeric(chunk)
+        self.rows += len(chunk)
+        self.memory_bytes += int(chunk.memory_usage(deep=True).sum())
+
+        nulls = chunk.isnull().sum()
+        for col, dtype in chunk.dtypes.items():
+            null_count = int(nulls[col])
+            col = str(col)
+            self.missing[col] = self.missing.get(col, 0) + null_count
+            # кусок из одних NULL ничего не говорит о типе столбца
+            all_null = null_count == len(chunk)
+            if not all_null or col not in self.dtypes:
+                self.dtypes[col] = self._merge_dtype(self.dtypes.get(col), dtype, all_null)
+
+        for col in self._numeric(chunk):
+            values = pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+            self.moments.setdefault(col, ColumnMoments()).update(values)
+            self.sketches.setdefault(col, QuantileSketch(self.k)).update(values)
+
+        # нечисловые столбцы: число различных и частые значения без value_counts по всей таблице
+        numeric = set(self.numeric_columns)
+        for col in chunk.columns:
+            if str(col) in numeric:
+                continue
+            # хэшируются только различные значения куска
+            counts = chunk[col].dropna().astype(str).value_counts()
+            self.distinct.setdefault(str(col), HyperLogLog()).update(text_hashes(counts.index))
+            self.frequent.setdefault(str(col), SpaceSaving()).update(counts)
+
+    def merge(self, other):
+        if self.numeric_columns is None:
+            self.numeric_columns = other.numeric_columns
+        self.rows += other.rows
+        self.memory_bytes += other.memory_bytes
+        for col, dtype in other.dtypes.items():
+            self.dtypes[col] = self._merge_dtype(self.dtypes.get(col), dtype, False)
+        for col, count in other.missing.items():
+            self.missing[col] = self.missing.get(col, 0) + count
+        for col, moments in other.moments.items():
+            self.moments.setdefault(col, ColumnMoments()).merge(moments)
+        for col, sketch in other.sketches.items():
+            self.sketches.setdefault(col, QuantileSketch(self.k)).merge(sketch)
+        for col, sketch in other.distinct.items():
+            self.distinct.setdefault(col, HyperLogLog()).merge(sketch)
+        for col, sketch in other.frequent.items():
+            self.frequent.setdefault(col, SpaceSaving()).merge(sketch)
+
+    # состояние для кэша: при дописывании строк новые куски объединяются с ним без чтения таблицы
+    def to_state(self):
+        return {
+            'numeric_columns': self.numeric_columns,
+            'k': self.k,
+            'rows': self.rows,
+            'memory_bytes': self.memory_bytes,
+            'dtypes': {col: str(dtype) for col, dtype in self.dtypes.items()},
+            'missing': self.missing,
+            'moments': {col: moments.to_state() for col, moments in self.moments.items()},
+            'sketches': {col: sketch.to_state() for col, sketch in self.sketches.items()},
+            'distinct': {col: sketch.to_state() for col, sketch in self.distinct.items()},
+            'frequent': {col: sketch.to_state() for col, sketch in self.frequent.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        describer = cls(state['numeric_columns'], state['k'])
+        describer.rows = state['rows']
+        describer.memory_bytes = state['memory_bytes']
+        describer.dtypes = {col: pd.api.types.pandas_dtype(dtype) for col, dtype in state['dtypes'].items()}
+        describer.missing = dict(state['missing'])
+        describer.moments = {col: ColumnMoments.from_state(v) for col, v in state['moments'].items()}
+        describer.sketches = {col: QuantileSketch.from_state(v) for col, v in state['sketches'].items()}
+        describer.distinct = {col: HyperLogLog.from_state(v) for col, v in state['distinct'].items()}
+        describer.frequent = {col: SpaceSaving.from_state(v) for col, v in state['frequent'].items()}
+        return describer
+
+    @staticmethod
+    def _merge_dtype(current, dtype, all_null):
+        if current is None or current == dtype:
+            return dtype
+        if all_null:
+            return current
+        try:
+            return np.result_type(current, dtype)
+        except TypeError:
+            return np.dtype(object)
+
+    # таблица как у DataFrame.describe() для числовых столбцов
+    def describe(self):
+        columns = [col for col in self.numeric_columns or [] if col in self.moments]
+        index = ['count', 'mean', 'std', 'min'] + [f"{q * 100:g}%" for q in PERCENTILES] + ['max']
+        data = {}
+        for col in columns:
+            moments = self.moments[col]
+            quantiles = self.sketches[col].quantiles(PERCENTILES)
+            if moments.count:
+                # приближенные квантили не выходят за точные границы
+                quantiles = [min(max(q, moments.min), moments.max) for q in quantiles]
+            mean = moments.mean if moments.count else np.nan
+            data[col] = [float(moments.count), mean, moments.std, moments.min] + quantiles + [moments.max]
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    # число различных и частые значения текстовых столбцов; пока значений меньше числа счетчиков,
+    # все они помещаются в Space-Saving и подсчет точный
+    def categorical(self):
+        result = {}
+        for col, frequent in self.frequent.items():
+            distinct = len(frequent.counts)
+            if not frequent.exact:
+                distinct = max(self.distinct[col].estimate(), distinct)
+            result[col] = {
+                'count': int(frequent.total),
+                'distinct': distinct,
+                'exact': frequent.exact,
+                'top': frequent.top(TOP_SHOWN),
+            }
+        return result
+
+    def summary(self): # тот же словарь, что сохраняется в кэш статистики
+        describe = self.describe()
+        return {
+            'rows': int(self.rows),
+            'columns': len(self.dtypes),
+            'memory_bytes': int(self.memory_bytes),
+            'dtypes': {col: str(dtype) for col, dtype in self.dtypes.items()},
+            'describe': describe.to_dict(orient='split') if len(describe.columns) else None,
+            'missing': {col: int(count) for col, count in self.missing.items() if count > 0},
+            'categorical': self.categorical(),
+        }
@@ -0,0 +1,90 @@
+import sys
+from PyQt5.QtCore import Qt, QAbstractTableModel
+from frame_cache import FrameCache
+
+# модель таблицы предпросмотра поверх страниц из sqlite:
+# читаются и форматируются только строки, которые видит пользователь
+
+PAGE_SIZE = 200  # строк в странице
+PAGES_MB = 16  # сколько памяти под прочитанные страницы
+
+
+def page_bytes(page): # массивы object: ссылки и сами значения
+    return sum(column.nbytes + sum(sys.getsizeof(value) for value in column) for column in page)
+
+
+class DatasetTableModel(QAbstractTableModel):
+    def __init__(self, handle=None, parent=None):
+        super().__init__(parent)
+        self.handle = handle
+        self.pages = FrameCache(PAGES_MB, size=page_bytes, copy=None)  # номер страницы -> массивы по столбцам
+        # rowid первой и последней строки прочитанных страниц: если в rowid есть пропуски,
+        # соседние страницы читаются от них, а не через OFFSET от начала таблицы
+        self.first_rowids = {}
+        self.last_rowids = {}
+
+    def set_handle(self, handle): # смена датасета
+        self.beginResetModel()
+        self.handle = handle
+        self.pages.clear()
+        self.first_rowids.clear()
+        self.last_rowids.clear()
+        self.endResetModel()
+
+    def rowCount(self, parent=None):
+        if self.handle is None or (parent is not None and parent.isValid()):
+            return 0
+        return self.handle.row_count
+
+    def columnCount(self, parent=None):
+        if self.handle is None or (parent is not None and parent.isValid()):
+            return 0
+        return len(self.handle.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        page_number, row = divmod(index.row(), PAGE_SIZE)
+        page = self.page(page_number)
+        column = page[index.column()]
+        if row >= len(column):
+            return None
+        return str(column[row])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or self.handle is None:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.handle.columns[section]
+        return str(section + 1)
+
+    # страница строк из кэша или из БД; старые страницы вытесняются
+    def page(self, page_number):
+        page = self.pages.get(page_number)
+        if page is not None:
+            return page
+
+        if self.handle.dense_rowid:
+            df = self.handle.read(offset=page_number * PAGE_SIZE, limit=PAGE_SIZE)
+        else:
+            df = self.read_keyset(page_number)
+        # object: даты и категории показываются как значения, а не как коды numpy
+        page = [df.iloc[:, i].astype(object).to_numpy() for i in range(df.shape[1])]
+        self.pages.put(page_number, page)
+        return page
+
+    def read_keyset(self, page_number):
+        if page_number - 1 in self.last_rowids:
+            df, first, last = self.handle.read_keyset(PAGE_SIZE, after_rowid=self.last_rowids[page_number - 1])
+        elif page_number + 1 in self.first_rowids:
+            df, first, last = self.handle.read_keyset(PAGE_SIZE, before_rowid=self.first_rowids[page_number + 1])
+        else:
+            # переход через несколько страниц: пропускаются строки только от ближайшей прочитанной страницы
+            known = [number for number in self.last_rowids if number < page_number]
+            start = max(known) if known else -1
+            df, first, last = self.handle.read_keyset(
+                PAGE_SIZE, after_rowid=self.last_rowids.get(start), skip=(page_number - start - 1) * PAGE_SIZE)
+        if first is not None:
+            self.first_rowids[page_number] = first
+            self.last_rowids[page_number] = last
+        return df
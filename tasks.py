@@ -0,0 +1,143 @@
+import threading
+from collections import deque
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+# фоновое выполнение тяжелых операций (pandas, sqlite) вне потока интерфейса
+# задачи одного датасета выполняются по очереди, разных датасетов - параллельно
+
+
+# ключ задач записи датасета (загрузка, дописывание, удаление): отдельный от ключа чтения,
+# иначе смена датасета (replace=True по имени) отменяет запись
+def write_key(name):
+    return ('write', name)
+
+
+class TaskCancelled(Exception): # задача остановлена пользователем
+    pass
+
+
+class TaskSignals(QObject): # сигналы задачи, приходят в поток интерфейса
+    progress = pyqtSignal(object, object)  # (сделано, всего или None)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+    cancelled = pyqtSignal()
+    done = pyqtSignal()
+
+
+class Task(QRunnable): # одна фоновая задача
+    def __init__(self, key, fn, args, kwargs, description=""):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.description = description
+        self.signals = TaskSignals()
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self): # вызывается из тела задачи между кусками работы
+        if self._cancel_event.is_set():
+            raise TaskCancelled()
+
+    def report(self, done, total=None): # прогресс + точка отмены
+        self.check_cancelled()
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            self.check_cancelled()
+            result = self.fn(*self.args, task=self, **self.kwargs)
+            self.check_cancelled()
+        except TaskCancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)
+        finally:
+            self.signals.done.emit()
+
+
+class TaskManager(QObject): # пул потоков с очередью задач на каждый датасет
+    task_started = pyqtSignal(object)
+    task_progress = pyqtSignal(object, object, object)  # (задача, сделано, всего)
+    task_done = pyqtSignal(object)
+    idle = pyqtSignal()
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        # потоки не завершаются по простою: у каждого свое подключение к БД на чтение (connection.py)
+        self.pool.setExpiryTimeout(-1)
+        if max_threads:
+            self.pool.setMaxThreadCount(max_threads)
+        self.running = {}  # ключ -> выполняющаяся задача
+        self.queues = {}  # ключ -> очередь ожидающих задач
+
+    # постановка задачи в очередь; replace=True отменяет все прежние задачи этого ключа
+    def submit(self, key, fn, *args, on_result=None, on_error=None, on_cancel=None,
+               description="", replace=False, **kwargs):
+        if replace:
+            self.cancel(key)
+
+        task = Task(key, fn, args, kwargs, description)
+        task.on_result = on_result
+        task.on_error = on_error
+        task.on_cancel = on_cancel
+        task.signals.progress.connect(lambda done, total: self.task_progress.emit(task, done, total))
+        task.signals.finished.connect(lambda result: self._call(task.on_result, result))
+        task.signals.failed.connect(lambda error: self._call(task.on_error, error))
+        task.signals.cancelled.connect(lambda: self._call(task.on_cancel))
+        task.signals.done.connect(lambda: self._on_done(task))
+
+        if key in self.running:
+            self.queues.setdefault(key, deque()).append(task)
+        else:
+            self._start(task)
+        return task
+
+    def cancel(self, key=None): # отмена задач ключа (или всех задач)
+        keys = list(set(self.running) | set(self.queues)) if key is None else [key]
+        for k in keys:
+            for task in self.queues.pop(k, ()):
+                task.cancel()
+                self._call(task.on_cancel)
+            if k in self.running:
+                self.running[k].cancel()
+
+    def is_busy(self):
+        return bool(self.running)
+
+    def shutdown(self, timeout_ms=5000): # при закрытии приложения
+        self.cancel()
+        self.pool.waitForDone(timeout_ms)
+
+    def _start(self, task):
+        self.running[task.key] = task
+        self.task_started.emit(task)
+        self.pool.start(task)
+
+    def _on_done(self, task):
+        if self.running.get(task.key) is task:
+            del self.running[task.key]
+        self.task_done.emit(task)
+
+        queue = self.queues.get(task.key)
+        if queue:
+            self._start(queue.popleft())
+            if not queue:
+                del self.queues[task.key]
+        elif not self.running:
+            self.idle.emit()
+
+    @staticmethod
+    def _call(callback, *args):
+        if callback is not None:
+            callback(*args)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import bulk_import
+import pipeline
+from connection import get_manager
+from dataset import DatasetHandle
+from ingest import CHUNK_SIZE
+
+
+def write_csv(path, start, n):
+    pd.DataFrame({'id': np.arange(start, start + n), 'value': np.arange(start, start + n) * 0.5}).to_csv(
+        path, index=False)
+
+
+def write_broken_csv(path, n): # лишнее поле в строке после первого куска: ошибка посреди записи файла
+    write_csv(path, 0, n)
+    with open(path, 'a') as f:
+        f.write("1,2,3\n")
+
+
+def tables(db_path):
+    rows = get_manager(db_path).reader().execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+    return {row[0] for row in rows}
+
+
+def catalog(db_path):
+    return dict(get_manager(db_path).reader().execute("SELECT name, row_count FROM datasets").fetchall())
+
+
+# два файла в один датасет: первый создает его, второй дописывается; файлы по отдельности - в свои датасеты
+def test_two_files(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    write_csv(tmp_path / 'a.csv', 0, 3000)
+    write_csv(tmp_path / 'b.csv', 3000, 2000)
+
+    results = bulk_import.bulk_import(db_path, str(tmp_path), 'all', workers=2)
+    assert [(r['dataset'], r['rows'], r['error']) for r in results] == [('all', 3000, None), ('all', 2000, None)]
+    table = DatasetHandle(db_path, 'all').read()
+    assert len(table) == DatasetHandle(db_path, 'all').row_count == 5000
+    assert table['id'].tolist() == list(range(5000))
+
+    results = bulk_import.bulk_import(db_path, str(tmp_path / '*.csv'), per_file=True, workers=2)
+    assert [(r['dataset'], r['rows']) for r in results] == [('a', 3000), ('b', 2000)]
+    assert catalog(db_path) == {'all': 5000, 'a': 3000, 'b': 2000}
+
+
+# ошибка в файле: он попадает в отчет с ошибкой, а его строки не остаются ни в общем датасете,
+# ни отдельной таблицей; остальные файлы загружаются
+def test_failed_file_leaves_no_rows(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    write_csv(tmp_path / 'a.csv', 0, 1000)
+    write_broken_csv(tmp_path / 'b.csv', CHUNK_SIZE + 100)
+    write_csv(tmp_path / 'c.csv', 1000, 500)
+
+    results = bulk_import.bulk_import(db_path, str(tmp_path), 'all', workers=2)
+    assert [r['error'] is None for r in results] == [True, False, True]
+    assert results[1]['rows'] == 0 and results[1]['mb_s'] is None
+    assert 'ошибка' in bulk_import.format_file(results[1])
+    assert catalog(db_path) == {'all': 1500}
+    assert len(DatasetHandle(db_path, 'all').read()) == 1500
+
+    results = bulk_import.bulk_import(db_path, [str(tmp_path / 'b.csv')], per_file=True)
+    assert results[0]['error'] is not None
+    assert 'b' not in catalog(db_path) and 'b' not in tables(db_path)
+    assert bulk_import.format_total(results).startswith("Загружено файлов: 0 из 1")
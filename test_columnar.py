@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import columnar
+import pipeline
+from dataset import DatasetHandle
+
+
+def sample_frame(start, n):
+    rng = np.random.default_rng(start)
+    df = pd.DataFrame({'id': np.arange(start, start + n), 'value': rng.normal(size=n),
+                       'count': rng.integers(0, 100, n).astype(float), 'name': rng.choice(list('xyz'), n)})
+    df.loc[rng.random(n) < 0.1, 'count'] = np.nan
+    return df
+
+
+# запись кусками и чтение через memmap: float64, те же значения и пропуски; дописывание продолжает файлы
+def test_writer_round_trip(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    df = sample_frame(0, 1000)
+    writer = columnar.ColumnarWriter(db_path, 'data', ['id', 'count'])
+    writer.write(df.iloc[:600])
+    writer.write(df.iloc[600:])
+    manifest = writer.close()
+    assert manifest['rows'] == 1000 and manifest['dtype'] == 'float64'
+
+    for col in ('id', 'count'):
+        values = columnar.open_column(db_path, 'data', manifest, col)
+        assert isinstance(values, np.memmap) and values.dtype == np.float64
+        assert not values.flags.writeable
+        np.testing.assert_array_equal(values, df[col].to_numpy(dtype=float))
+
+    more = sample_frame(1000, 300)
+    writer = columnar.ColumnarWriter(db_path, 'data', ['id', 'count'], manifest)
+    writer.write(more)
+    manifest = writer.close()
+    both = pd.concat([df, more])
+    np.testing.assert_array_equal(columnar.open_column(db_path, 'data', manifest, 'count'),
+                                  both['count'].to_numpy(dtype=float))
+
+
+# прерванное дописывание не меняет манифест, а хвост файлов отбрасывается при следующем
+def test_aborted_append(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    writer = columnar.ColumnarWriter(db_path, 'data', ['id'])
+    writer.write(sample_frame(0, 100))
+    manifest = writer.close()
+    writer = columnar.ColumnarWriter(db_path, 'data', ['id'], manifest)
+    writer.write(sample_frame(100, 50))
+    writer.abort()
+    assert len(columnar.open_column(db_path, 'data', manifest, 'id')) == 100
+    writer = columnar.ColumnarWriter(db_path, 'data', ['id'], manifest)
+    writer.write(sample_frame(500, 10))
+    manifest = writer.close()
+    np.testing.assert_array_equal(columnar.open_column(db_path, 'data', manifest, 'id'),
+                                  np.r_[np.arange(100), np.arange(500, 510)].astype(float))
+
+
+# имена датасетов не выходят за пределы папки хранилища и не совпадают у похожих имен
+def test_dataset_dirs(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    root = columnar.storage_root(db_path)
+    for name in ('..', '.', '../x', 'a/b'):
+        assert os.path.dirname(columnar.dataset_dir(db_path, name)) == root
+    assert columnar.dataset_dir(db_path, 'a b') != columnar.dataset_dir(db_path, 'a_b')
+    with pytest.raises(ValueError):
+        columnar.remove_tree(db_path, root)
+
+
+# датасет с колоночным хранением: числовые столбцы читаются из файлов, после дописывания - тоже
+def test_columnar_dataset(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    df = sample_frame(0, 2000)
+    pipeline.ingest_frames(db_path, [df.iloc[:1500], df.iloc[1500:]], 'data', storage='columnar')
+    handle = DatasetHandle(db_path, 'data')
+    assert handle.is_columnar(['id', 'value', 'count']) and not handle.is_columnar(['name'])
+    np.testing.assert_array_equal(handle.column_array('value'), df['value'].to_numpy())
+    part = handle.read(columns=['value', 'count'], offset=100, limit=50)
+    np.testing.assert_array_equal(part.to_numpy(), df[['value', 'count']].iloc[100:150].to_numpy())
+    assert list(part.index) == list(range(100, 150))
+
+    more = sample_frame(2000, 500)
+    pipeline.append_frames(db_path, [more], 'data')
+    handle = DatasetHandle(db_path, 'data')
+    assert handle.is_columnar(['id']) and handle.manifest['rows'] == 2500
+    np.testing.assert_array_equal(handle.column_array('id'), np.arange(2500, dtype=float))
+
+    pipeline.delete_dataset(db_path, 'data')
+    assert not os.path.exists(columnar.dataset_dir(db_path, 'data'))
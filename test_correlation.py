@@ -0,0 +1,58 @@
+import json
+import numpy as np
+import pandas as pd
+from correlation import CorrelationAccumulator, spearman
+
+
+def frame_with_gaps(seed, n=5000):
+    rng = np.random.default_rng(seed)
+    x = rng.normal(size=n)
+    df = pd.DataFrame({'a': x + 1e4, 'b': 2 * x + rng.normal(size=n), 'c': rng.exponential(size=n),
+                       'd': np.where(rng.random(n) < 0.5, x, np.nan)})
+    for col in ('a', 'b', 'c'):
+        df.loc[rng.random(n) < 0.1, col] = np.nan
+    return df
+
+
+def split(df, parts):
+    bounds = np.linspace(0, len(df), parts + 1).astype(int)
+    return [df.iloc[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+# пирсон по кускам с пропусками совпадает с DataFrame.corr()
+def test_pearson_matches_pandas_with_gaps():
+    df = frame_with_gaps(0)
+    acc = CorrelationAccumulator(df.columns)
+    for start in range(0, len(df), 700):
+        acc.update(df.iloc[start:start + 700])
+    pd.testing.assert_frame_equal(acc.matrix(), df.corr(), atol=1e-10)
+
+
+# накопители кусков с разными сдвигами объединяются (в том числе после сохранения состояния в json)
+def test_pairwise_merge_and_state():
+    df = frame_with_gaps(1)
+    # у кусков разные средние, поэтому и сдвиги накопителей разные
+    shifted = [part + i * 100 for i, part in enumerate(split(df, 4))]
+    parts = []
+    for part in shifted:
+        acc = CorrelationAccumulator(df.columns)
+        acc.update(part)
+        parts.append(acc)
+    total = CorrelationAccumulator.from_state(json.loads(json.dumps(parts[0].to_state())))
+    for acc in parts[1:]:
+        total.merge(acc)
+    assert total.rows == len(df)
+    pd.testing.assert_frame_equal(total.matrix(), pd.concat(shifted).corr(), atol=1e-10)
+
+    parallel = CorrelationAccumulator(df.columns)
+    parallel.update_many(split(df, 9), workers=3)
+    pd.testing.assert_frame_equal(parallel.matrix(), df.corr(), atol=1e-10)
+
+
+# спирмен с пропусками: ранги по общим строкам каждой пары, как в pandas
+def test_spearman_matches_pandas_with_gaps():
+    df = frame_with_gaps(2, n=2000)
+    df['e'] = np.round(df['c'], 1)  # повторяющиеся значения (средние ранги)
+    pd.testing.assert_frame_equal(spearman(df), df.corr(method='spearman'), atol=1e-10)
+    full = df.dropna()
+    pd.testing.assert_frame_equal(spearman(full), full.corr(method='spearman'), atol=1e-10)
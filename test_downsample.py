@@ -0,0 +1,37 @@
+import numpy as np
+from downsample import minmax_decimate, lttb
+
+
+# в каждой корзине остаются минимум и максимум: пики ряда не теряются, порядок точек сохраняется
+def test_minmax_keeps_extremes():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=100003)
+    y[12345], y[77777] = 50.0, -50.0
+    y[500:510] = np.nan
+    x = np.arange(len(y), dtype=float)
+    dx, dy = minmax_decimate(x, y, 1000)
+    assert len(dx) <= 2000
+    assert np.all(np.diff(dx) > 0)
+    assert 12345 in dx and 77777 in dx
+    assert np.nanmax(dy) == 50.0 and np.nanmin(dy) == -50.0
+    np.testing.assert_array_equal(dy, y[dx.astype(int)])
+    # короткий ряд не прореживается
+    short_x, short_y = minmax_decimate(x[:100], y[:100], 1000)
+    assert len(short_x) == 100
+
+
+# lttb: ровно n_out точек, первая и последняя на месте, одиночный выброс попадает в результат
+def test_lttb_shape():
+    x = np.linspace(0, 10, 50000)
+    y = np.sin(x)
+    y[31234] = 5.0
+    dx, dy = lttb(x, y, 500)
+    assert len(dx) == 500
+    assert dx[0] == x[0] and dx[-1] == x[-1]
+    assert np.all(np.diff(dx) > 0)
+    assert 5.0 in dy
+    # точки берутся из ряда, форма синусоиды сохраняется
+    assert np.allclose(dy[dy != 5.0], np.sin(dx[dy != 5.0]))
+    assert np.abs(np.interp(x, dx, dy) - y)[np.abs(x - x[31234]) > 0.1].max() < 0.01
+    same_x, _ = lttb(x[:100], y[:100], 500)
+    assert len(same_x) == 100
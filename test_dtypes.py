@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from dtypes import SchemaInference, apply_schema, DATETIME
+
+
+def infer(df, chunk=300):
+    inference = SchemaInference()
+    for start in range(0, len(df), chunk):
+        inference.update(df.iloc[start:start + chunk])
+    return inference.schema()
+
+
+# типы по кускам: маленькие целые, дробные без потери точности, категории, даты; остальное не меняется
+def test_schema_inference():
+    n = 1000
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'small': rng.integers(-100, 100, n), 'big': rng.integers(0, 100000, n),
+                       'half': rng.integers(0, 8, n) / 2, 'noise': rng.normal(size=n),
+                       'gaps': np.where(rng.random(n) < 0.1, np.nan, 1.0),
+                       'city': rng.choice(['a', 'b', 'c'], n).astype(object),
+                       'id': [f"user{i}" for i in range(n)],
+                       'day': pd.date_range('2024-01-01', periods=n, freq='h').strftime('%Y-%m-%d %H:%M:%S')})
+    schema = infer(df)
+    assert schema == {'small': 'int8', 'big': 'int32', 'half': 'float32', 'noise': 'float64', 'gaps': 'float32',
+                      'city': 'category', 'day': DATETIME}
+    optimized = apply_schema(df.copy(), schema)
+    assert {col: str(optimized[col].dtype) for col in ('small', 'big', 'half', 'gaps', 'city')} == {
+        'small': 'int8', 'big': 'int32', 'half': 'float32', 'gaps': 'float32', 'city': 'category'}
+    assert pd.api.types.is_datetime64_any_dtype(optimized['day'])
+    for col in ('small', 'big', 'half'):
+        assert (optimized[col].astype(df[col].dtype) == df[col]).all()
+
+
+# схема подобрана по старым строкам: значения, которые тип не вмещает, не обрезаются и не округляются
+def test_apply_schema_keeps_lossy_columns():
+    schema = {'v': 'int8', 'f': 'float32', 'big': 'int8'}
+    df = apply_schema(pd.DataFrame({'v': [1.0, 2.75], 'f': [0.5, 0.1], 'big': [1, 300]}), schema)
+    assert df['v'].tolist() == [1.0, 2.75]
+    assert df['f'].dtype == np.float64 and df['f'].iloc[1] == 0.1
+    assert df['big'].dtype == np.int64
+    same = apply_schema(pd.DataFrame({'v': [1.0, 2.0], 'f': [0.5, 0.25]}), schema)
+    assert same['v'].dtype == np.int8 and same['f'].dtype == np.float32
+
+
+# пропуски: в целый тип столбец с пропусками не приводится, текст среди чисел и не-даты не превращаются в NaN
+def test_apply_schema_missing_values():
+    schema = {'n': 'int16', 'x': 'float32', 'day': DATETIME}
+    df = apply_schema(pd.DataFrame({'n': [1.0, np.nan], 'x': [0.5, 'oops'], 'day': ['2024-01-01', 'завтра']}),
+                      schema)
+    assert df['n'].dtype == np.float64 and df['n'].isna().sum() == 1
+    assert df['x'].tolist() == [0.5, 'oops']
+    assert df['day'].tolist() == ['2024-01-01', 'завтра']
+    clean = apply_schema(pd.DataFrame({'x': [0.5, None], 'day': ['2024-01-01', None]}), schema)
+    assert clean['x'].dtype == np.float32 and clean['x'].isna().sum() == 1
+    assert pd.api.types.is_datetime64_any_dtype(clean['day']) and clean['day'].isna().sum() == 1
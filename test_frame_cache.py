@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pipeline
+from dataset import DatasetHandle
+from frame_cache import FrameCache, frame_bytes, frames
+
+
+def frame(n, value=0.0):
+    return pd.DataFrame({'a': np.full(n, value), 'b': np.arange(n, dtype=float)})
+
+
+# вытеснение по объему: дольше всех не нужные таблицы уходят первыми, размер считается в байтах
+def test_eviction_by_bytes():
+    size = frame_bytes(frame(10000))
+    cache = FrameCache(budget_mb=2.5 * size / 1024 / 1024)
+    cache.put(('db', 'x', 1), frame(10000, 1.0))
+    cache.put(('db', 'y', 1), frame(10000, 2.0))
+    assert cache.get(('db', 'x', 1)) is not None  # x использовалась последней
+    cache.put(('db', 'z', 1), frame(10000, 3.0))
+    assert cache.get(('db', 'y', 1)) is None
+    assert cache.get(('db', 'x', 1))['a'].iloc[0] == 1.0 and cache.get(('db', 'z', 1))['a'].iloc[0] == 3.0
+    assert cache.stats()['entries'] == 2 and cache.used == 2 * size
+
+    cache.put(('db', 'big', 1), frame(30000))  # больше всего бюджета - не хранится и ничего не вытесняет
+    assert cache.get(('db', 'big', 1)) is None and cache.stats()['entries'] == 2
+    cache.put(('db', 'x', 1), frame(5000))  # замена записи: объем пересчитывается
+    assert cache.used == size + frame_bytes(frame(5000))
+
+    cache.set_budget(1.5 * size / 1024 / 1024)
+    assert cache.stats()['entries'] == 1 and cache.get(('db', 'z', 1)) is None
+    stats = cache.stats()
+    assert stats['hits'] == 3 and stats['misses'] == 3
+
+
+# изменение полученной таблицы не портит кэш; записи датасета удаляются по пути и имени
+def test_copies_and_invalidate(tmp_path):
+    cache = FrameCache()
+    path = str(tmp_path / 'test.db')
+    key = (path, 'data', 1, None)
+    cache.put(key, frame(10))
+    got = cache.get(key)
+    got['a'] = 5.0
+    got['c'] = 1
+    assert list(cache.get(key).columns) == ['a', 'b'] and cache.get(key)['a'].iloc[0] == 0.0
+    cache.put((path, 'other', 1, None), frame(10))
+    cache.invalidate(path, 'data')
+    assert cache.get(key) is None and cache.get((path, 'other', 1, None)) is not None
+    assert cache.used == frame_bytes(frame(10))
+
+
+# таблица датасета читается из sqlite один раз; после дописывания строк ключ (версия) другой
+def test_dataset_reads_cached(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    pipeline.ingest_frames(db_path, [frame(100)], 'data')
+    frames.clear()
+    handle = DatasetHandle(db_path, 'data')
+    first = handle.read(columns=['b'])
+    hits = frames.stats()['hits']
+    assert DatasetHandle(db_path, 'data').read(columns=['b']).equals(first)
+    assert frames.stats()['hits'] == hits + 1
+
+    pipeline.append_frames(db_path, [frame(50)], 'data')
+    assert frames.get(handle.cache_key(['b'], False)) is None
+    assert len(DatasetHandle(db_path, 'data').read(columns=['b'])) == 150
+
+
+# тот же кэш для других значений: размер считает переданная функция, значения хранятся как есть
+def test_custom_size():
+    cache = FrameCache(budget_mb=1, size=len, copy=None)
+    data = b'x' * (600 * 1024)
+    cache.put('a', data)
+    assert cache.get('a') is data and cache.used == len(data)
+    cache.put('b', data)
+    assert cache.get('a') is None and cache.stats()['entries'] == 1
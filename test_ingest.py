@@ -0,0 +1,56 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from database import create_catalog
+from ingest import read_csv_chunks, ArrowChunkReader, frames_to_db, append_frames_to_db
+
+
+def read_all(path, engine):
+    reader = read_csv_chunks(path, chunksize=1000, engine=engine)
+    try:
+        return reader, pd.concat(list(reader), ignore_index=True)
+    finally:
+        reader.close()
+
+
+# оба парсера на одном файле с пропусками дают одни и те же данные
+def test_engines_read_same_nulls(tmp_path):
+    pytest.importorskip('pyarrow')
+    rng = np.random.default_rng(0)
+    n = 5000
+    df = pd.DataFrame({'name': rng.choice(['a', 'b', 'c'], n).astype(object),
+                       'value': rng.normal(size=n),
+                       'count': rng.integers(0, 100, n).astype(float),
+                       'date': pd.date_range('2024-01-01', periods=n, freq='h').strftime('%Y-%m-%d %H:%M:%S')})
+    df.loc[rng.random(n) < 0.1, 'name'] = None
+    df.loc[rng.random(n) < 0.1, 'value'] = np.nan
+    df.loc[rng.random(n) < 0.1, 'count'] = np.nan
+    df.loc[::97, 'name'] = 'NA'
+    path = tmp_path / 'gaps.csv'
+    df.to_csv(path, index=False)
+
+    _, c = read_all(path, 'c')
+    reader, arrow = read_all(path, 'pyarrow')
+    assert isinstance(reader, ArrowChunkReader)
+    assert list(arrow.columns) == list(c.columns)
+    assert (arrow.isna().sum() == c.isna().sum()).all()
+    assert arrow['name'].isna().sum() > 0
+    for col in c.columns:
+        if pd.api.types.is_numeric_dtype(c[col]):
+            np.testing.assert_allclose(arrow[col].to_numpy(dtype=float), c[col].to_numpy(dtype=float))
+        else:
+            assert arrow[col].where(arrow[col].notna(), None).tolist() == c[col].where(c[col].notna(), None).tolist()
+
+
+# замена по ключу: строка с пустым ключом заменяется так же, как остальные, а не дублируется
+def test_upsert_replaces_null_key():
+    conn = sqlite3.connect(':memory:')
+    create_catalog(conn)
+    first = pd.DataFrame({'key': ['a', None, 'b'], 'value': [1.0, 2.0, 3.0]})
+    second = pd.DataFrame({'key': [None, 'b', 'c'], 'value': [20.0, 30.0, 40.0]})
+    frames_to_db(conn, [first], 'data')
+    assert append_frames_to_db(conn, [second], 'data', key='key') == (3, 2)
+    rows = conn.execute("SELECT key, value FROM data ORDER BY rowid").fetchall()
+    assert rows == [('a', 1.0), (None, 20.0), ('b', 30.0), ('c', 40.0)]
+    assert conn.execute("SELECT row_count FROM datasets WHERE name = 'data'").fetchone()[0] == 4
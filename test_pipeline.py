@@ -0,0 +1,156 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import pipeline
+import stats_cache
+from database import create_catalog, create_sample_data
+from dataset import DatasetHandle
+
+
+def sample_frame(rng, n, start):
+    df = pd.DataFrame({'id': np.arange(start, start + n),
+                       'value': rng.normal(size=n),
+                       'name': rng.choice(list('abcdef'), n).astype(object),
+                       'count': rng.integers(0, 100, n).astype(float)})
+    df.loc[rng.random(n) < 0.1, 'count'] = np.nan
+    return df
+
+
+# сводка после дописывания строк досчитывается по новым кускам и совпадает с полным пересчетом
+# (строк меньше размера эскиза квантилей, поэтому и квантили точные)
+def test_append_updates_summary(tmp_path):
+    rng = np.random.default_rng(0)
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    sample_frame(rng, 2000, 0).to_csv(tmp_path / 'a.csv', index=False)
+    sample_frame(rng, 1500, 2000).to_csv(tmp_path / 'b.csv', index=False)
+    pipeline.ingest_csv(db_path, str(tmp_path / 'a.csv'), 'data')
+    assert pipeline.append_csv(db_path, str(tmp_path / 'b.csv'), 'data') == (1500, 0)
+
+    handle = DatasetHandle(db_path, 'data')
+    cached = stats_cache.get_cached(handle.connect(), 'data', 'summary')
+    assert cached is not None
+    full = pipeline.compute_summary(handle)
+    for key in ('rows', 'dtypes', 'missing', 'schema', 'categorical'):
+        assert cached[key] == full[key]
+    pd.testing.assert_frame_equal(pd.DataFrame(**cached['describe']), pd.DataFrame(**full['describe']))
+
+    # замена строк по ключу: сводка пересчитывается целиком при следующем запросе
+    assert pipeline.append_csv(db_path, str(tmp_path / 'b.csv'), 'data', key='id') == (1500, 1500)
+    handle = DatasetHandle(db_path, 'data')
+    assert stats_cache.get_cached(handle.connect(), 'data', 'summary') is None
+    assert pipeline.cached_summary(handle)['rows'] == 3500
+
+
+# выборка случайных строк по rowid и прямая регрессии по суммам из sql - как по всем строкам в pandas
+def test_sample_mode_reads_random_rows(tmp_path):
+    rng = np.random.default_rng(1)
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    df = sample_frame(rng, 20000, 0)
+    df['value'] = 0.5 * df['id'] + rng.normal(size=len(df)) + 1000
+    df.to_csv(tmp_path / 'a.csv', index=False)
+    pipeline.ingest_csv(db_path, str(tmp_path / 'a.csv'), 'data')
+
+    handle = DatasetHandle(db_path, 'data')
+    assert handle.dense_rowid
+    data = pipeline.correlation_data(handle, 'regplot', mode='sample', cap=500)
+    sample = data['sample']
+    assert len(sample) == 500
+    assert list(sample.columns) == ['id', 'value']
+    assert sample['id'].is_unique
+    original = df.set_index('id').loc[sample['id'], 'value'].to_numpy()
+    np.testing.assert_allclose(sample['value'].to_numpy(), original)
+
+    # прямая по всем строкам (первые два числовых столбца - id и value)
+    slope, intercept = np.polyfit(df['id'], df['value'], 1)
+    assert data['fit']['n'] == len(df)
+    assert np.isclose(data['fit']['slope'], slope)
+    assert np.isclose(data['fit']['y'][0], intercept + slope * df['id'].min())
+
+
+# дописывание с заменой по ключу: row_count в каталоге совпадает с числом строк таблицы,
+# строки с повторным ключом заменяются последними
+def test_upsert_keeps_row_count(tmp_path):
+    rng = np.random.default_rng(2)
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    sample_frame(rng, 1000, 0).to_csv(tmp_path / 'a.csv', index=False)
+    update = sample_frame(rng, 600, 700)  # 300 старых ключей и 300 новых
+    update = pd.concat([update, update.iloc[:5].assign(value=-1.0)])  # повтор ключа в самом файле
+    update.to_csv(tmp_path / 'b.csv', index=False)
+    pipeline.ingest_csv(db_path, str(tmp_path / 'a.csv'), 'data')
+
+    inserted, replaced = pipeline.append_csv(db_path, str(tmp_path / 'b.csv'), 'data', key='id')
+    assert (inserted, replaced) == (600, 300)
+    handle = DatasetHandle(db_path, 'data')
+    table = handle.read()
+    assert handle.row_count == len(table) == 1300
+    assert table['id'].is_unique
+    assert (table.set_index('id').loc[700:704, 'value'] == -1.0).all()
+    assert pipeline.cached_summary(handle)['rows'] == 1300
+
+    inserted, replaced = pipeline.append_csv(db_path, str(tmp_path / 'a.csv'), 'data')
+    assert (inserted, replaced) == (1000, 0)
+    assert DatasetHandle(db_path, 'data').row_count == 2300
+
+
+# после замены строк сводка не досчитывается, поэтому и старая схема типов сбрасывается:
+# дробные значения, дописанные в целый столбец, не обрезаются
+def test_append_after_upsert_resets_schema(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    pd.DataFrame({'id': range(100), 'v': [1, 2] * 50, 'f': [0.5] * 100}).to_csv(tmp_path / 'a.csv', index=False)
+    pd.DataFrame({'id': range(10), 'v': 3, 'f': 0.25}).to_csv(tmp_path / 'b.csv', index=False)
+    pd.DataFrame({'id': [100], 'v': [2.75], 'f': [0.1]}).to_csv(tmp_path / 'c.csv', index=False)
+    pipeline.ingest_csv(db_path, str(tmp_path / 'a.csv'), 'data')
+    assert DatasetHandle(db_path, 'data').schema['v'] == 'int8'
+
+    assert pipeline.append_csv(db_path, str(tmp_path / 'b.csv'), 'data', key='id') == (10, 10)
+    pipeline.append_csv(db_path, str(tmp_path / 'c.csv'), 'data')
+    table = DatasetHandle(db_path, 'data').read()
+    assert table['v'].iloc[-1] == 2.75
+    assert table['f'].iloc[-1] == 0.1
+    assert table['f'].dtype == np.float64
+
+
+# пустые агрегаты (в датасете еще нет строк) строятся один раз на версию датасета, а не на каждый график
+def test_time_line_builds_rollups_once(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    empty = pd.DataFrame({'time': pd.to_datetime(['2024-01-01']), 'value': [1.0]}).iloc[:0]
+    pipeline.ingest_frames(db_path, [empty], 'data')
+    calls = []
+    build = pipeline.build_rollups
+    monkeypatch.setattr(pipeline, 'build_rollups', lambda *args: calls.append(args) or build(*args))
+
+    for _ in range(2):
+        data = pipeline.time_line_data(DatasetHandle(db_path, 'data'), 'value', 'time')
+        assert data['level'] is None and not len(data['x'])
+    assert calls == []  # при загрузке агрегаты уже строились
+
+    pipeline.append_frames(db_path, [empty], 'data')  # новая версия датасета
+    for _ in range(2):
+        pipeline.time_line_data(DatasetHandle(db_path, 'data'), 'value', 'time')
+    assert len(calls) == 1
+
+
+# повторное создание примеров заменяет таблицы: сводка из кэша прежних данных не возвращается
+def test_sample_data_recreated(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    conn = sqlite3.connect(db_path)
+    create_catalog(conn)
+    create_sample_data(conn)
+    conn.commit()
+    old = pipeline.cached_summary(DatasetHandle(db_path, 'sales_data'))
+    old_version = DatasetHandle(db_path, 'sales_data').version
+
+    create_sample_data(conn)
+    conn.commit()
+    handle = DatasetHandle(db_path, 'sales_data')
+    assert handle.version == old_version + 1
+    assert stats_cache.get_cached(handle.connect(), 'sales_data', 'summary') is None
+    summary = pipeline.cached_summary(handle)
+    assert summary['describe'] != old['describe']
+    assert summary['describe'] == pipeline.compute_summary(handle)['describe']
+    conn.close()
@@ -0,0 +1,105 @@
+import sqlite3
+import pandas as pd
+import pytest
+import query
+from database import create_catalog
+from ingest import frames_to_db, index_name
+
+
+def sample_db():
+    conn = sqlite3.connect(':memory:')
+    create_catalog(conn)
+    df = pd.DataFrame({'city "x"': ['Москва', 'Казань', 'Москва', 'Тверь', None],
+                       'price': [10.0, 25.5, 7.0, 40.0, 3.0],
+                       'qty': [1, 2, 3, 4, 5],
+                       'day': ['2024-01-01', '2024-01-15', '2024-02-03', '2024-02-28', '2024-03-01']})
+    frames_to_db(conn, [df], 'sales')
+    types = {row[1]: row[2] for row in conn.execute('PRAGMA table_info(sales)')}
+    return conn, df, types
+
+
+def rows(conn, where, params, column='qty'):
+    sql = f'SELECT {column} FROM sales' + (f' WHERE {where}' if where else '') + ' ORDER BY rowid'
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+# операции сравнения, contains и in; значения - параметры (в тип столбца), имена столбцов в кавычках
+def test_compile_filters():
+    conn, df, types = sample_db()
+    where, params = query.compile_filters([('price', '>=', ' 10 '), ('qty', '!=', '4')], types)
+    assert where == '"price" >= ? AND "qty" != ?'
+    assert params == [10, 4]
+    assert rows(conn, where, params) == [1, 2]
+
+    where, params = query.compile_filters([('city "x"', 'in', "Москва, Тверь,"), ('price', '<', '39.5')], types)
+    assert where.startswith('"city ""x""" IN (?, ?)')
+    assert params == ['Москва', 'Тверь', 39.5]
+    assert rows(conn, where, params) == [1, 3]
+
+    # значение с кавычкой и % не ломает запрос: оно только параметр
+    where, params = query.compile_filters([('city "x"', 'contains', "ань"), ('city "x"', '=', "x' OR 1=1 --")],
+                                          types)
+    assert params == ['%ань%', "x' OR 1=1 --"]
+    assert rows(conn, where, params) == []
+    assert rows(conn, *query.compile_filters([('city "x"', 'contains', "ань")], types)) == [2]
+
+
+def test_compile_filters_errors():
+    _, _, types = sample_db()
+    with pytest.raises(ValueError, match='не найден'):
+        query.compile_filters([('nope', '=', '1')], types)
+    with pytest.raises(ValueError, match='не является числом'):
+        query.compile_filters([('price', '>', 'abc')], types)
+    with pytest.raises(ValueError, match='Неизвестная операция'):
+        query.compile_filters([('price', 'LIKE', '1')], types)
+    with pytest.raises(ValueError, match='Пустой список'):
+        query.compile_filters([('qty', 'in', ' , ')], types)
+    with pytest.raises(ValueError, match='Неизвестная агрегация'):
+        query.compile_aggregate('sales', types, func='median')
+
+
+# группировка по месяцам дат с условием: те же суммы, что у pandas
+def test_compile_aggregate_buckets():
+    conn, df, types = sample_db()
+    where, params = query.compile_filters([('qty', '<=', '4')], types)
+    sql, params = query.compile_aggregate('sales', types, where, params, group_by='day', bucket='month', func='sum')
+    result = pd.read_sql_query(sql, conn, params=params)
+    part = df[df['qty'] <= 4]
+    expected = part.groupby(pd.to_datetime(part['day']).dt.strftime('%Y-%m'))[['price', 'qty']].sum()
+    assert result['day'].tolist() == expected.index.tolist()
+    assert result['price'].tolist() == expected['price'].tolist()
+    assert result['qty'].tolist() == expected['qty'].tolist()
+
+    sql, params = query.compile_aggregate('sales', types, group_by='city "x"', func='count')
+    counts = dict(conn.execute(sql, params).fetchall())
+    assert counts == {None: 1, 'Казань': 1, 'Москва': 2, 'Тверь': 1}
+    sql, _ = query.compile_aggregate('sales', types, func='avg')
+    assert conn.execute(sql).fetchone() == (df['price'].mean(), df['qty'].mean())
+
+
+def indexes(conn):
+    return [row[1] for row in conn.execute("PRAGMA index_list(sales)")]
+
+
+# индекс создается после INDEX_AFTER фильтров по столбцу, один раз
+def test_index_after_repeated_filters():
+    conn, _, _ = sample_db()
+    created = [query.record_usage(conn, 'sales', ['price', 'price']) for _ in range(query.INDEX_AFTER + 1)]
+    assert created == [[]] * (query.INDEX_AFTER - 1) + [['price'], []]
+    assert indexes(conn) == [index_name('sales', 'price')]
+    assert conn.execute("SELECT uses FROM column_usage WHERE dataset = 'sales' AND column_name = 'price'"
+                        ).fetchone()[0] == query.INDEX_AFTER + 1
+
+
+# индекс по тому же столбцу под другим (старым) именем переиспользуется, второй не создается
+def test_existing_index_reused():
+    conn, _, _ = sample_db()
+    conn.execute('CREATE INDEX idx_sales_qty ON sales (qty)')
+    conn.execute('CREATE INDEX idx_sales_price_qty ON sales (price, qty)')
+    for _ in range(query.INDEX_AFTER):
+        assert query.record_usage(conn, 'sales', ['qty']) == []
+    assert sorted(indexes(conn)) == ['idx_sales_price_qty', 'idx_sales_qty']
+    # составной индекс, который начинается со столбца, - не индекс ровно по нему
+    for _ in range(query.INDEX_AFTER):
+        query.record_usage(conn, 'sales', ['price'])
+    assert index_name('sales', 'price') in indexes(conn)
@@ -0,0 +1,76 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import rollups
+from database import create_catalog
+
+
+def sample_frame(seed, start, periods):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'time': pd.date_range(start, periods=periods, freq='7min').strftime('%Y-%m-%d %H:%M:%S'),
+                         'value': rng.normal(size=periods),
+                         'count': rng.integers(0, 10, periods).astype(float)})
+
+
+def expected(df, freq): # те же агрегаты через pandas
+    times = pd.to_datetime(df['time'])
+    buckets = times.dt.to_period('M').dt.start_time if freq == 'MS' else times.dt.floor(freq)
+    grouped = df['value'].groupby(buckets)
+    result = pd.DataFrame({'n': grouped.count(), 'total': grouped.sum(), 'low': grouped.min(),
+                           'high': grouped.max()})
+    result.index = result.index.astype('datetime64[s]').astype(np.int64)
+    return result
+
+
+def build(conn, chunks, levels=None):
+    builder = rollups.RollupBuilder(['time'], ['value', 'count'], levels)
+    for chunk in chunks:
+        builder.update(chunk)
+    builder.save(conn, 'data')
+    return builder
+
+
+def read(conn, level):
+    return rollups.read_level(conn, 'data', 'time', 'value', level).set_index('bucket')
+
+
+# суммы, счетчики и границы по часам и дням совпадают с группировкой pandas
+def test_rollup_sums_match_pandas():
+    conn = sqlite3.connect(':memory:')
+    create_catalog(conn)
+    df = sample_frame(0, '2024-01-01', 5000)
+    df.loc[::13, 'value'] = np.nan
+    build(conn, [df.iloc[:1700], df.iloc[1700:]])
+    for level, freq in (('hour', 'h'), ('day', 'D')):
+        ours = read(conn, level)
+        pd.testing.assert_frame_equal(ours[['n', 'total', 'low', 'high']], expected(df, freq),
+                                      check_dtype=False, check_names=False)
+    # у 7-минутных данных почти каждая минута - отдельная корзина: такой уровень не хранится
+    assert 'minute' not in rollups.stored_levels(conn, 'data')['time']
+
+
+# дописывание: корзины, которые уже есть, дополняются (upsert), новые добавляются
+def test_rollup_upsert_on_append():
+    conn = sqlite3.connect(':memory:')
+    create_catalog(conn)
+    df = sample_frame(1, '2024-03-01', 3000)
+    first, second = df.iloc[:2000], df.iloc[1990:]  # общий час на границе и повтор 10 строк
+    build(conn, [first])
+    levels = rollups.stored_levels(conn, 'data')
+    build(conn, [second], levels)
+    both = pd.concat([first, second])
+    for level, freq in (('hour', 'h'), ('day', 'D'), ('month', 'MS')):
+        ours = read(conn, level)
+        pd.testing.assert_frame_equal(ours[['n', 'total', 'low', 'high']], expected(both, freq),
+                                      check_dtype=False, check_names=False)
+
+
+# недели начинаются с понедельника, месяцы - с первого числа
+def test_bucket_starts():
+    seconds = rollups.to_seconds(pd.Series(['2024-01-03 12:00:00', '2024-02-29 23:59:59']))
+    weeks = rollups.bucket_starts(seconds.astype(np.int64), 'week').astype('datetime64[s]')
+    months = rollups.bucket_starts(seconds.astype(np.int64), 'month').astype('datetime64[s]')
+    assert [str(w) for w in weeks] == ['2024-01-01T00:00:00', '2024-02-26T00:00:00']
+    assert [str(m) for m in months] == ['2024-01-01T00:00:00', '2024-02-01T00:00:00']
+    assert rollups.choose_level({'hour': 2000, 'day': 90, 'month': 3}, 50) == 'day'
+    assert rollups.choose_level({'hour': 20}, 50) is None
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from sampling import StratifiedSample, STRATA_MAX, OTHER
+
+
+def chunks_of(df, size):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+
+# группы представлены пропорционально, редкая группа не теряется, всего строк ровно k
+def test_stratified_shares():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'x': np.arange(100000), 'g': rng.choice(list('abc'), 100000, p=[0.9, 0.0995, 0.0005])})
+    sample = StratifiedSample('g', 500, seed=0)
+    for chunk in chunks_of(df, 30000):
+        sample.update(chunk)
+    result = sample.result()
+    counts = result['g'].value_counts()
+    assert len(result) == 500
+    assert result['x'].is_unique
+    assert counts['c'] >= 1 and abs(counts['a'] - 450) <= 2
+    assert (result.set_index('x')['g'] == df.set_index('x').loc[result['x'], 'g']).all()
+
+
+# у столбца с уникальными значениями групп не больше STRATA_MAX, остальные строки - в общей группе
+def test_stratified_many_values_bounded():
+    n = 50000
+    df = pd.DataFrame({'x': np.arange(n), 'day': [f"2024-01-01 {i}" for i in range(n)]})
+    sample = StratifiedSample('day', 300, seed=1)
+    for chunk in chunks_of(df, 7000):
+        sample.update(chunk)
+    result = sample.result()
+    assert len(sample.strata) == STRATA_MAX
+    assert len(result) == 300
+    assert result['day'].nunique() == STRATA_MAX + 1
+    assert (result['day'] == OTHER).sum() == 300 - STRATA_MAX
+    # k меньше числа групп: все равно не больше k строк
+    small = StratifiedSample('day', 5, seed=1)
+    small.update(df)
+    assert len(small.result()) == 5
@@ -0,0 +1,136 @@
+import io
+import os
+import json
+import threading
+import urllib.request
+import urllib.error
+import numpy as np
+import pandas as pd
+import pytest
+import charts
+import pipeline
+import server
+from ingest import CHUNK_SIZE
+
+
+@pytest.fixture
+def base_url(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    pipeline.prepare_database(db_path)
+    n = CHUNK_SIZE + 1234  # срез больше одного куска: ответ идет несколькими частями
+    df = pd.DataFrame({'time': pd.date_range('2024-01-01', periods=n, freq='min').strftime('%Y-%m-%d %H:%M:%S'),
+                       'value': np.arange(n) * 0.5, 'name': np.where(np.arange(n) % 2, 'a', 'b')})
+    pipeline.ingest_frames(db_path, [df], 'data')
+    srv = server.DatasetServer(db_path, port=0, workers=2)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}", srv, df
+    srv.shutdown()
+    srv.server_close()
+    thread.join()
+
+
+def get(url):
+    with urllib.request.urlopen(url) as response:
+        return response.status, response.headers, response.read()
+
+
+def error(url):
+    with pytest.raises(urllib.error.HTTPError) as info:
+        urllib.request.urlopen(url)
+    return info.value.code, json.loads(info.value.read())['error']
+
+
+# неизвестные адреса, датасеты и столбцы - 404, неверные параметры - 400
+def test_routing_errors(base_url):
+    url, _, _ = base_url
+    assert error(url + '/nothing')[0] == 404
+    assert error(url + '/datasets/data/nothing')[0] == 404
+    assert error(url + '/datasets/missing')[0] == 404
+    assert error(url + '/datasets/data/columns?columns=value,nope') == (404, "В датасете нет столбцов: nope")
+    assert error(url + '/datasets/data/chart/pie')[0] == 404
+    assert error(url + '/datasets/data/chart/line?column=nope')[0] == 404
+    assert error(url + '/datasets/data/columns?limit=abc')[0] == 400
+    assert error(url + '/datasets/data/columns?offset=-1')[0] == 400
+    assert error(url + '/datasets/data/columns?format=xml')[0] == 400
+    assert error(url + '/datasets/data/chart/heatmap?method=kendall')[0] == 400
+    assert error(url + '/datasets/data/chart/line?width=100000')[0] == 400
+    assert error(url + '/datasets/data/chart/line?time=value')[0] == 400  # не столбец дат
+
+
+def test_list_and_describe(base_url):
+    url, _, df = base_url
+    status, _, body = get(url + '/datasets')
+    assert status == 200 and [d['name'] for d in json.loads(body)] == ['data']
+    info = json.loads(get(url + '/datasets/data')[2])
+    assert info['rows'] == len(df)
+    assert info['numeric_columns'] == ['value'] and info['time_columns'] == ['time']
+    assert json.loads(get(url + '/datasets/data/stats')[2])['rows'] == len(df)
+
+
+# срез потоком (chunked): весь датасет и диапазон строк, цсв и arrow
+def test_columns_stream_csv(base_url):
+    url, _, df = base_url
+    status, headers, body = get(url + '/datasets/data/columns?columns=value,name&format=csv')
+    assert headers['Transfer-Encoding'] == 'chunked'
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(body)), df[['value', 'name']])
+    _, _, body = get(url + f'/datasets/data/columns?columns=value&offset={CHUNK_SIZE - 10}&limit=20&format=csv')
+    assert pd.read_csv(io.BytesIO(body))['value'].tolist() == df['value'].iloc[CHUNK_SIZE - 10:CHUNK_SIZE + 10].tolist()
+
+
+def test_columns_stream_arrow(base_url):
+    pa = pytest.importorskip('pyarrow')
+    url, _, df = base_url
+    _, headers, body = get(url + '/datasets/data/columns?format=arrow')
+    assert headers['Content-Type'] == 'application/vnd.apache.arrow.stream'
+    table = pa.ipc.open_stream(body).read_all()
+    assert table.num_rows == len(df)
+    assert table.column('value').to_pylist() == df['value'].tolist()
+    _, _, body = get(url + '/datasets/data/columns?columns=name&offset=5&limit=3&format=arrow')
+    assert pa.ipc.open_stream(body).read_all().column('name').to_pylist() == df['name'].iloc[5:8].tolist()
+
+
+# картинка графика рисуется один раз: повторный запрос с теми же параметрами - из кэша сервера
+def test_chart_cached(base_url, monkeypatch):
+    url, srv, _ = base_url
+    calls = []
+    render = charts.render_chart
+    monkeypatch.setattr(charts, 'render_chart', lambda *args, **kwargs: calls.append(args) or render(*args, **kwargs))
+    chart = url + '/datasets/data/chart/line?column=value&time=time&width=400&height=300'
+    status, headers, first = get(chart)
+    assert status == 200 and headers['Content-Type'] == 'image/png' and first.startswith(b'\x89PNG')
+    assert get(chart)[2] == first
+    assert len(calls) == 1
+    get(chart.replace('width=400', 'width=500'))
+    assert len(calls) == 2
+
+
+# кэш картинок (FrameCache с размером по длине png): вытесняются дольше всех не нужные,
+# слишком большая картинка не сохраняется
+def test_chart_cache_eviction(base_url):
+    _, srv, _ = base_url
+    cache = srv.charts
+    cache.set_budget(1)
+    part = b'x' * (400 * 1024)
+    cache.put('a', part)
+    cache.put('b', part)
+    assert cache.get('a') is part  # 'a' теперь использовалась последней
+    cache.put('c', part)
+    assert cache.get('b') is None and cache.get('a') is part and cache.get('c') is part
+    cache.put('big', b'x' * (2 * 1024 * 1024))
+    assert cache.get('big') is None and cache.get('a') is part
+
+
+# unix-сокет: чужой файл по тому же пути не удаляется, свой сокет удаляется при закрытии
+def test_unix_socket_path(tmp_path):
+    path = str(tmp_path / 'server.sock')
+    with open(path, 'w') as f:
+        f.write('data')
+    with pytest.raises(FileExistsError):
+        server.UnixDatasetServer(str(tmp_path / 'test.db'), path)
+    assert os.path.exists(path)
+    os.remove(path)
+    srv = server.UnixDatasetServer(str(tmp_path / 'test.db'), path)
+    assert os.path.exists(path)
+    srv.server_close()
+    assert not os.path.exists(path)
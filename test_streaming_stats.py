@@ -0,0 +1,135 @@
+import json
+import numpy as np
+import pandas as pd
+from streaming_stats import (QuantileSketch, ColumnMoments, StreamingDescriber, HyperLogLog, SpaceSaving,
+                             PERCENTILES, text_hashes)
+
+
+def chunks_of(df, size):
+    return [df.iloc[start:start + size] for start in range(0, len(df), size)]
+
+
+# пока значений не больше k, квантили точные (как np.percentile)
+def test_quantile_sketch_exact_below_capacity():
+    values = np.random.default_rng(0).normal(size=1000)
+    sketch = QuantileSketch(k=4096, seed=0)
+    sketch.update(values[:400])
+    sketch.update(values[400:])
+    assert sketch.exact
+    assert np.allclose(sketch.quantiles(PERCENTILES), np.percentile(values, [25, 50, 75]))
+
+
+# после сжатия ошибка по рангу небольшая, в том числе после объединения эскизов из разных кусков
+def test_quantile_sketch_rank_error():
+    values = np.random.default_rng(1).exponential(size=200000)
+    sketches = []
+    for part in np.array_split(values, 8):
+        sketch = QuantileSketch(k=1024, seed=len(sketches))
+        for piece in np.array_split(part, 5):
+            sketch.update(piece)
+        sketches.append(sketch)
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert not merged.exact
+    assert merged.count == len(values)
+    ordered = np.sort(values)
+    for q, estimate in zip((0.01, 0.25, 0.5, 0.75, 0.99), merged.quantiles((0.01, 0.25, 0.5, 0.75, 0.99))):
+        rank = np.searchsorted(ordered, estimate) / len(values)
+        assert abs(rank - q) < 0.01
+
+
+# объединение моментов по формулам Чана совпадает с подсчетом по всем значениям
+def test_moments_merge_matches_numpy():
+    rng = np.random.default_rng(2)
+    values = rng.normal(1e6, 3.0, size=10000)  # большое среднее: проверка точности
+    values[rng.random(len(values)) < 0.1] = np.nan
+    parts = [ColumnMoments() for _ in range(4)]
+    for moments, part in zip(parts, np.array_split(values, 4)):
+        for piece in np.array_split(part, 7):
+            moments.update(piece)
+    total = ColumnMoments()
+    for moments in parts:
+        total.merge(moments)
+    clean = values[~np.isnan(values)]
+    assert total.count == len(clean)
+    assert np.isclose(total.mean, clean.mean(), rtol=1e-12)
+    assert np.isclose(total.std, clean.std(ddof=1), rtol=1e-9)
+    assert total.min == clean.min() and total.max == clean.max()
+
+
+# describe по кускам близок к pandas: счетчики, среднее, std, границы точные, квантили приближенные
+def test_describe_close_to_pandas():
+    rng = np.random.default_rng(3)
+    n = 30000
+    df = pd.DataFrame({'a': rng.normal(size=n), 'b': rng.integers(0, 1000, n).astype(float),
+                       'c': rng.choice(['x', 'y', 'z'], n)})
+    df.loc[rng.random(n) < 0.05, 'a'] = np.nan
+    df.loc[rng.random(n) < 0.05, 'c'] = None
+    describer = StreamingDescriber()
+    for chunk in chunks_of(df, 7000):
+        describer.update(chunk)
+    ours = describer.describe()
+    expected = df.describe()
+    assert list(ours.columns) == ['a', 'b']
+    exact = ['count', 'mean', 'std', 'min', 'max']
+    pd.testing.assert_frame_equal(ours.loc[exact], expected.loc[exact, ['a', 'b']], rtol=1e-9)
+    spread = expected.loc['75%'] - expected.loc['25%']
+    assert ((ours.loc[['25%', '50%', '75%']] - expected.loc[['25%', '50%', '75%'], ['a', 'b']]).abs()
+            <= 0.02 * spread).all().all()
+    summary = describer.summary()
+    assert summary['rows'] == n
+    assert summary['missing'] == {col: int(count) for col, count in df.isnull().sum().items() if count}
+
+
+# состояние для кэша переживает json, а объединение по кускам совпадает с одним проходом
+def test_describer_state_and_merge():
+    rng = np.random.default_rng(4)
+    df = pd.DataFrame({'a': rng.normal(size=6000), 'c': rng.choice(['x', 'y'], 6000)})
+    whole = StreamingDescriber(k=8192)
+    whole.update(df)
+    left, right = StreamingDescriber(k=8192), StreamingDescriber(k=8192)
+    left.update(df.iloc[:2500])
+    right.update(df.iloc[2500:])
+    left = StreamingDescriber.from_state(json.loads(json.dumps(left.to_state())))
+    left.merge(right)
+    pd.testing.assert_frame_equal(left.describe(), whole.describe())
+    assert left.categorical() == whole.categorical()
+    assert left.summary()['dtypes'] == whole.summary()['dtypes']
+
+
+# число различных значений: ошибка в пределах нескольких стандартных (~1.6%), объединение = общий поток
+def test_hyperloglog_estimate_and_merge():
+    values = np.array([f"user{i}" for i in range(50000)], dtype=object)
+    left, right = HyperLogLog(), HyperLogLog()
+    left.update(text_hashes(values[:30000]))
+    right.update(text_hashes(values[20000:]))  # пересечение не должно считаться дважды
+    left.merge(right)
+    assert abs(left.estimate() - 50000) < 0.05 * 50000
+    small = HyperLogLog()
+    small.update(text_hashes(np.array(['a', 'b', 'c', 'a'], dtype=object)))
+    assert small.estimate() == 3
+
+
+# частые значения: пока значений меньше счетчиков - точно; при вытеснении счетчик - оценка сверху,
+# count - error - снизу, а частые значения не теряются
+def test_space_saving_bounds():
+    rng = np.random.default_rng(5)
+    heavy = rng.choice(['a', 'b', 'c'], 30000, p=[0.5, 0.3, 0.2])
+    values = pd.Series(np.concatenate([heavy, [f"rare{i}" for i in range(20000)]])).sample(frac=1, random_state=0)
+    exact_counts = values.value_counts()
+    sketch = SpaceSaving(capacity=50)
+    for chunk in chunks_of(values.to_frame('v'), 5000):
+        sketch.update(chunk['v'].value_counts())
+    assert not sketch.exact
+    assert sketch.total == len(values)
+    top = sketch.top(3)
+    assert [value for value, _, _ in top] == ['a', 'b', 'c']
+    for value, count, error in sketch.top(50):
+        true = exact_counts.get(value, 0)
+        assert count - error <= true <= count
+
+    small = SpaceSaving(capacity=10)
+    small.update(pd.Series(['x', 'y', 'x']).value_counts())
+    small.merge(SpaceSaving.from_state(json.loads(json.dumps(small.to_state()))))
+    assert small.exact and small.top(2) == [['x', 4, 0], ['y', 2, 0]]
@@ -0,0 +1,36 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+import pytest
+from database import create_catalog
+from dataset import DatasetHandle
+from ingest import frames_to_db
+
+pytest.importorskip('PyQt5')
+from table_model import DatasetTableModel, PAGE_SIZE  # noqa: E402
+
+
+# rowid с пропусками: страницы читаются от соседних страниц (keyset) в любом порядке и совпадают
+# со строками по OFFSET
+def test_pages_with_rowid_gaps(tmp_path):
+    db_path = str(tmp_path / 'test.db')
+    conn = sqlite3.connect(db_path)
+    create_catalog(conn)
+    n = 10 * PAGE_SIZE + 37
+    frames_to_db(conn, [pd.DataFrame({'id': np.arange(n), 'value': np.arange(n) * 0.5})], 'data')
+    conn.execute("DELETE FROM data WHERE id % 7 = 3")
+    conn.execute("UPDATE datasets SET row_count = (SELECT COUNT(*) FROM data) WHERE name = 'data'")
+    conn.commit()
+    conn.close()
+
+    handle = DatasetHandle(db_path, 'data')
+    assert not handle.dense_rowid
+    expected = handle.read()
+    model = DatasetTableModel(handle)
+    pages = [5, 6, 4, 3, 9, 8, 0, 1]
+    for number in pages + [number for number in range(n // PAGE_SIZE) if number not in pages]:
+        page = model.page(number)
+        rows = expected.iloc[number * PAGE_SIZE:(number + 1) * PAGE_SIZE]
+        assert list(page[0]) == rows['id'].tolist()
+        assert list(page[1]) == rows['value'].tolist()
+    assert model.data(model.index(model.rowCount() - 1, 0)) == str(expected['id'].iloc[-1])